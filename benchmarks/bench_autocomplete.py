@@ -0,0 +1,66 @@
+"""
+Autocomplete benchmark: the GROUP BY ... ORDER BY MAX(id) query per smart field versus
+the in-process index (first build, memoized repeat, uncached prefix query, and a
+write applied incrementally).
+
+    python benchmarks/bench_autocomplete.py --rows 50000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import database
+from modules.database import DatabaseRepository, autocomplete_index
+
+
+def make_rows(n: int, pid: int):
+    return [{"iso": f"ISO-{i // 20:05d}", "naht": str(i % 20), "datum": "01.01.2026", "dimension": "DN 100", "bauteil": "Rohrstoß",
+             "laenge": 1000.0, "charge": f"CH-{i % 900}", "charge_apz": f"APZ-{i % 3000}", "schweisser": f"S{i % 40:02d}",
+             "project_id": pid} for i in range(n)]
+
+
+def timed(fn, repeat: int = 200) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat): fn()
+    return (time.perf_counter() - t0) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        DatabaseRepository.init_db()
+        DatabaseRepository.add_entries(make_rows(args.rows, 1))
+
+        def sql(column="iso"):
+            with database.connection() as conn:
+                return conn.execute(f"""SELECT {column} FROM rohrbuch WHERE project_id = ? AND {column} IS NOT NULL AND {column} != ''
+                                        GROUP BY {column} ORDER BY MAX(id) DESC LIMIT 50""", (1,)).fetchall()
+
+        t_sql = timed(sql, 20)
+        t0 = time.perf_counter()
+        index = autocomplete_index(1)
+        t_build = time.perf_counter() - t0
+        t_hit = timed(lambda: DatabaseRepository.get_known_values("iso", 1))
+        prefixes = [f"ISO-{i:03d}" for i in range(200)]
+        t_prefix = timed(lambda: [index.columns["iso"].query(p, 50) for p in prefixes], 5) / len(prefixes)
+        t_write = timed(lambda: DatabaseRepository.add_entries(make_rows(1, 1)), 50)
+        database.close_pools()
+
+    print(f"{args.rows} rows, {len(index.columns['iso'].stats)} distinct ISOs")
+    print(f"SQL GROUP BY per field:      {t_sql * 1e6:10.0f} us")
+    print(f"index build (5 columns):     {t_build * 1e6:10.0f} us  (once per project)")
+    print(f"index query, memoized:       {t_hit * 1e6:10.1f} us")
+    print(f"index prefix query:          {t_prefix * 1e6:10.1f} us")
+    print(f"add_entry incl. index update:{t_write * 1e6:10.0f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Logbook Excel export benchmark: the old path (whole logbook as DataFrame through
+pd.ExcelWriter) versus streaming the DB cursor into a write-only workbook.
+Reports wall time and the Python heap peak (tracemalloc) of each.
+
+    python benchmarks/bench_excel.py --rows 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from io import BytesIO
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import database
+from modules.database import DatabaseRepository, LOGBOOK_COLUMNS
+from modules.utils import Exporter, EXCEL_DROP_COLUMNS
+
+
+def make_rows(n: int, pid: int):
+    return [{"iso": f"ISO-{i // 20:04d}", "naht": str(i % 20), "datum": f"{1 + i % 28:02d}.01.2026", "dimension": "DN 100",
+             "bauteil": "Rohrstoß" if i % 3 else "Bogen 90°", "laenge": 1000.0 + i, "charge": "",
+             "charge_apz": f"APZ-{i % 50}", "schweisser": f"S{i % 7}", "project_id": pid} for i in range(n)]
+
+
+def pandas_export(pid: int) -> bytes:
+    df, _ = DatabaseRepository.query_logbook(pid, limit=None)
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='openpyxl') as writer:
+        df.drop(columns=EXCEL_DROP_COLUMNS, errors='ignore').to_excel(writer, index=False, sheet_name='Daten')
+    return output.getvalue()
+
+
+def stream_export(pid: int) -> bytes:
+    cols = [c for c in LOGBOOK_COLUMNS if c not in EXCEL_DROP_COLUMNS]
+    return Exporter.to_excel_stream(DatabaseRepository.iter_logbook(pid, columns=cols), cols)
+
+
+def measure(fn, pid):
+    # Timed without tracing (tracemalloc slows allocation-heavy code severalfold), then traced for the peak
+    t0 = time.perf_counter()
+    data = fn(pid)
+    elapsed = time.perf_counter() - t0
+    tracemalloc.start()
+    fn(pid)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        DatabaseRepository.init_db()
+        DatabaseRepository.add_entries(make_rows(args.rows, 1))
+
+        results = [("DataFrame + ExcelWriter", *measure(pandas_export, 1)),
+                   ("cursor -> write-only", *measure(stream_export, 1))]
+        database.close_pools()
+
+    print(f"{args.rows} rows")
+    for name, elapsed, peak, size in results:
+        print(f"{name:26s} {elapsed:7.2f} s   peak {peak / 2**20:8.1f} MB   file {size / 2**20:6.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
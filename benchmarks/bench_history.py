@@ -0,0 +1,93 @@
+"""
+Logbook history benchmark: write overhead of the history triggers, size of the delta
+encoding and DatabaseRepository.logbook_as_of with snapshots vs a replay of the full history.
+
+    python benchmarks/bench_history.py --rows 100000 --updates 20000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import database
+from modules.database import DatabaseRepository
+
+
+def make_rows(start: int, n: int):
+    return [{"iso": f"ISO-{i // 20:05d}", "naht": str(i % 20), "datum": "01.01.2026", "dimension": "DN 100",
+             "bauteil": "Rohrstoß", "laenge": 1000.0 + i % 500, "charge": f"H{i % 5000:05d}", "charge_apz": f"APZ-{i % 500:04d}",
+             "schweisser": f"S{i % 40}", "project_id": 1} for i in range(start, start + n)]
+
+
+def load(rows: int) -> float:
+    t0 = time.perf_counter()
+    for start in range(0, rows, 10_000):
+        DatabaseRepository.add_entries(make_rows(start, min(10_000, rows - start)))
+    return time.perf_counter() - t0
+
+
+def timed(fn, repeat: int = 5):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return min(times) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--updates", type=int, default=20_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Insert cost without the history triggers, for comparison
+        database.DB_NAME = os.path.join(tmp, "plain.db")
+        DatabaseRepository.init_db()
+        with database.connection() as conn:
+            for name in ("insert", "update", "move", "delete"):
+                conn.execute(f"DROP TRIGGER trg_rohrbuch_history_{name}")
+        plain = load(args.rows)
+
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        DatabaseRepository.init_db()
+        logged = load(args.rows)
+        print(f"insert {args.rows} rows: {plain:.1f} s without history, {logged:.1f} s with (+{(logged / plain - 1) * 100:.0f} %)")
+
+        rng = random.Random(1)
+        t0 = time.perf_counter()
+        for _ in range(args.updates // 10):
+            ids = rng.sample(range(1, args.rows + 1), 10)
+            DatabaseRepository.bulk_update(ids, "Schweißer", f"S{rng.randint(0, 99)}")
+        print(f"{args.updates} row updates in {args.updates // 10} bulk edits: {time.perf_counter() - t0:.1f} s")
+
+        with database.connection() as conn:
+            n, full, delta = conn.execute("""SELECT COUNT(*), AVG(CASE WHEN op = 'I' THEN length(delta) END),
+                                                    AVG(CASE WHEN op = 'U' THEN length(delta) END) FROM rohrbuch_history""").fetchone()
+            snaps, snap_bytes = conn.execute("SELECT COUNT(*), TOTAL(length(data)) FROM rohrbuch_snapshots").fetchone()
+        print(f"{n} history events: full row {full:.0f} B, update delta {delta:.0f} B; "
+              f"{snaps} snapshots, {snap_bytes / snaps / 1024:.0f} KiB each (zlib)")
+
+        now = datetime.now()
+        ms_snap, df = timed(lambda: DatabaseRepository.logbook_as_of(1, now))
+        with database.connection() as conn:
+            conn.execute("DELETE FROM rohrbuch_snapshots")
+            conn.commit()
+        ms_full, df_full = timed(lambda: DatabaseRepository.logbook_as_of(1, now), 3)
+        assert df.equals(df_full)
+        ms_live, _ = timed(lambda: DatabaseRepository.get_logbook_by_project(1))
+        print(f"\nlogbook_as_of(now), {len(df)} rows:")
+        print(f"  from last snapshot       {ms_snap:8.0f} ms")
+        print(f"  full replay              {ms_full:8.0f} ms")
+        print(f"  get_logbook_by_project   {ms_live:8.0f} ms (current state, for reference)")
+        database.close_pools()
+
+
+if __name__ == "__main__":
+    main()
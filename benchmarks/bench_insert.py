@@ -0,0 +1,50 @@
+"""
+Rohrbuch insert benchmark: one add_entry call (and commit) per row versus a single
+add_entries transaction.
+
+    python benchmarks/bench_insert.py --rows 10000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import database
+from modules.database import DatabaseRepository
+
+
+def make_rows(n: int, pid: int):
+    return [{"iso": f"ISO-{i // 20:04d}", "naht": "", "datum": "01.01.2026", "dimension": "DN 100",
+             "bauteil": "Rohrstoß" if i % 3 else "Bogen 90°", "laenge": 1000.0 + i, "charge": "",
+             "charge_apz": "", "schweisser": "", "project_id": pid} for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        DatabaseRepository.init_db()
+        rows = make_rows(args.rows, 1)
+
+        t0 = time.perf_counter()
+        for row in rows: DatabaseRepository.add_entry(row)
+        per_row = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        DatabaseRepository.add_entries(rows)
+        batched = time.perf_counter() - t0
+        database.close_pools()
+
+    print(f"{args.rows} rows")
+    print(f"add_entry per row:       {per_row * 1000:9.1f} ms")
+    print(f"add_entries (1 txn):     {batched * 1000:9.1f} ms   ({per_row / batched:.0f}x)")
+
+
+if __name__ == "__main__":
+    main()
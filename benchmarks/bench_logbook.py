@@ -0,0 +1,86 @@
+"""
+Logbook load benchmark: repository read paths on a large Rohrbuch, with and without
+the schema indexes, plus the per-rerun cost of init_db.
+
+    python benchmarks/bench_logbook.py --rows 100000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import database
+from modules.database import DatabaseRepository
+from modules.migrations import _m001_base_schema
+
+INDEXES = ["idx_rohrbuch_project_id", "idx_rohrbuch_project_schweisser", "idx_rohrbuch_project_charge_apz",
+           "idx_rohrbuch_project_charge", "idx_rohrbuch_project_iso"]
+
+
+def best_of(fn, repeat=5):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times) * 1000
+
+
+def fill(rows: int, projects: int):
+    rnd = random.Random(42)
+    with database.connection() as conn:
+        for pid in range(2, projects + 1):
+            conn.execute("INSERT INTO projects (id, name, created_at, archived) VALUES (?, ?, '01.01.2026', 0)", (pid, f"Projekt {pid}"))
+        data = []
+        for i in range(rows):
+            # Project 1 gets half of all rows, the rest is spread evenly
+            pid = 1 if i % 2 == 0 else rnd.randint(2, projects)
+            data.append((f"ISO-{rnd.randint(1, 400):04d}", str(i), "01.01.2026", f"DN {rnd.choice([50, 100, 150, 200])}",
+                         rnd.choice(["Rohrstoß", "Bogen", "Flansch"]), rnd.uniform(100, 6000), f"C{rnd.randint(1, 300)}",
+                         f"APZ-{rnd.randint(1, 800)}", f"S{rnd.randint(1, 40):02d}", pid))
+        conn.executemany("""INSERT INTO rohrbuch (iso, naht, datum, dimension, bauteil, laenge, charge, charge_apz, schweisser, project_id)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", data)
+
+
+def measure(label: str):
+    results = {
+        "get_logbook_by_project": best_of(lambda: DatabaseRepository.get_logbook_by_project(1), repeat=3),
+        "get_known_values x4": best_of(lambda: [DatabaseRepository.get_known_values(c, 1) for c in ("iso", "schweisser", "charge", "charge_apz")]),
+    }
+    for name, ms in results.items():
+        print(f"{label:<18} {name:<28} {ms:9.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--projects", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        t0 = time.perf_counter()
+        DatabaseRepository.init_db()
+        print(f"init_db (first, migrations):        {(time.perf_counter() - t0) * 1000:9.1f} ms")
+        fill(args.rows, args.projects)
+        print(f"init_db (per rerun, cached):        {best_of(DatabaseRepository.init_db) * 1000:9.4f} us")
+
+        def legacy_init():
+            with database.connection() as conn:
+                _m001_base_schema(conn.cursor())
+        print(f"legacy init_db body (per rerun):    {best_of(legacy_init):9.1f} ms")
+        print()
+
+        measure("with indexes")
+        with database.connection() as conn:
+            for idx in INDEXES: conn.execute(f"DROP INDEX {idx}")
+        measure("without indexes")
+        database.close_pools()
+
+
+if __name__ == "__main__":
+    main()
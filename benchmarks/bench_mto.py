@@ -0,0 +1,62 @@
+"""
+MTO benchmark by logbook size: the pandas path (one groupby over a logbook frame
+already in memory, and including loading it) versus the SQL path, which reads the
+trigger-maintained mto_summary table (constant time in the logbook size). Views that
+only need the MTO use the SQL path; callers holding the frame use generate_mto.
+
+    python benchmarks/bench_mto.py --rows 100 1000 5000 20000 100000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import database
+from modules.database import DatabaseRepository
+from modules.calculations import MaterialManager
+
+BAUTEILE = ["Rohrstoß", "Passstück", "Bogen 90°", "Flansch", "T-Stück", "Reduzierung"]
+
+
+def make_rows(n: int, pid: int):
+    return [{"iso": f"ISO-{i // 20:04d}", "naht": str(i % 20), "datum": "01.01.2026", "dimension": f"DN {(25, 50, 80, 100, 150, 200)[i % 6]}",
+             "bauteil": BAUTEILE[(i // 6) % len(BAUTEILE)], "laenge": 1000.0 + i % 500, "charge": "", "charge_apz": "",
+             "schweisser": "", "project_id": pid} for i in range(n)]
+
+
+def best_of(fn, repeat: int = 5) -> float:
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 2000, 5000, 20000, 100000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        DatabaseRepository.init_db()
+        print(f"{'rows':>8}  {'in memory':>9}  {'+ load':>9}  {'SQL':>9}  faster")
+        for pid, n in enumerate(args.rows, start=2):
+            DatabaseRepository.create_project(f"Bench {n}")
+            DatabaseRepository.add_entries(make_rows(n, pid))
+            df_log = DatabaseRepository.get_logbook_by_project(pid)
+            in_memory = lambda: MaterialManager.generate_mto(df_log)
+            loaded = lambda: MaterialManager.generate_mto(DatabaseRepository.get_logbook_by_project(pid))
+            sql = lambda: MaterialManager.mto_from_groups(DatabaseRepository.get_mto_groups(pid))
+            assert in_memory().equals(sql())
+            t_mem, t_load, t_sql = best_of(in_memory), best_of(loaded), best_of(sql)
+            print(f"{n:8d}  {t_mem * 1000:7.1f}ms  {t_load * 1000:7.1f}ms  {t_sql * 1000:7.1f}ms  {'pandas' if t_mem < t_sql else 'SQL'}")
+        database.close_pools()
+
+
+if __name__ == "__main__":
+    main()
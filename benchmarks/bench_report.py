@@ -0,0 +1,45 @@
+"""
+Fertigungsbescheinigung benchmark: time to build the PDF (cover, traceability annex,
+detailed logbook) for growing projects, and a cached repeat.
+
+    python benchmarks/bench_report.py --rows 10000 50000
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.utils import Exporter
+
+
+def make_logbook(n: int) -> pd.DataFrame:
+    return pd.DataFrame({
+        "iso": [f"ISO-{i // 20:05d}" for i in range(n)], "naht": [str(i % 20) for i in range(n)],
+        "dimension": [f"DN {(50, 100, 150)[i % 3]}" for i in range(n)],
+        "bauteil": [("Rohrstoß", "Bogen 90°", "T-Stück")[i % 3] for i in range(n)],
+        "charge_apz": [f"APZ-{i % 400}" if i % 17 else "" for i in range(n)], "schweisser": [f"S{i % 7}" for i in range(n)],
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 50_000])
+    args = parser.parse_args()
+
+    for n in args.rows:
+        df = make_logbook(n)
+        t0 = time.perf_counter()
+        pdf = Exporter.final_report(df, "Bench", {})
+        build = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        Exporter.final_report(df, "Bench", {})
+        cached = time.perf_counter() - t0
+        print(f"{n:7d} welds   build {build:6.2f} s   cached {cached * 1000:6.1f} ms   {len(pdf) / 2**20:5.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Logbook full-text search benchmark (FTS5 via DatabaseRepository.search) on a large
+database: median query time for selective and broad queries in one project.
+
+    python benchmarks/bench_search.py --rows 1000000 --projects 10
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import database
+from modules.database import DatabaseRepository
+
+# Selective (one ISO, heat number, APZ) and broad (seam number, welder, common prefixes) queries
+QUERIES = ["ISO-00047", "00047 03", "H00123", "APZ-0042", "MÜ-07", "mu 07", "12", "S0", "iso 4", "h iso"]
+
+
+def make_rows(start: int, n: int, projects: int):
+    return [{"iso": f"ISO-{i // 20 % 100000:05d}-{i % 7:02d}", "naht": str(i % 20), "datum": "01.01.2026", "dimension": "DN 100",
+             "bauteil": "Rohrstoß", "laenge": 1000.0, "charge": f"H{i % 50000:05d}", "charge_apz": f"APZ-{i % 5000:04d}",
+             "schweisser": f"MÜ-{i % 60:02d}" if i % 3 else f"S{i % 40}", "project_id": 2 + (i // 1000) % projects}
+            for i in range(start, start + n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--projects", type=int, default=10)
+    parser.add_argument("--limit", type=int, default=50)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        DatabaseRepository.init_db()
+        t0 = time.perf_counter()
+        for start in range(0, args.rows, 50_000):
+            DatabaseRepository.add_entries(make_rows(start, min(50_000, args.rows - start), args.projects))
+        print(f"{args.rows} rows in {args.projects} projects, loaded in {time.perf_counter() - t0:.0f} s")
+
+        for q in QUERIES:
+            times = []
+            for _ in range(7):
+                t0 = time.perf_counter()
+                hits = DatabaseRepository.search(2, q, args.limit)
+                times.append(time.perf_counter() - t0)
+            print(f"{q!r:14s} {statistics.median(times) * 1000:7.1f} ms   {len(hits):3d} hits")
+        database.close_pools()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Cold-start import profile of the Streamlit entry point, based on `python -X importtime`.
+Each run is a fresh interpreter. Reports the total import time, the heaviest top-level
+packages and whether the lazily loaded dependencies stayed out of the startup path.
+
+    python benchmarks/bench_startup.py              # import streamlit_app
+    python benchmarks/bench_startup.py --eager      # plus matplotlib/plotly/fpdf for comparison
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAZY = ("matplotlib", "plotly", "fpdf")
+EAGER_IMPORTS = "import matplotlib.pyplot, plotly.graph_objects, fpdf; "
+
+
+def profile(code: str):
+    """Runs code in a fresh interpreter. Returns {top-level package: self import time in us}."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT,
+                          capture_output=True, text=True, env=dict(os.environ, PYTHONDONTWRITEBYTECODE="1"))
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    per_package = defaultdict(int)
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"): continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        if not self_us.strip().isdigit(): continue  # header line
+        per_package[name.strip().split(".")[0]] += int(self_us)
+    return per_package
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="streamlit_app", help="module to import (default: streamlit_app)")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--eager", action="store_true", help="also import the lazy dependencies up front")
+    args = parser.parse_args()
+
+    code = (EAGER_IMPORTS if args.eager else "") + f"import {args.module}"
+    runs = [profile(code) for _ in range(args.runs)]
+    totals = [sum(r.values()) / 1000 for r in runs]
+    print(f"{code}")
+    print(f"total import time: median {statistics.median(totals):.0f} ms, min {min(totals):.0f} ms ({args.runs} runs)")
+    print()
+    last = runs[-1]
+    for name, us in sorted(last.items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"  {name:<28} {us / 1000:8.1f} ms")
+    # streamlit itself pulls in some packages (e.g. plotly for its chart theme)
+    base = profile("import streamlit")
+    print()
+    print(f"of which 'import streamlit' alone: {sum(base.values()) / 1000:.0f} ms")
+    loaded = [name for name in LAZY if name in last and name not in base]
+    print(f"lazy dependencies loaded at startup by the app: {', '.join(loaded) if loaded else 'none'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Heat-number trace benchmark on a multi-year database: DatabaseRepository.trace_heat and
+find_heats with the cross-project APZ index (migration 8) and, for comparison, without it.
+
+    python benchmarks/bench_trace.py --rows 500000 --projects 300 --heats 20000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import database
+from modules.database import DatabaseRepository
+
+
+def make_rows(start: int, n: int, projects: int, heats: int):
+    # Heats are used in a few neighbouring projects, like pipe from one delivery
+    return [{"iso": f"ISO-{i // 20 % 100000:05d}", "naht": str(i % 20), "datum": "01.01.2026", "dimension": "DN 100",
+             "bauteil": "Rohrstoß", "laenge": 1000.0, "charge": "", "charge_apz": f"APZ-{(i * 7919) % heats:05d}",
+             "schweisser": f"S{i % 40}", "project_id": 2 + (i // 2000) % projects}
+            for i in range(start, start + n)]
+
+
+def timed(fn, repeat: int = 7):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - t0)
+    return statistics.median(times) * 1000, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=500_000)
+    parser.add_argument("--projects", type=int, default=300)
+    parser.add_argument("--heats", type=int, default=20_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DB_NAME = os.path.join(tmp, "bench.db")
+        DatabaseRepository.init_db()
+        with database.connection() as conn:
+            conn.executemany("INSERT INTO projects (name, archived) VALUES (?, 1)", [(f"Projekt {i}",) for i in range(args.projects)])
+            conn.commit()
+        t0 = time.perf_counter()
+        for start in range(0, args.rows, 50_000):
+            DatabaseRepository.add_entries(make_rows(start, min(50_000, args.rows - start), args.projects, args.heats))
+        print(f"{args.rows} rows, {args.projects} projects, {args.heats} heats, loaded in {time.perf_counter() - t0:.0f} s\n")
+
+        cases = [("trace_heat('APZ-00042')", lambda: DatabaseRepository.trace_heat("APZ-00042")),
+                 ("trace_heat('apz-12345')", lambda: DatabaseRepository.trace_heat("apz-12345")),
+                 ("find_heats('APZ-0004')", lambda: DatabaseRepository.find_heats("APZ-0004")),
+                 ("find_heats('apz-1')", lambda: DatabaseRepository.find_heats("apz-1"))]
+        results = {}
+        for label in ("index", "no index"):
+            if label == "no index":
+                with database.connection() as conn:
+                    conn.execute("DROP INDEX idx_rohrbuch_charge_apz_trace")
+                    conn.commit()
+            for name, fn in cases:
+                results[name, label] = timed(fn, 7 if label == "index" else 3)
+
+        print(f"{'query':26s} {'rows':>6s} {'index':>10s} {'no index':>10s}")
+        for name, _ in cases:
+            ms, df = results[name, "index"]
+            print(f"{name:26s} {len(df):6d} {ms:8.2f}ms {results[name, 'no index'][0]:8.1f}ms")
+        database.close_pools()
+
+
+if __name__ == "__main__":
+    main()
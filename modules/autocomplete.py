@@ -0,0 +1,100 @@
+import bisect
+import heapq
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+class ColumnIndex:
+    """
+    Known values of one logbook column: value -> [count, last id], plus the values
+    sorted by their casefolded text so a prefix is one bisect range. Values are kept as
+    text, like the TEXT columns store them (an int ISO from an import is '123').
+    """
+    __slots__ = ("stats", "keys")
+
+    def __init__(self, rows: Iterable[Tuple[str, int, int]] = ()):
+        # rows: (value, count, max id)
+        self.stats: Dict[str, List[int]] = {str(v): [n, last] for v, n, last in rows if v not in (None, "")}
+        self.keys = sorted((v.casefold(), v) for v in self.stats)
+
+    def add(self, value, row_id: int):
+        if value is None or value == "": return
+        value = str(value)
+        entry = self.stats.get(value)
+        if entry is None:
+            self.stats[value] = [1, row_id]
+            bisect.insort(self.keys, (value.casefold(), value))
+        else:
+            entry[0] += 1
+            if row_id > entry[1]: entry[1] = row_id
+
+    def remove(self, value):
+        if value is None or value == "": return
+        value = str(value)
+        entry = self.stats.get(value)
+        if entry is None: return
+        entry[0] -= 1
+        if entry[0] <= 0:
+            del self.stats[value]
+            key = (value.casefold(), value)
+            i = bisect.bisect_left(self.keys, key)
+            if i < len(self.keys) and self.keys[i] == key: del self.keys[i]
+
+    def query(self, prefix: str = "", limit: int = 50, order: str = "recent") -> List[str]:
+        if prefix:
+            p = prefix.casefold()
+            lo = bisect.bisect_left(self.keys, (p,))
+            hi = bisect.bisect_left(self.keys, (p + "\U0010ffff",))
+            candidates = [v for _, v in self.keys[lo:hi]]
+        else:
+            candidates = self.stats.keys()
+        stats = self.stats
+        if order == "frequent":
+            rank = lambda v: (stats[v][0], stats[v][1])
+        else:  # most recently used first, like ORDER BY MAX(id) DESC
+            rank = lambda v: stats[v][1]
+        return heapq.nlargest(limit, candidates, key=rank)
+
+class AutocompleteIndex:
+    """
+    In-process autocomplete values of one project for several logbook columns.
+    Writes are applied incrementally (apply); results are memoized until the next write.
+    Expires after ttl seconds to pick up writes from other processes.
+    """
+    def __init__(self, columns: Dict[str, Iterable[Tuple[str, int, int]]], ttl: float = 300.0):
+        self.columns = {col: ColumnIndex(rows) for col, rows in columns.items()}
+        self.expires = time.monotonic() + ttl
+        self._memo: Dict[tuple, List[str]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def expired(self) -> bool:
+        return time.monotonic() > self.expires
+
+    def invalidate(self):
+        """Marks the index stale: the next query rebuilds it from the database."""
+        self.expires = 0.0
+
+    def query(self, column: str, prefix: str = "", limit: int = 50, order: str = "recent") -> List[str]:
+        key = (column, prefix, limit, order)
+        with self._lock:
+            hit = self._memo.get(key)
+            if hit is None:
+                index = self.columns.get(column)
+                hit = self._memo[key] = index.query(prefix, limit, order) if index else []
+        return list(hit)
+
+    def apply(self, removed: Iterable[dict], added: Iterable[Tuple[int, dict]], last_ids: Dict[Tuple[str, str], int]):
+        """
+        removed: old values of changed/deleted rows; added: (id, values) of new/changed rows;
+        last_ids: current MAX(id) of (column, value) pairs that lost a row.
+        """
+        with self._lock:
+            self._memo.clear()
+            for values in removed:
+                for col, index in self.columns.items(): index.remove(values.get(col))
+            for row_id, values in added:
+                for col, index in self.columns.items(): index.add(values.get(col), row_id)
+            for (col, value), last in last_ids.items():
+                entry = self.columns[col].stats.get(str(value))
+                if entry is not None: entry[1] = last
@@ -0,0 +1,126 @@
+"""
+Headless batch export of project documents (Fertigungsbescheinigung PDF, Rohrbuch
+XLSX, JSON backup), one worker process per project. Never imports Streamlit.
+
+    python -m modules.batch_export                    # all archived projects
+    python -m modules.batch_export 3 7 12 --formats pdf xlsx --workers 4 --out exports
+"""
+import argparse
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Sequence
+
+from modules import database
+from modules.database import DatabaseRepository, LOGBOOK_COLUMNS
+from modules.utils import Exporter, EXCEL_DROP_COLUMNS, PDF_AVAILABLE
+
+FORMATS = ("pdf", "xlsx", "json")
+
+def _file_stem(name: str) -> str:
+    return re.sub(r'[\\/:*?"<>|]', "_", name.strip()).replace(" ", "_") or "Projekt"
+
+def _init_worker(db_name: str):
+    # Spawned workers re-import modules.database with the default DB_NAME
+    database.DB_NAME = db_name
+
+def select_projects(project_ids: Sequence[int] = None) -> List[tuple]:
+    """(id, name, archived, order_number) of the given projects, or of all archived ones."""
+    projects = DatabaseRepository.get_projects()
+    if project_ids:
+        wanted = set(project_ids)
+        return [p for p in projects if p[0] in wanted]
+    return [p for p in projects if p[2]]
+
+def export_project(project: tuple, out_dir: str, formats: Sequence[str] = FORMATS) -> Dict:
+    """Writes the requested documents of one project. Returns files, seconds per format, errors and skipped formats (with reason)."""
+    pid, name, _, order_number = project
+    stem = _file_stem(name)
+    result = {"id": pid, "name": name, "files": [], "timings": {}, "errors": {}, "skipped": {}}
+    for fmt in formats:
+        t0 = time.perf_counter()
+        try:
+            if fmt == "pdf":
+                if not PDF_AVAILABLE:
+                    result["skipped"][fmt] = "fpdf nicht installiert"
+                    continue
+                df_log = DatabaseRepository.get_logbook_by_project(pid)
+                if df_log.empty:
+                    result["skipped"][fmt] = "Rohrbuch leer"
+                    continue
+                path = os.path.join(out_dir, f"Fertigungsbescheinigung_{stem}.pdf")
+                data = Exporter.to_pdf_final_report(df_log, name, {"order_no": order_number or "-"})
+            elif fmt == "xlsx":
+                cols = [c for c in LOGBOOK_COLUMNS if c not in EXCEL_DROP_COLUMNS]
+                path = os.path.join(out_dir, f"Rohrbuch_{stem}.xlsx")
+                data = Exporter.to_excel_stream(DatabaseRepository.iter_logbook(pid, columns=cols), cols)
+            elif fmt == "json":
+                path = os.path.join(out_dir, f"Backup_{stem}.json")
+                data = DatabaseRepository.export_project_to_json(pid).encode("utf-8")
+            else:
+                raise ValueError(f"Unbekanntes Format: {fmt}")
+            with open(path, "wb") as f:
+                f.write(data)
+            result["files"].append(path)
+        except Exception as e:
+            result["errors"][fmt] = f"{type(e).__name__}: {e}"
+        # Skipped formats (continue above) get no timing: no file was written
+        result["timings"][fmt] = time.perf_counter() - t0
+    return result
+
+def run_batch(projects: List[tuple], out_dir: str, formats: Sequence[str] = FORMATS, workers: int = None, log=None) -> List[Dict]:
+    """Exports the projects in a process pool, logging one progress line per finished project."""
+    log = log or (lambda msg: print(msg, flush=True))
+    os.makedirs(out_dir, exist_ok=True)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(database.DB_NAME,)) as pool:
+        futures = {pool.submit(export_project, p, out_dir, formats): p for p in projects}
+        for done, future in enumerate(as_completed(futures), start=1):
+            pid, name = futures[future][:2]
+            try:
+                res = future.result()
+            except Exception as e:  # worker crashed
+                res = {"id": pid, "name": name, "files": [], "timings": {}, "errors": {"*": f"{type(e).__name__}: {e}"}, "skipped": {}}
+            results.append(res)
+            status = "FEHLER " + "; ".join(f"{k}: {v}" for k, v in res["errors"].items()) if res["errors"] else "ok"
+            if res["skipped"]: status += ", übersprungen " + "; ".join(f"{k}: {v}" for k, v in res["skipped"].items())
+            log(f"[{done}/{len(projects)}] {name}: {len(res['files'])} Dateien, {sum(res['timings'].values()):.2f} s, {status}")
+    return sorted(results, key=lambda r: r["id"])
+
+def format_summary(results: List[Dict], formats: Sequence[str]) -> str:
+    width = max([len(r["name"]) for r in results] + [7])
+    lines = [f"{'Projekt':<{width}}  " + "  ".join(f"{fmt:>7}" for fmt in formats) + "   gesamt"]
+    for r in results:
+        cells = [f"{r['timings'][fmt]:6.2f}s" if fmt in r["timings"] else f"{'übersp.' if fmt in r['skipped'] else '-':>7}" for fmt in formats]
+        lines.append(f"{r['name']:<{width}}  " + "  ".join(cells) + f"  {sum(r['timings'].values()):6.2f}s")
+    return "\n".join(lines)
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("projects", nargs="*", type=int, help="Projekt-IDs (Standard: alle archivierten)")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    parser.add_argument("--out", default="exports", help="Zielordner")
+    parser.add_argument("--workers", type=int, default=None, help="Prozesse (Standard: CPU-Anzahl)")
+    parser.add_argument("--db", default=None, help="SQLite-Datei (Standard: PIPECRAFT_DB_NAME bzw. pipecraft.db)")
+    args = parser.parse_args(argv)
+
+    if args.db: database.DB_NAME = args.db
+    DatabaseRepository.init_db()
+    projects = select_projects(args.projects)
+    if not projects:
+        print("Keine Projekte gefunden.")
+        return 1
+    t0 = time.perf_counter()
+    results = run_batch(projects, args.out, args.formats, args.workers)
+    print()
+    print(format_summary(results, args.formats))
+    failed = [r for r in results if r["errors"]]
+    print(f"\n{len(results) - len(failed)}/{len(results)} Projekte exportiert in {time.perf_counter() - t0:.2f} s -> {args.out}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    # Run through the importable module so worker tasks pickle as modules.batch_export.*
+    from modules.batch_export import main as _main
+    sys.exit(_main())
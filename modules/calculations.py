@@ -1,58 +1,61 @@
 import math
-import re
+import os
+import numpy as np
 import pandas as pd
-from typing import Dict, List, Any
+from functools import lru_cache
+from typing import Dict, List, Any, Tuple, Union
+from modules.specs import PipeSpecTable, DEFAULT_SPEC_PATH, load_spec
 
 class PipeCalculator:
-    PN_MAP = {
-        "PN 16": "_16",
-        "PN 10": "_10",
-        "PN 6": "_10",
-        "PN 25": "_16", 
-        "PN 40": "_16" 
-    }
+    PN_MAP = PipeSpecTable.PN_MAP
 
-    def __init__(self, df: pd.DataFrame): self.df = df
+    def __init__(self, source: Union[pd.DataFrame, PipeSpecTable]):
+        if isinstance(source, PipeSpecTable):
+            self.spec = source
+            self.df = None
+        else:
+            self.spec = PipeSpecTable.from_frame(source)
+            self.df = source
     
     def get_row(self, dn: int) -> pd.Series:
-        row = self.df[self.df['DN'] == dn]
-        return row.iloc[0] if not row.empty else self.df.iloc[0]
+        """Full table row for a DN. Raises KeyError for unknown DN."""
+        return pd.Series(self.spec.row(dn))
         
     def get_deduction(self, f_type: str, dn: int, pn: str, angle: float = 90.0) -> float:
-        row = self.get_row(dn)
-        suffix = self.PN_MAP.get(pn, "_10")
-        
-        if "Bogen 90°" in f_type: return float(row['Radius_BA3'])
-        if "Zuschnitt" in f_type: return float(row['Radius_BA3']) * math.tan(math.radians(angle / 2))
-        if "Flansch" in f_type: return float(row[f'Flansch_b{suffix}'])
-        if "T-Stück" in f_type: return float(row['T_Stueck_H'])
-        if "Reduzierung" in f_type: return float(row['Red_Laenge_L'])
+        spec = self.spec
+        if "Bogen 90°" in f_type: return spec.bend_radius(dn)
+        if "Zuschnitt" in f_type: return spec.vorbau(dn, angle)
+        if "Flansch" in f_type: return spec.flange_deduction(dn, pn)
+        if "T-Stück" in f_type: return spec.tee_height(dn)
+        if "Reduzierung" in f_type: return spec.reducer_length(dn)
         return 0.0
         
     def calculate_bend_details(self, dn: int, angle: float) -> Dict[str, float]:
-        row = self.get_row(dn)
-        r = float(row['Radius_BA3'])
-        da = float(row['D_Aussen'])
+        r = self.spec.bend_radius(dn)
+        da = self.spec.od(dn)
         rad = math.radians(angle)
         return {"vorbau": r * math.tan(rad / 2), "bogen_aussen": (r + da/2) * rad, "bogen_mitte": r * rad, "bogen_innen": (r - da/2) * rad}
         
-    def calculate_stutzen_coords(self, dn_haupt: int, dn_stutzen: int) -> pd.DataFrame:
-        r_main = self.get_row(dn_haupt)['D_Aussen'] / 2
-        r_stub = self.get_row(dn_stutzen)['D_Aussen'] / 2
-        if r_stub > r_main: raise ValueError("Stutzen > Hauptrohr")
-        table_data = []
-        for angle in [0, 22.5, 45, 67.5, 90, 112.5, 135, 157.5, 180]:
-            try:
-                term = r_stub * math.sin(math.radians(angle))
-                t_val = r_main - math.sqrt(r_main**2 - term**2)
-            except ValueError: t_val = 0
-            u_val = (r_stub * 2 * math.pi) * (angle / 360)
-            table_data.append({"Winkel": f"{angle}°", "Tiefe (mm)": round(t_val, 1), "Umfang (mm)": round(u_val, 1)})
-        return pd.DataFrame(table_data)
+    def calculate_saddle_profile(self, dn_haupt: int, dn_stutzen: int, step: float = 5.0,
+                                 offset: float = 0.0, branch_angle: float = 90.0) -> Dict[str, np.ndarray]:
+        return saddle_profile(self.spec.od(dn_haupt) / 2, self.spec.od(dn_stutzen) / 2, step, offset, branch_angle)
+
+    def calculate_wedge_profile(self, dn: int, gaps: Dict[str, float], step: float = 1.0) -> Dict[str, np.ndarray]:
+        return wedge_gap_profile(self.spec.od(dn), gaps, step)
+
+    def calculate_stutzen_coords(self, dn_haupt: int, dn_stutzen: int, step: float = 22.5,
+                                 offset: float = 0.0, branch_angle: float = 90.0) -> pd.DataFrame:
+        prof = self.calculate_saddle_profile(dn_haupt, dn_stutzen, step, offset, branch_angle)
+        # A centered 90° branch is symmetric, half a turn is enough for the table
+        keep = prof["angle"] <= 180 if offset == 0 and branch_angle == 90 else prof["angle"] < 360
+        return pd.DataFrame({
+            "Winkel": [f"{a:g}°" for a in prof["angle"][keep]],
+            "Tiefe (mm)": np.round(prof["depth"][keep], 1),
+            "Umfang (mm)": np.round(prof["arc"][keep], 1)
+        })
         
     def calculate_2d_offset(self, dn: int, offset: float, angle: float) -> Dict[str, float]:
-        row = self.get_row(dn)
-        r = float(row['Radius_BA3'])
+        r = self.spec.bend_radius(dn)
         rad = math.radians(angle)
         try:
             hypotenuse = offset / math.sin(rad)
@@ -72,8 +75,7 @@ class PipeCalculator:
                 "run_length": diag_base, "set": set_val, "roll": roll}
         
     def calculate_segment_bend(self, dn: int, radius: float, num_segments: int, total_angle: float = 90.0) -> Dict[str, float]:
-        row = self.get_row(dn)
-        od = float(row['D_Aussen'])
+        od = self.spec.od(dn)
         if num_segments < 2: return {"error": "Min. 2 Segmente"}
         miter_angle = total_angle / (2 * (num_segments - 1))
         tan_alpha = math.tan(math.radians(miter_angle))
@@ -85,6 +87,109 @@ class PipeCalculator:
         end_center = radius * tan_alpha
         return {"miter_angle": miter_angle, "mid_back": len_back, "mid_belly": len_belly, "mid_center": len_center, "end_back": end_back, "end_belly": end_belly, "end_center": end_center, "od": od}
 
+    # --- Batch API: NumPy counterparts of the scalar methods above ---
+    # Inputs are array-likes (broadcast against each other) or a DataFrame whose
+    # columns are named like the parameters. Results are DataFrames with one row
+    # per input; rows that the scalar method would reject carry error=True and NaN values.
+
+    @staticmethod
+    def _batch_inputs(first, **params) -> List[np.ndarray]:
+        if isinstance(first, pd.DataFrame):
+            if 'dn' not in first.columns: raise ValueError("Eingabe 'dn' fehlt")
+            values = [first['dn'].to_numpy()]
+            for name, default in params.items():
+                if name in first.columns: values.append(first[name].to_numpy())
+                elif default is not None: values.append(default)
+                else: raise ValueError(f"Eingabe '{name}' fehlt")
+        else:
+            values = [first]
+            for name, val in params.items():
+                if val is None: raise ValueError(f"Eingabe '{name}' fehlt")
+                values.append(val)
+        arrays = np.broadcast_arrays(*[np.atleast_1d(np.asarray(v, dtype=np.float64)) for v in values])
+        return [np.array(a) for a in arrays]
+
+    def _batch_lookup(self, dn: np.ndarray, column: str) -> Tuple[np.ndarray, np.ndarray]:
+        idx = self.spec.indices(dn)
+        valid = idx >= 0
+        return np.where(valid, self.spec.column(column)[idx], np.nan), valid
+
+    def calculate_bend_details_batch(self, dn, angle=None) -> pd.DataFrame:
+        dn, angle = self._batch_inputs(dn, angle=angle)
+        r, ok_r = self._batch_lookup(dn, 'Radius_BA3')
+        da, ok_d = self._batch_lookup(dn, 'D_Aussen')
+        rad = np.radians(angle)
+        return pd.DataFrame({
+            "dn": dn, "angle": angle,
+            "vorbau": r * np.tan(rad / 2), "bogen_aussen": (r + da/2) * rad,
+            "bogen_mitte": r * rad, "bogen_innen": (r - da/2) * rad,
+            "error": ~(ok_r & ok_d)
+        })
+
+    def calculate_2d_offset_batch(self, dn, offset=None, angle=None) -> pd.DataFrame:
+        dn, offset, angle = self._batch_inputs(dn, offset=offset, angle=angle)
+        r, valid = self._batch_lookup(dn, 'Radius_BA3')
+        rad = np.radians(angle)
+        sin_a, tan_a = np.sin(rad), np.tan(rad)
+        error = ~valid | (sin_a == 0) | (tan_a == 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            hypotenuse = np.where(error, np.nan, offset / sin_a)
+            run = np.where(error, np.nan, offset / tan_a)
+        z_mass = np.where(error, np.nan, r * np.tan(rad / 2))
+        return pd.DataFrame({
+            "dn": dn, "offset": offset, "angle": angle,
+            "hypotenuse": hypotenuse, "run": run, "z_mass_single": z_mass,
+            "cut_length": hypotenuse - (2*z_mass), "error": error
+        })
+
+    def calculate_rolling_offset_batch(self, dn, roll=None, set_val=None, height=0.0) -> pd.DataFrame:
+        dn, roll, set_val, height = self._batch_inputs(dn, roll=roll, set_val=set_val, height=height)
+        diag_base = np.sqrt(roll**2 + set_val**2)
+        travel = np.sqrt(diag_base**2 + height**2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = diag_base / travel
+            in_domain = (travel != 0) & (ratio >= -1) & (ratio <= 1)
+            required_angle = np.where(in_domain, np.degrees(np.arccos(np.where(in_domain, ratio, 1.0))), 0.0)
+        return pd.DataFrame({
+            "dn": dn, "roll": roll, "set": set_val, "height": height,
+            "diag_base": diag_base, "travel": travel, "angle_calc": required_angle,
+            "run_length": diag_base, "error": np.zeros(len(dn), dtype=bool)
+        })
+
+    def calculate_segment_bend_batch(self, dn, radius=None, num_segments=None, total_angle=90.0) -> pd.DataFrame:
+        dn, radius, num_segments, total_angle = self._batch_inputs(dn, radius=radius, num_segments=num_segments, total_angle=total_angle)
+        od, valid = self._batch_lookup(dn, 'D_Aussen')
+        error = ~valid | (num_segments < 2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            miter_angle = np.where(error, np.nan, total_angle / (2 * (num_segments - 1)))
+        tan_alpha = np.tan(np.radians(miter_angle))
+        return pd.DataFrame({
+            "dn": dn, "radius": radius, "num_segments": num_segments, "total_angle": total_angle,
+            "miter_angle": miter_angle,
+            "mid_back": 2 * (radius + od/2) * tan_alpha, "mid_belly": 2 * (radius - od/2) * tan_alpha,
+            "mid_center": 2 * radius * tan_alpha,
+            "end_back": (radius + od/2) * tan_alpha, "end_belly": (radius - od/2) * tan_alpha,
+            "end_center": radius * tan_alpha, "od": od, "error": error
+        })
+
+    def calculate_stutzen_batch(self, dn_haupt, dn_stutzen=None, angle=None) -> pd.DataFrame:
+        """Saddle depth / circumference position per (main DN, branch DN, angle) row."""
+        if isinstance(dn_haupt, pd.DataFrame):
+            dn_haupt = dn_haupt.rename(columns={'dn_haupt': 'dn'})
+        dn_haupt, dn_stutzen, angle = self._batch_inputs(dn_haupt, dn_stutzen=dn_stutzen, angle=angle)
+        d_main, ok_main = self._batch_lookup(dn_haupt, 'D_Aussen')
+        d_stub, ok_stub = self._batch_lookup(dn_stutzen, 'D_Aussen')
+        r_main, r_stub = d_main / 2, d_stub / 2
+        error = ~(ok_main & ok_stub) | (r_stub > r_main)
+        term = r_stub * np.sin(np.radians(angle))
+        with np.errstate(invalid='ignore'):
+            depth = np.where(error, np.nan, r_main - np.sqrt(r_main**2 - term**2))
+        arc = np.where(error, np.nan, (r_stub * 2 * math.pi) * (angle / 360))
+        return pd.DataFrame({
+            "dn_haupt": dn_haupt, "dn_stutzen": dn_stutzen, "angle": angle,
+            "depth": depth, "arc": arc, "error": error
+        })
+
     @staticmethod
     def apply_tolerance_stack(cut_length: float, num_welds: int, shrinkage_per_weld: float = 2.0) -> dict:
         """
@@ -150,8 +255,7 @@ class PipeCalculator:
         Calculates angular misalignment (wedge gap) and cutback values.
         gaps: {'12': float, '3': float, '6': float, '9': float}
         """
-        row = self.get_row(dn)
-        od = float(row['D_Aussen'])
+        od = self.spec.od(dn)
         
         g12, g3, g6, g9 = gaps.get('12', 0), gaps.get('3', 0), gaps.get('6', 0), gaps.get('9', 0)
         
@@ -253,39 +357,108 @@ class PipeCalculator:
             "cut_data": cut_data,
             "od": od
         }
+def saddle_profile(r_main: float, r_stub: float, step: float = 5.0, offset: float = 0.0,
+                   branch_angle: float = 90.0) -> Dict[str, np.ndarray]:
+    """
+    Cut profile of a branch (Stutzen) set onto a main pipe, for marking or CNC templates.
+    angle: position on the branch circumference, 0..360° in steps of step (0° = toward the
+    main pipe's crown in the branch plane). depth: cut-back from the branch end, arc: tape
+    measure along the branch circumference. offset: lateral shift of the branch axis from
+    the main axis, branch_angle: angle between the axes (90° = perpendicular).
+    """
+    if step <= 0: raise ValueError("Schrittweite muss > 0 sein")
+    if not 0 < branch_angle < 180: raise ValueError("Abzweigwinkel muss zwischen 0° und 180° liegen")
+    if r_stub > r_main: raise ValueError("Stutzen > Hauptrohr")
+    if abs(offset) + r_stub > r_main: raise ValueError("Stutzen ragt seitlich über das Hauptrohr")
+    angle = np.minimum(np.arange(math.ceil(360 / step - 1e-9) + 1) * step, 360.0)
+    theta = np.radians(angle)
+    lateral = offset + r_stub * np.sin(theta)
+    # Height of the intersection along the branch axis; the 90° case skips the cot term exactly
+    along = np.sqrt(r_main**2 - lateral**2)
+    if branch_angle != 90:
+        along = (along + r_stub * np.cos(theta) * math.cos(math.radians(branch_angle))) / math.sin(math.radians(branch_angle))
+    depth = along.max() - along
+    arc = (r_stub * 2 * math.pi) * (angle / 360)
+    for arr in (angle, depth, arc): arr.flags.writeable = False
+    return {"angle": angle, "depth": depth, "arc": arc}
+
+def wedge_gap_profile(od: float, gaps: Dict[str, float], step: float = 1.0) -> Dict[str, np.ndarray]:
+    """
+    Cut-back around the pipe for an angular misalignment (same model as calculate_wedge_gap).
+    angle: clockwise from 12 o'clock, depth: material to remove, arc: tape measure along the OD.
+    """
+    if step <= 0: raise ValueError("Schrittweite muss > 0 sein")
+    g12, g3, g6, g9 = gaps.get('12', 0), gaps.get('3', 0), gaps.get('6', 0), gaps.get('9', 0)
+    max_diff = math.hypot(g12 - g6, g3 - g9)
+    orientation = math.atan2(g3 - g9, g12 - g6)
+    angle = np.minimum(np.arange(math.ceil(360 / step - 1e-9) + 1) * step, 360.0)
+    depth = (max_diff / 2) * (1 + np.cos(np.radians(angle) - orientation)) if max_diff else np.zeros_like(angle)
+    arc = (od * math.pi) * (angle / 360)
+    for arr in (angle, depth, arc): arr.flags.writeable = False
+    return {"angle": angle, "depth": depth, "arc": arc}
+
+_SHARED_CALCULATORS: Dict[str, PipeCalculator] = {}
+
+def get_calculator(path: str = DEFAULT_SPEC_PATH) -> PipeCalculator:
+    """Calculator on the registry's compiled table, shared by all callers until the file changes."""
+    key = os.path.abspath(path)
+    spec = load_spec(key)
+    calc = _SHARED_CALCULATORS.get(key)
+    if calc is None or calc.spec is not spec:
+        calc = _SHARED_CALCULATORS[key] = PipeCalculator(spec)
+    return calc
+
+@lru_cache(maxsize=4096)
+def _dn_of(dim: str) -> int:
+    # First run of decimal digits ("DN 100" -> 100), like re.search(r'\d+') without the regex
+    start = next((i for i, ch in enumerate(dim) if ch.isdecimal()), None)
+    if start is None: return 0
+    end = start
+    while end < len(dim) and dim[end].isdecimal(): end += 1
+    return int(dim[start:end])
+
 class MaterialManager:
+    LINEAR_ITEMS = ['Rohrstoß', 'Passstück', 'Rohr']  # measured in m, everything else in pieces
+    MTO_COLUMNS = ['Dimension', 'Beschreibung', 'Menge', 'Einheit']
+
     @staticmethod
     def parse_dn(dim_str: str) -> int:
         if not dim_str: return 0
-        try:
-            match = re.search(r'\d+', str(dim_str))
-            if match: return int(match.group())
-            return 0
-        except (KeyError, IndexError, ValueError): return 0
+        return _dn_of(str(dim_str))
+
+    @staticmethod
+    def mto_groups(df_log: pd.DataFrame) -> pd.DataFrame:
+        """Logbook aggregated per (dimension, bauteil): summed length in mm and piece count."""
+        laenge = pd.to_numeric(df_log['laenge'], errors='coerce').fillna(0)
+        grouped = laenge.groupby([df_log['dimension'].fillna(''), df_log['bauteil']], sort=False)
+        return pd.DataFrame({'laenge_mm': grouped.sum(), 'anzahl': grouped.size()}).reset_index()
+
+    @staticmethod
+    def mto_from_groups(groups: pd.DataFrame) -> pd.DataFrame:
+        """
+        Material take-off from per-(dimension, bauteil) aggregates (mto_groups or the SQL
+        GROUP BY of DatabaseRepository.get_mto_groups): pipes in m, everything else in pieces.
+        """
+        if groups.empty: return pd.DataFrame(columns=MaterialManager.MTO_COLUMNS)
+        linear = groups['bauteil'].isin(MaterialManager.LINEAR_ITEMS)
+        per_dn = pd.DataFrame({
+            'Dimension': groups['dimension'].map(MaterialManager.parse_dn).map(lambda dn: f"DN {dn}"),
+            'Beschreibung': groups['bauteil'],
+            'Menge': groups['laenge_mm'].where(linear, groups['anzahl']).astype(float),
+            'Einheit': linear.map({True: 'm', False: 'Stk'}),
+        })
+        # Several spellings can name one DN ("DN 100", "100"): merge them
+        mto = per_dn.groupby(['Dimension', 'Beschreibung', 'Einheit'], as_index=False)['Menge'].sum()
+        linear = mto['Einheit'] == 'm'
+        mto.loc[linear, 'Menge'] = mto.loc[linear, 'Menge'] / 1000.0
+        # Rounded so pandas and SQLite summation order cannot show up in the last digits
+        mto['Menge'] = mto['Menge'].round(6)
+        return mto[MaterialManager.MTO_COLUMNS].sort_values(['Dimension', 'Beschreibung']).reset_index(drop=True)
+
     @staticmethod
     def generate_mto(df_log: pd.DataFrame) -> pd.DataFrame:
         if df_log.empty: return pd.DataFrame()
-        df = df_log.copy()
-        df['dn_clean'] = df['dimension'].apply(MaterialManager.parse_dn)
-        linear_items = ['Rohrstoß', 'Passstück', 'Rohr']
-        df_linear = df[df['bauteil'].isin(linear_items)].copy()
-        if not df_linear.empty:
-            df_linear['menge'] = pd.to_numeric(df_linear['laenge'], errors='coerce').fillna(0) / 1000.0
-            mto_linear = df_linear.groupby(['dn_clean', 'bauteil'])['menge'].sum().reset_index()
-            mto_linear['Einheit'] = 'm'
-        else:
-            mto_linear = pd.DataFrame(columns=['dn_clean', 'bauteil', 'menge', 'Einheit'])
-        df_count = df[~df['bauteil'].isin(linear_items)].copy()
-        if not df_count.empty:
-            mto_count = df_count.groupby(['dn_clean', 'bauteil']).size().reset_index(name='menge')
-            mto_count['Einheit'] = 'Stk'
-        else:
-            mto_count = pd.DataFrame(columns=['dn_clean', 'bauteil', 'menge', 'Einheit'])
-        mto_final = pd.concat([mto_linear, mto_count], ignore_index=True)
-        mto_final['Dimension'] = mto_final['dn_clean'].apply(lambda x: f"DN {x}")
-        mto_final = mto_final.rename(columns={'bauteil': 'Beschreibung', 'menge': 'Menge'})
-        mto_final = mto_final[['Dimension', 'Beschreibung', 'Menge', 'Einheit']].sort_values(['Dimension', 'Beschreibung'])
-        return mto_final
+        return MaterialManager.mto_from_groups(MaterialManager.mto_groups(df_log))
 
 class HandbookCalculator:
     BOLT_DATA = {"M12": [19, 85, 55], "M16": [24, 210, 135], "M20": [30, 410, 265], "M24": [36, 710, 460], "M27": [41, 1050, 680], "M30": [46, 1420, 920], "M33": [50, 1930, 1250], "M36": [55, 2480, 1600], "M39": [60, 3200, 2080], "M45": [70, 5000, 3250], "M52": [80, 7700, 5000]}
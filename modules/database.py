@@ -2,63 +2,263 @@ import sqlite3
 import json
 import time
 import os
+import getpass
+import zlib
+import queue
+import threading
 import pandas as pd
-from datetime import datetime
-from typing import List, Tuple
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Tuple
+from modules.migrations import migrate, write_snapshot, MTO_GROUPS_SQL, FTS_COLUMNS, HISTORY_COLUMNS
+from modules.autocomplete import AutocompleteIndex
 
 DB_NAME = os.getenv("PIPECRAFT_DB_NAME", "pipecraft.db")
+LOGBOOK_COLUMNS = ["id", "iso", "naht", "datum", "dimension", "bauteil", "laenge", "charge", "charge_apz", "schweisser", "project_id"]
+
+# Who is writing, recorded in rohrbuch_history by the app_user() SQL function
+try: _DEFAULT_USER = os.getenv("PIPECRAFT_USER") or getpass.getuser()
+except (KeyError, OSError): _DEFAULT_USER = "unbekannt"
+_CURRENT_USER: ContextVar[str] = ContextVar("pipecraft_user", default=None)
+
+def set_current_user(name: str):
+    """User name for the logbook changes of the current thread/context (None: PIPECRAFT_USER or OS login)."""
+    _CURRENT_USER.set(name.strip() if name and name.strip() else None)
+
+def current_user() -> str:
+    return _CURRENT_USER.get() or _DEFAULT_USER
+
+class ConnectionPool:
+    """
+    Thread-safe pool of long-lived SQLite connections to one database file.
+    Connections run in WAL mode (readers never block the writer) and keep their
+    prepared-statement cache across calls.
+    """
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",  # durable with WAL, far fewer fsyncs
+        "PRAGMA cache_size=-16000",  # 16 MB page cache per connection
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA busy_timeout=10000",
+    )
+
+    def __init__(self, path: str, max_size: int = 8, statement_cache: int = 256):
+        self.path = path
+        self.statement_cache = statement_cache
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._all: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=10, check_same_thread=False, cached_statements=self.statement_cache)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        conn.create_function("app_user", 0, current_user)  # used by the history triggers
+        with self._lock:
+            self._all.append(conn)
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; commits on success, rolls back on error."""
+        self._slots.acquire()
+        try:
+            try: conn = self._idle.get_nowait()
+            except queue.Empty: conn = self._open()
+            try:
+                with conn:
+                    yield conn
+            finally:
+                with self._lock: alive = conn in self._all
+                if alive: self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        with self._lock:
+            for conn in self._all:
+                try: conn.close()
+                except sqlite3.Error: pass
+            self._all.clear()
+        self._idle = queue.LifoQueue()
+
+_POOLS: Dict[Tuple[int, str], ConnectionPool] = {}
+_POOLS_LOCK = threading.Lock()
+
+def get_pool(path: str = None) -> ConnectionPool:
+    """One pool per process and database file (forked workers get their own)."""
+    key = (os.getpid(), path or DB_NAME)
+    pool = _POOLS.get(key)
+    if pool is None:
+        with _POOLS_LOCK:
+            pool = _POOLS.setdefault(key, ConnectionPool(key[1]))
+    return pool
+
+def connection():
+    return get_pool().connection()
+
+def close_pools():
+    with _POOLS_LOCK:
+        for pool in _POOLS.values(): pool.close()
+        _POOLS.clear()
+    _MIGRATED.clear()
+    _AUTOCOMPLETE.clear()
+
+_MIGRATED = set()
+_MIGRATE_LOCK = threading.Lock()
+
+# Autocomplete values per (database, project), built on first use and updated by the writes below
+AUTOCOMPLETE_COLUMNS = ['iso', 'schweisser', 'charge', 'charge_apz', 'dimension']
+AUTOCOMPLETE_TTL = 300.0  # seconds; catches writes from other processes
+_AUTOCOMPLETE: Dict[Tuple[str, int], AutocompleteIndex] = {}
+_AUTOCOMPLETE_LOCK = threading.Lock()
+
+# Logbook search: ranking weight and label per field, hits ranked per query
+SEARCH_WEIGHTS = dict(iso=4.0, naht=1.0, schweisser=2.0, charge=3.0, charge_apz=3.0)
+SEARCH_LABELS = dict(iso="ISO", naht="Naht", schweisser="Schweißer", charge="Charge", charge_apz="APZ")
+SEARCH_WINDOW = 500
+
+# A project's logbook is snapshotted after this many history events (at least; see _snapshots_due),
+# bounding the replay of logbook_as_of
+SNAPSHOT_INTERVAL = 2000
+
+# Logbook columns of a heat-number trace (plus project name, order number and archive flag)
+TRACE_COLUMNS = ['project_id', 'id', 'iso', 'naht', 'datum', 'dimension', 'bauteil', 'schweisser', 'charge', 'charge_apz']
+
+def autocomplete_index(project_id: int) -> AutocompleteIndex:
+    key = (DB_NAME, project_id)
+    index = _AUTOCOMPLETE.get(key)
+    if index is None or index.expired:
+        with connection() as conn:
+            c = conn.cursor()
+            columns = {col: c.execute(f"""SELECT {col}, COUNT(*), MAX(id) FROM rohrbuch
+                                          WHERE project_id = ? AND {col} IS NOT NULL AND {col} != '' GROUP BY {col}""",
+                                      (project_id,)).fetchall()
+                       for col in AUTOCOMPLETE_COLUMNS}
+        index = _AUTOCOMPLETE[key] = AutocompleteIndex(columns, AUTOCOMPLETE_TTL)
+    return index
+
+def _loaded_index(project_id: int):
+    index = _AUTOCOMPLETE.get((DB_NAME, project_id))
+    return index if index is not None and not index.expired else None
+
+def _indexed_rows(c: sqlite3.Cursor, where: str, args: list) -> Dict[int, List[dict]]:
+    """Current values of the rows about to change, for projects with a loaded index only."""
+    if not any(key[0] == DB_NAME for key in _AUTOCOMPLETE): return {}
+    rows = {}
+    for r in c.execute(f"SELECT id, project_id, {', '.join(AUTOCOMPLETE_COLUMNS)} FROM rohrbuch WHERE {where}", args).fetchall():
+        if _loaded_index(r[1]) is not None:
+            rows.setdefault(r[1], []).append(dict(zip(AUTOCOMPLETE_COLUMNS, r[2:]), id=r[0]))
+    return rows
+
+def _autocomplete_changes(c: sqlite3.Cursor, removed: Dict[int, List[dict]], added: Dict[int, list]) -> list:
+    """
+    Runs inside the write transaction, after the write: looks up the new MAX(id) of values
+    that lost rows. Returns the updates for _commit_autocomplete.
+    """
+    changes = []
+    for pid in removed.keys() | added.keys():
+        index = _loaded_index(pid)
+        if index is None: continue
+        last_ids = {}
+        for col in AUTOCOMPLETE_COLUMNS:
+            values = list({r[col] for r in removed.get(pid, []) if r[col]})
+            if not values: continue
+            placeholders = ', '.join('?' for _ in values)
+            for value, last in c.execute(f"""SELECT {col}, MAX(id) FROM rohrbuch WHERE project_id = ? AND {col} IN ({placeholders})
+                                             GROUP BY {col}""", [pid] + values):
+                last_ids[(col, value)] = last
+        changes.append((index, removed.get(pid, []), added.get(pid, []), last_ids))
+    return changes
+
+def _commit_autocomplete(conn: sqlite3.Connection, changes: list):
+    """
+    Commits the write and applies its index updates. Under one lock, so indexes see the writes in
+    commit order. The write stands once committed: an index the update fails on is rebuilt instead.
+    """
+    with _AUTOCOMPLETE_LOCK:
+        conn.commit()
+        for index, removed, added, last_ids in changes:
+            try: index.apply(removed, added, last_ids)
+            except Exception: index.invalidate()
+
+def _history_mark(c: sqlite3.Cursor) -> int:
+    return c.execute("SELECT COALESCE(MAX(id), 0) FROM rohrbuch_history").fetchone()[0]
+
+def _snapshots_due(c: sqlite3.Cursor, mark: int):
+    """Runs inside the write transaction: snapshots the projects written since mark that are far enough past their last snapshot."""
+    for (pid,) in c.execute("SELECT DISTINCT project_id FROM rohrbuch_history WHERE id > ? AND project_id IS NOT NULL", (mark,)).fetchall():
+        last_id, last_rows = c.execute("""SELECT history_id, n_rows FROM rohrbuch_snapshots WHERE project_id = ?
+                                          ORDER BY history_id DESC LIMIT 1""", (pid,)).fetchone() or (0, 0)
+        # Large logbooks wait for as many events as they have rows: replaying costs about as much as
+        # decoding a snapshot then, and snapshots never outweigh the history they shortcut
+        due = max(SNAPSHOT_INTERVAL, last_rows)
+        pending = c.execute("SELECT COUNT(*) FROM (SELECT 1 FROM rohrbuch_history WHERE project_id = ? AND id > ? LIMIT ?)",
+                            (pid, last_id, due)).fetchone()[0]
+        if pending >= due: write_snapshot(c, pid)
+
+def _conflict_message(c: sqlite3.Cursor, expected: Dict[int, int]) -> str:
+    """Names the rows whose version moved on (and who changed them last) or that are gone. Call after the rollback."""
+    ids = list(expected)
+    current = dict(c.execute(f"SELECT id, version FROM rohrbuch WHERE id IN ({', '.join('?' for _ in ids)})", ids).fetchall())
+    parts = []
+    for entry_id, version in expected.items():
+        if entry_id not in current:
+            parts.append(f"#{entry_id} wurde gelöscht")
+        elif version is not None and current[entry_id] != version:
+            who = c.execute("""SELECT user_name FROM rohrbuch_history WHERE entry_id = ?
+                               AND project_id = (SELECT project_id FROM rohrbuch WHERE id = ?) ORDER BY id DESC LIMIT 1""",
+                            (entry_id, entry_id)).fetchone()
+            parts.append(f"#{entry_id} wurde von {who[0]} geändert" if who and who[0] else f"#{entry_id} wurde geändert")
+    return "Konflikt, nichts gespeichert: " + ", ".join(parts) + " (in einer anderen Sitzung). Bitte neu auswählen und erneut ändern."
+
+def _workspace_base(c: sqlite3.Cursor, project_id: int) -> dict:
+    """Stored workspace version, fitting list and cut versions: the base of the next merging save."""
+    row = c.execute("SELECT workspace_version, workspace_data FROM projects WHERE id = ?", (project_id,)).fetchone()
+    fitting_list = (json.loads(row[1]) if row and row[1] else {}).get('fitting_list', [])
+    cuts = dict(c.execute("SELECT cut_id, version FROM workspace_cuts WHERE project_id = ?", (project_id,)).fetchall())
+    return {'version': row[0] if row else 0, 'fitting_list': fitting_list, 'cuts': cuts}
+
+def _merge_items(base: List[dict], ours: List[dict], theirs: List[dict], key: str = 'id') -> List[dict]:
+    """
+    Three-way merge of two edited copies (ours, theirs) of a list of items with ids: additions and
+    removals of both sides are kept; an item edited on both sides takes our edit.
+    """
+    base_by_id, ours_by_id = {item[key]: item for item in base}, {item[key]: item for item in ours}
+    pick = lambda item: ours_by_id[item[key]] if ours_by_id[item[key]] != base_by_id.get(item[key]) else item
+    merged = [pick(item) if item[key] in ours_by_id else item for item in theirs if item[key] in ours_by_id or item[key] not in base_by_id]
+    present = {item[key] for item in merged}
+    return merged + [item for item in ours if item[key] not in base_by_id and item[key] not in present]
+
+def _utc_text(when: datetime) -> str:
+    # History timestamps are UTC text with milliseconds; naive datetimes are local time
+    utc = when.astimezone(timezone.utc)
+    return utc.strftime("%Y-%m-%d %H:%M:%S.") + f"{utc.microsecond // 1000:03d}"
 
 class DatabaseRepository:
     @staticmethod
     def init_db():
-        with sqlite3.connect(DB_NAME) as conn:
-            c = conn.cursor()
-            c.execute('''CREATE TABLE IF NOT EXISTS rohrbuch (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT, 
-                        iso TEXT, naht TEXT, datum TEXT, 
-                        dimension TEXT, bauteil TEXT, laenge REAL, 
-                        charge TEXT, charge_apz TEXT, schweisser TEXT,
-                        project_id INTEGER)''')
-            c.execute('''CREATE TABLE IF NOT EXISTS projects (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        name TEXT NOT NULL UNIQUE,
-                        created_at TEXT,
-                        archived INTEGER DEFAULT 0)''') 
-            c.execute("PRAGMA table_info(rohrbuch)")
-            cols = [info[1] for info in c.fetchall()]
-            if 'charge_apz' not in cols:
-                try: c.execute("ALTER TABLE rohrbuch ADD COLUMN charge_apz TEXT")
-                except sqlite3.OperationalError: pass  # Column already exists
-            if 'project_id' not in cols:
-                try: c.execute("ALTER TABLE rohrbuch ADD COLUMN project_id INTEGER")
-                except sqlite3.OperationalError: pass  # Column already exists
-            c.execute("PRAGMA table_info(projects)")
-            p_cols = [info[1] for info in c.fetchall()]
-            if 'archived' not in p_cols:
-                try: c.execute("ALTER TABLE projects ADD COLUMN archived INTEGER DEFAULT 0")
-                except sqlite3.OperationalError: pass  # Column already exists
-            if 'workspace_data' not in p_cols:
-                try: c.execute("ALTER TABLE projects ADD COLUMN workspace_data TEXT")
-                except sqlite3.OperationalError: pass
-            if 'order_number' not in p_cols:
-                try: c.execute("ALTER TABLE projects ADD COLUMN order_number TEXT")
-                except sqlite3.OperationalError: pass
-            
-            c.execute("INSERT OR IGNORE INTO projects (id, name, created_at, archived, order_number) VALUES (1, 'Standard Baustelle', ?, 0, '')", 
-                      (datetime.now().strftime("%d.%m.%Y"),))
-            c.execute("UPDATE rohrbuch SET project_id = 1 WHERE project_id IS NULL")
-            conn.commit()
+        """Brings the schema up to date. Runs the migrations once per process and database file."""
+        key = (os.getpid(), DB_NAME)
+        if key in _MIGRATED: return
+        with _MIGRATE_LOCK:
+            if key in _MIGRATED: return
+            with connection() as conn:
+                migrate(conn)
+            _MIGRATED.add(key)
 
     @staticmethod
     def get_projects() -> List[tuple]:
-        with sqlite3.connect(DB_NAME) as conn:
+        with connection() as conn:
             # Returns: id, name, archived, order_number
             return conn.cursor().execute("SELECT id, name, archived, order_number FROM projects ORDER BY id ASC").fetchall()
 
     @staticmethod
     def create_project(name: str, order_num: str = ""):
         try:
-            with sqlite3.connect(DB_NAME) as conn:
+            with connection() as conn:
                 conn.cursor().execute("INSERT INTO projects (name, created_at, archived, order_number) VALUES (?, ?, 0, ?)", 
                                       (name, datetime.now().strftime("%d.%m.%Y"), order_num))
                 conn.commit()
@@ -69,79 +269,380 @@ class DatabaseRepository:
     @staticmethod
     def toggle_archive_project(project_id: int, archive: bool):
         val = 1 if archive else 0
-        with sqlite3.connect(DB_NAME) as conn:
+        with connection() as conn:
             conn.cursor().execute("UPDATE projects SET archived = ? WHERE id = ?", (val, project_id))
             conn.commit()
             
     @staticmethod
-    def save_workspace(project_id: int, data: dict):
-        """Saves the current workspace state (fitting list, cuts) to the project"""
+    def save_workspace(project_id: int, data: dict, base: dict = None):
+        """
+        Saves the complete workspace state (fitting list, cuts) to the project. With base (see
+        load_workspace) it is merged with what other sessions saved meanwhile (save_workspace_delta),
+        without it replaces what was stored. Returns the save_workspace_delta result, None on error.
+        """
         try:
-            json_str = json.dumps(data)
-            with sqlite3.connect(DB_NAME) as conn:
-                conn.cursor().execute("UPDATE projects SET workspace_data = ? WHERE id = ?", (json_str, project_id))
-                conn.commit()
+            cuts = data.get('saved_cuts', [])
+            if base is None:
+                return DatabaseRepository.save_workspace_delta(project_id, data.get('fitting_list', []), cuts, [], replace=True)
+            kept = {cut['id'] for cut in cuts}
+            return DatabaseRepository.save_workspace_delta(project_id, data.get('fitting_list', []), cuts,
+                                                           [cid for cid in base['cuts'] if cid not in kept], base=base)
         except Exception as e:
             print(f"Error saving workspace: {e}")
 
     @staticmethod
-    def load_workspace(project_id: int) -> dict:
-        """Loads variable workspace state from JSON"""
+    def save_workspace_delta(project_id: int, fitting_list, upserts: List[dict], deleted_ids: List[int], replace: bool = False,
+                             base: dict = None) -> dict:
+        """
+        Writes only the changed parts of a workspace in one transaction.
+        fitting_list: new fitting list or None if unchanged. upserts: changed/new cuts (asdict form).
+        replace=True drops all stored cuts first.
+        base: the stored state the changes were made on (load_workspace(with_base=True) or the last
+        save's result). With it, what other sessions saved since is merged, not overwritten: the
+        fitting list three-way by item id; a cut changed on both sides keeps their version and
+        stores ours as a copy; a cut changed elsewhere is not deleted.
+        Returns {'base': state after the save, 'merged': True if other sessions had saved since base
+        (reload the workspace), 'conflicts': messages}.
+        """
+        conflicts = []
+        with connection() as conn:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            row = c.execute("SELECT workspace_version, workspace_data FROM projects WHERE id = ?", (project_id,)).fetchone()
+            stored_version = row[0] if row else 0
+            merged = base is not None and stored_version != base['version']
+            # Every save bumps the workspace version; cuts written get it as their version (never reused)
+            version = stored_version + 1
+            c.execute("UPDATE projects SET workspace_version = ? WHERE id = ?", (version, project_id))
+            if replace: c.execute("DELETE FROM workspace_cuts WHERE project_id = ?", (project_id,))
+            stored = {r[0]: (r[1], r[2]) for r in c.execute("SELECT cut_id, version, data FROM workspace_cuts WHERE project_id = ?", (project_id,))}
+            known = base['cuts'] if base is not None else {}
+            changed_elsewhere = lambda cid: base is not None and cid in stored and stored[cid][0] != known.get(cid)
+
+            if fitting_list is not None:
+                if merged:
+                    theirs = (json.loads(row[1]) if row[1] else {}).get('fitting_list', [])
+                    fitting_list = _merge_items(base['fitting_list'], fitting_list, theirs)
+                c.execute("UPDATE projects SET workspace_data = ? WHERE id = ?", (json.dumps({'fitting_list': fitting_list}), project_id))
+            for cid in deleted_ids:
+                if changed_elsewhere(cid):
+                    conflicts.append(f"Schnitt #{cid} wurde in einer anderen Sitzung geändert und bleibt erhalten.")
+                    continue
+                c.execute("DELETE FROM workspace_cuts WHERE project_id = ? AND cut_id = ?", (project_id, cid))
+                stored.pop(cid, None)
+            for cut in upserts:
+                cid, blob = cut['id'], json.dumps(cut)
+                if cid in stored and stored[cid][1] == blob: continue
+                if changed_elsewhere(cid):
+                    # Changed (or the id taken) by another session since base: theirs stays, ours becomes a copy
+                    cid = max([*stored, *known, *deleted_ids, *(u['id'] for u in upserts)]) + 1
+                    cut = dict(cut, id=cid)
+                    blob = json.dumps(cut)
+                    conflicts.append(f"Schnitt '{cut.get('name', cid)}' wurde parallel geändert, Ihre Fassung ist als Kopie #{cid} gespeichert.")
+                elif cid in known and cid not in stored:
+                    conflicts.append(f"Schnitt '{cut.get('name', cid)}' wurde in einer anderen Sitzung gelöscht und mit Ihren Änderungen wiederhergestellt.")
+                c.execute('''INSERT INTO workspace_cuts (project_id, cut_id, data, version) VALUES (?, ?, ?, ?)
+                             ON CONFLICT(project_id, cut_id) DO UPDATE SET data = excluded.data, version = excluded.version''',
+                          (project_id, cid, blob, version))
+                stored[cid] = (version, blob)
+            new_base = _workspace_base(c, project_id)
+            conn.commit()
+        return {'base': new_base, 'merged': merged or bool(conflicts), 'conflicts': conflicts}
+
+    @staticmethod
+    def load_workspace(project_id: int, with_base: bool = False):
+        """
+        Loads variable workspace state (fitting list from JSON, cuts from workspace_cuts).
+        with_base=True returns (data, base), base being the versions to pass to the next save.
+        """
         try:
-            with sqlite3.connect(DB_NAME) as conn:
-                row = conn.cursor().execute("SELECT workspace_data FROM projects WHERE id = ?", (project_id,)).fetchone()
-                if row and row[0]:
-                    return json.loads(row[0])
+            with connection() as conn:
+                c = conn.cursor()
+                c.execute("BEGIN")  # data and versions from one read transaction
+                row = c.execute("SELECT workspace_data FROM projects WHERE id = ?", (project_id,)).fetchone()
+                cuts = [json.loads(r[0]) for r in c.execute("SELECT data FROM workspace_cuts WHERE project_id = ? ORDER BY cut_id", (project_id,))]
+                base = _workspace_base(c, project_id) if with_base else None
+            data = json.loads(row[0]) if row and row[0] else {}
+            if cuts: data['saved_cuts'] = cuts
+            return (data, base) if with_base else data
         except Exception as e:
             print(f"Error loading workspace: {e}")
-        return {}
+        return ({}, None) if with_base else {}
 
     @staticmethod
     def add_entry(data: dict):
-        with sqlite3.connect(DB_NAME) as conn:
-            c = conn.cursor()
+        DatabaseRepository.add_entries([data])
+
+    @staticmethod
+    def add_entries(rows: List[dict]) -> int:
+        """Inserts many logbook rows in one transaction (all or nothing). Returns the number of rows written."""
+        if not rows: return 0
+        params = []
+        for data in rows:
             pid = data.get('project_id', 1)
             if pid is None: pid = 1
-            c.execute('''INSERT INTO rohrbuch 
+            params.append(dict(data, project_id=pid))
+        with connection() as conn:
+            c = conn.cursor()
+            mark = _history_mark(c)
+            c.executemany('''INSERT INTO rohrbuch 
                          (iso, naht, datum, dimension, bauteil, laenge, charge, charge_apz, schweisser, project_id) 
                          VALUES (:iso, :naht, :datum, :dimension, :bauteil, :laenge, :charge, :charge_apz, :schweisser, :project_id)''', 
-                         dict(data, project_id=pid))
-            conn.commit()
+                         params)
+            added = {}
+            if any(_loaded_index(p['project_id']) for p in params):
+                # AUTOINCREMENT ids of one transaction are consecutive
+                first_id = c.execute("SELECT last_insert_rowid()").fetchone()[0] - len(params) + 1
+                for row_id, p in enumerate(params, start=first_id):
+                    added.setdefault(p['project_id'], []).append((row_id, p))
+            changes = _autocomplete_changes(c, {}, added)
+            _snapshots_due(c, mark)
+            _commit_autocomplete(conn, changes)
+        return len(params)
 
     @staticmethod
     def get_logbook_by_project(project_id: int) -> pd.DataFrame:
-        with sqlite3.connect(DB_NAME) as conn:
+        with connection() as conn:
             df = pd.read_sql_query("SELECT * FROM rohrbuch WHERE project_id = ? ORDER BY id DESC", conn, params=(project_id,))
             if not df.empty: 
                 df['✏️'] = False 
                 df['Löschen'] = False
             else: 
-                df = pd.DataFrame(columns=["id", "iso", "naht", "datum", "dimension", "bauteil", "laenge", "charge", "charge_apz", "schweisser", "project_id", "✏️", "Löschen"])
+                df = pd.DataFrame(columns=LOGBOOK_COLUMNS + ["✏️", "Löschen"])
             return df
 
     @staticmethod
-    def update_full_entry(entry_id: int, data: dict):
-        with sqlite3.connect(DB_NAME) as conn:
+    def _logbook_filter(project_id: int, filters: dict) -> Tuple[str, list]:
+        """WHERE clause for the logbook filters. Text filters match substrings, case-insensitive."""
+        where, args = ["project_id = ?"], [project_id]
+        for col in ('iso', 'schweisser', 'charge_apz'):
+            val = filters.get(col)
+            if val:
+                # % and _ typed by the user are literal characters, not wildcards
+                where.append(f"{col} LIKE ? ESCAPE '\\'")
+                args.append("%" + val.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + "%")
+        dim = filters.get('dimension')
+        if dim:
+            # The exact stored value, as listed by get_known_values (also "100" or "dn100")
+            where.append("dimension = ?")
+            args.append(dim)
+        # datum is stored as dd.mm.yyyy, compare as yyyymmdd
+        iso_date = "substr(datum, 7, 4) || substr(datum, 4, 2) || substr(datum, 1, 2)"
+        if filters.get('date_from'):
+            where.append(f"{iso_date} >= ?")
+            args.append(filters['date_from'].strftime("%Y%m%d"))
+        if filters.get('date_to'):
+            where.append(f"{iso_date} <= ?")
+            args.append(filters['date_to'].strftime("%Y%m%d"))
+        return " AND ".join(where), args
+
+    @staticmethod
+    def query_logbook(project_id: int, filters: dict = None, columns: List[str] = None,
+                      limit: int = 100, offset: int = 0, after_id: int = None) -> Tuple[pd.DataFrame, int]:
+        """
+        One page of the logbook, newest first, plus the total number of matching rows.
+        filters: iso, schweisser, charge_apz, dimension, date_from, date_to (dates as date objects).
+        Pages either by offset or, for deep paging, by keyset (after_id = last id of the previous page).
+        columns may include 'version' (row version for the optimistic locking of the edits).
+        limit=None returns all matching rows.
+        """
+        cols = [c for c in (columns or LOGBOOK_COLUMNS) if c in LOGBOOK_COLUMNS or c == 'version']
+        if 'id' not in cols: cols.insert(0, 'id')
+        where, args = DatabaseRepository._logbook_filter(project_id, filters or {})
+        with connection() as conn:
+            total = conn.cursor().execute(f"SELECT COUNT(*) FROM rohrbuch WHERE {where}", args).fetchone()[0]
+            query = f"SELECT {', '.join(cols)} FROM rohrbuch WHERE {where}"
+            page_args = list(args)
+            if after_id is not None:
+                query += " AND id < ?"
+                page_args.append(after_id)
+            query += " ORDER BY id DESC"
+            if limit is not None:
+                query += " LIMIT ? OFFSET ?"
+                page_args += [limit, 0 if after_id is not None else offset]
+            df = pd.read_sql_query(query, conn, params=page_args)
+        return df, total
+
+    @staticmethod
+    def iter_logbook(project_id: int, filters: dict = None, columns: List[str] = None, chunk_size: int = 2000) -> Iterator[tuple]:
+        """
+        Streams the matching logbook rows (newest first) as tuples in the order of columns,
+        fetched from the cursor chunk_size rows at a time. Holds a pooled connection until exhausted.
+        """
+        cols = [c for c in (columns or LOGBOOK_COLUMNS) if c in LOGBOOK_COLUMNS]
+        where, args = DatabaseRepository._logbook_filter(project_id, filters or {})
+        with connection() as conn:
+            cur = conn.cursor()
+            cur.arraysize = chunk_size
+            cur.execute(f"SELECT {', '.join(cols)} FROM rohrbuch WHERE {where} ORDER BY id DESC", args)
+            while True:
+                chunk = cur.fetchmany()
+                if not chunk: break
+                yield from chunk
+
+    @staticmethod
+    def get_mto_groups(project_id: int) -> pd.DataFrame:
+        """MTO aggregates per (dimension, bauteil) from mto_summary: summed length in mm and piece count."""
+        with connection() as conn:
+            return pd.read_sql_query("SELECT dimension, bauteil, laenge_mm, anzahl FROM mto_summary WHERE project_id = ?",
+                                     conn, params=(project_id,))
+
+    @staticmethod
+    def check_mto_summary(project_id: int = None, repair: bool = True) -> int:
+        """
+        Compares mto_summary with the logbook (all projects or one) and returns the number of
+        differing (project, dimension, bauteil) entries. repair=True rebuilds the summary from scratch.
+        """
+        where, args = ("AND project_id = ?", [project_id]) if project_id is not None else ("", [])
+        with connection() as conn:
+            c = conn.cursor()
+            fresh = {tuple(r[:3]): r[3:] for r in c.execute(MTO_GROUPS_SQL.format(where=where), args)}
+            stored = {tuple(r[:3]): r[3:] for r in c.execute(
+                f"SELECT project_id, dimension, bauteil, laenge_mm, anzahl FROM mto_summary WHERE 1 {where}", args)}
+            differing = sum(1 for key in fresh.keys() | stored.keys()
+                            if key not in fresh or key not in stored or fresh[key][1] != stored[key][1]
+                            or abs(fresh[key][0] - stored[key][0]) > 1e-6 * max(1.0, abs(fresh[key][0])))
+            if repair and differing:
+                c.execute(f"DELETE FROM mto_summary WHERE 1 {where}", args)
+                c.execute("INSERT INTO mto_summary (project_id, dimension, bauteil, laenge_mm, anzahl) " + MTO_GROUPS_SQL.format(where=where), args)
+                conn.commit()
+        return differing
+
+    @staticmethod
+    def search(project_id: int, query: str, limit: int = 50, marks: Tuple[str, str] = ("«", "»")) -> pd.DataFrame:
+        """
+        Full-text search in a project's logbook (ISO, Naht, Schweißer, Charge, APZ). Every word of
+        the query must match the start of a word ("47" finds "ISO-4711"). Ranked by the matched
+        fields (SEARCH_WEIGHTS, whole-word matches count double), then newest first, among the
+        newest SEARCH_WINDOW hits. Column 'treffer' shows the matched text between marks.
+        """
+        cols = ['id', 'iso', 'naht', 'datum', 'dimension', 'bauteil', 'schweisser', 'charge', 'charge_apz']
+        words = [w for w in query.split() if any(ch.isalnum() for ch in w)]
+        if not words: return pd.DataFrame(columns=cols + ['treffer'])
+        with connection() as conn:
             c = conn.cursor()
+            if c.execute("SELECT 1 FROM sqlite_master WHERE name = 'rohrbuch_fts'").fetchone():
+                # Words as quoted prefix phrases, restricted to the text columns and the project's token
+                terms = " AND ".join('"' + w.replace('"', '""') + '"*' for w in words)
+                match = f"projekt : p{int(project_id)} AND {{{' '.join(FTS_COLUMNS)}}} : ({terms})"
+                highlights = ", ".join(f"highlight(rohrbuch_fts, {i}, ?, ?)" for i in range(len(FTS_COLUMNS)))
+                # Newest hits straight off the doclists; bm25 would need the corpus-wide counts of every term
+                hits = c.execute(f"SELECT rowid, {highlights} FROM rohrbuch_fts WHERE rohrbuch_fts MATCH ? ORDER BY rowid DESC LIMIT ?",
+                                 [*marks] * len(FTS_COLUMNS) + [match, SEARCH_WINDOW]).fetchall()
+            else:  # SQLite built without FTS5: substring match, newest first
+                where = " AND ".join(f"({' OR '.join(f'{col} LIKE ?' for col in FTS_COLUMNS)})" for _ in words)
+                args = [f"%{w}%" for w in words for _ in FTS_COLUMNS]
+                hits = [(r[0],) + (None,) * len(FTS_COLUMNS) for r in c.execute(
+                    f"SELECT id FROM rohrbuch WHERE project_id = ? AND {where} ORDER BY id DESC LIMIT ?",
+                    [project_id] + args + [limit]).fetchall()]
+            folded = {w.casefold() for w in words}
+            scored = []
+            for row_id, *texts in hits:
+                score, found = 0.0, []
+                for col, text in zip(FTS_COLUMNS, texts):
+                    if not text or marks[0] not in text: continue
+                    found.append(f"{SEARCH_LABELS[col]}: {text}")
+                    for span in text.split(marks[0])[1:]:
+                        score += SEARCH_WEIGHTS[col] * (2 if span.split(marks[1])[0].casefold() in folded else 1)
+                scored.append((-score, -row_id, " | ".join(found)))
+            top = sorted(scored)[:limit]
+            placeholders = ', '.join('?' for _ in top)
+            data = {r[0]: r for r in c.execute(f"SELECT {', '.join(cols)} FROM rohrbuch WHERE id IN ({placeholders})",
+                                               [-t[1] for t in top]).fetchall()} if top else {}
+        return pd.DataFrame.from_records([data[-t[1]] + (t[2],) for t in top], columns=cols + ['treffer'])
+
+    @staticmethod
+    def trace_heat(charge_apz: str) -> pd.DataFrame:
+        """
+        Every weld of every project that used the given APZ/Charge (exact, case-insensitive),
+        grouped by project, in logbook order. One range scan of idx_rohrbuch_charge_apz_trace.
+        """
+        with connection() as conn:
+            df = pd.read_sql_query(f"SELECT {', '.join(TRACE_COLUMNS)} FROM rohrbuch WHERE charge_apz = ? COLLATE NOCASE ORDER BY project_id, id",
+                                   conn, params=(charge_apz.strip(),))
+            # Project data by primary key, a handful of rows (a join may scan projects once per weld)
+            ids = df['project_id'].dropna().unique().tolist()
+            projects = pd.read_sql_query(f"""SELECT id AS project_id, name AS projekt, order_number AS auftrag, archived AS archiviert
+                                             FROM projects WHERE id IN ({', '.join('?' for _ in ids)})""", conn, params=ids)
+        return df.merge(projects, on='project_id', how='left')
+
+    @staticmethod
+    def find_heats(prefix: str, limit: int = 20) -> pd.DataFrame:
+        """APZ/Charge values starting with prefix (case-insensitive) with their number of projects and welds."""
+        pattern = prefix.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        with connection() as conn:
+            return pd.read_sql_query("""SELECT MIN(charge_apz) AS charge_apz, COUNT(DISTINCT project_id) AS projekte, COUNT(*) AS naehte
+                                        FROM rohrbuch WHERE charge_apz LIKE ? ESCAPE '\\' AND charge_apz <> ''
+                                        GROUP BY charge_apz COLLATE NOCASE ORDER BY rohrbuch.charge_apz COLLATE NOCASE LIMIT ?""",
+                                     conn, params=(pattern, limit))
+
+    @staticmethod
+    def get_pipe_lengths(project_id: int, linear_items: List[str]) -> pd.DataFrame:
+        """Pipe pieces of a project (rows with a length) for cutting optimization."""
+        with connection() as conn:
+            placeholders = ', '.join('?' for _ in linear_items)
+            return pd.read_sql_query(f"""SELECT id, iso, naht, dimension, bauteil, laenge FROM rohrbuch 
+                                         WHERE project_id = ? AND bauteil IN ({placeholders}) AND laenge > 0 ORDER BY id""",
+                                     conn, params=[project_id] + list(linear_items))
+
+    @staticmethod
+    def update_full_entry(entry_id: int, data: dict, expected_version: int = None) -> Tuple[bool, str]:
+        """
+        Overwrites a logbook row. With expected_version (the version the editor was loaded with)
+        the update is a compare-and-swap: if another session changed or deleted the row since,
+        nothing is written and (False, conflict message) is returned.
+        """
+        with connection() as conn:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")  # rows read for the autocomplete index must not change before the write
+            mark = _history_mark(c)
+            before = _indexed_rows(c, "id = ?", [entry_id])
             c.execute('''UPDATE rohrbuch 
                          SET iso = :iso, naht = :naht, datum = :datum, 
                              dimension = :dimension, bauteil = :bauteil, laenge = :laenge,
-                             charge_apz = :charge_apz, schweisser = :schweisser
-                         WHERE id = :id''', 
-                         dict(data, id=entry_id))
-            conn.commit()
+                             charge_apz = :charge_apz, schweisser = :schweisser, version = version + 1
+                         WHERE id = :id AND (:expected IS NULL OR version = :expected)''', 
+                         dict(data, id=entry_id, expected=expected_version))
+            if c.rowcount == 0:
+                conn.rollback()
+                if expected_version is None: return False, f"Eintrag #{entry_id} nicht gefunden."
+                return False, _conflict_message(c, {entry_id: expected_version})
+            # charge is not part of the update
+            after = {pid: [(r['id'], dict(data, charge=r['charge'])) for r in rows] for pid, rows in before.items()}
+            changes = _autocomplete_changes(c, before, after)
+            _snapshots_due(c, mark)
+            _commit_autocomplete(conn, changes)
+        return True, "Eintrag aktualisiert."
 
     @staticmethod
-    def delete_entries(ids: List[int]):
-        if not ids: return
-        with sqlite3.connect(DB_NAME) as conn:
+    def delete_entries(ids: List[int], versions: Dict[int, int] = None) -> Tuple[bool, str]:
+        """Deletes logbook rows. With versions (id -> expected version) all or nothing, see bulk_update."""
+        if not ids: return True, "Nichts zu löschen."
+        ids = list(dict.fromkeys(ids))  # a row selected twice is deleted (and checked) once
+        with connection() as conn:
+            c = conn.cursor()
             placeholders = ', '.join('?' for _ in ids)
-            conn.cursor().execute(f"DELETE FROM rohrbuch WHERE id IN ({placeholders})", ids)
-            conn.commit()
+            c.execute("BEGIN IMMEDIATE")
+            mark = _history_mark(c)
+            before = _indexed_rows(c, f"id IN ({placeholders})", ids)
+            expected = [(versions or {}).get(i) for i in ids]
+            c.executemany("DELETE FROM rohrbuch WHERE id = ? AND (? IS NULL OR version = ?)", [(i, v, v) for i, v in zip(ids, expected)])
+            if versions is not None and c.rowcount < len(ids):
+                conn.rollback()
+                return False, _conflict_message(c, dict(zip(ids, expected)))
+            changes = _autocomplete_changes(c, before, {})
+            _snapshots_due(c, mark)
+            _commit_autocomplete(conn, changes)
+        return True, f"{len(ids)} Einträge gelöscht."
 
     @staticmethod
-    def bulk_update(ids: List[int], field: str, value: str):
-        if not ids: return
+    def bulk_update(ids: List[int], field: str, value: str, versions: Dict[int, int] = None) -> Tuple[bool, str]:
+        """
+        Sets one field of many logbook rows. With versions (id -> version the rows were loaded with)
+        every row is a compare-and-swap and the edit is all or nothing: if any row was changed or
+        deleted by another session, nothing is written and (False, conflict message) is returned.
+        """
+        if not ids: return True, "Nichts zu ändern."
         allowed_map = {
             "Schweißer": "schweisser",
             "APZ / Charge": "charge_apz",
@@ -149,27 +650,143 @@ class DatabaseRepository:
             "Datum": "datum"
         }
         db_col = allowed_map.get(field)
-        if not db_col: return
+        if not db_col: return False, f"Feld '{field}' kann nicht gesammelt geändert werden."
+        ids = list(dict.fromkeys(ids))  # a second update of the same row would fail its version check
 
-        with sqlite3.connect(DB_NAME) as conn:
+        with connection() as conn:
+            c = conn.cursor()
             placeholders = ', '.join('?' for _ in ids)
-            query = f"UPDATE rohrbuch SET {db_col} = ? WHERE id IN ({placeholders})"
-            args = [value] + ids
-            conn.cursor().execute(query, args)
+            c.execute("BEGIN IMMEDIATE")
+            mark = _history_mark(c)
+            before = _indexed_rows(c, f"id IN ({placeholders})", ids)
+            expected = [(versions or {}).get(i) for i in ids]
+            c.executemany(f"UPDATE rohrbuch SET {db_col} = ?, version = version + 1 WHERE id = ? AND (? IS NULL OR version = ?)",
+                          [(value, i, v, v) for i, v in zip(ids, expected)])
+            if versions is not None and c.rowcount < len(ids):
+                conn.rollback()
+                return False, _conflict_message(c, dict(zip(ids, expected)))
+            after = {pid: [(r['id'], dict(r, **{db_col: value})) for r in rows] for pid, rows in before.items()}
+            changes = _autocomplete_changes(c, before, after)
+            _snapshots_due(c, mark)
+            _commit_autocomplete(conn, changes)
+        return True, f"{len(ids)} Einträge aktualisiert."
+
+    @staticmethod
+    def get_history(project_id: int, entry_id: int = None, limit: int = 200) -> pd.DataFrame:
+        """
+        Change log of a project's logbook (or of one entry), newest first: id, ts (UTC), user_name,
+        op ('I' new row, 'U' changed columns, 'D' deleted), entry_id, delta (JSON of the new values).
+        limit=None returns the whole history.
+        """
+        query, args = "SELECT id, ts, user_name, op, entry_id, delta FROM rohrbuch_history WHERE project_id = ?", [project_id]
+        if entry_id is not None:
+            query += " AND entry_id = ?"
+            args.append(entry_id)
+        with connection() as conn:
+            return pd.read_sql_query(query + " ORDER BY id DESC LIMIT ?", conn, params=args + [-1 if limit is None else limit])
+
+    @staticmethod
+    def snapshot_logbook(project_id: int) -> int:
+        """Snapshots a project's logbook now (writes also take one as the history grows). Returns the snapshot id."""
+        with connection() as conn:
+            c = conn.cursor()
+            c.execute("BEGIN IMMEDIATE")
+            snapshot_id = write_snapshot(c, project_id)
+            conn.commit()
+        return snapshot_id
+
+    @staticmethod
+    def logbook_as_of(project_id: int, when: datetime) -> pd.DataFrame:
+        """
+        A project's logbook as it was at `when` (naive datetimes are local time), newest first,
+        columns LOGBOOK_COLUMNS. Starts from the last snapshot before `when` and replays the
+        history up to `when`, at most up to the next snapshot. Raises ValueError for times
+        before the history existed (migration 9) in projects that already had rows then.
+        """
+        ts = _utc_text(when)
+        with connection() as conn:
+            c = conn.cursor()
+            c.execute("BEGIN")  # snapshot and events from one read transaction
+            snap = c.execute("""SELECT history_id, data FROM rohrbuch_snapshots WHERE project_id = ? AND ts <= ?
+                                ORDER BY history_id DESC LIMIT 1""", (project_id, ts)).fetchone()
+            following = c.execute("SELECT MIN(history_id) FROM rohrbuch_snapshots WHERE project_id = ? AND ts > ?",
+                                  (project_id, ts)).fetchone()[0]
+            if snap is None and following == 0:
+                raise ValueError(f"Kein Änderungsverlauf vor {when:%d.%m.%Y %H:%M} (Projekt {project_id})")
+            query, args = "SELECT op, entry_id, delta FROM rohrbuch_history WHERE project_id = ? AND id > ? AND ts <= ?", [project_id, snap[0] if snap else 0, ts]
+            if following is not None:
+                query += " AND id <= ?"
+                args.append(following)
+            events = c.execute(query + " ORDER BY id", args).fetchall()
+        # Rows as [id, *HISTORY_COLUMNS] lists, as stored in the snapshot
+        state = {r[0]: r for r in json.loads(zlib.decompress(snap[1]))} if snap else {}
+        pos = {col: i for i, col in enumerate(HISTORY_COLUMNS, start=1)}
+        for op, entry_id, delta in events:
+            if op == 'D':
+                state.pop(entry_id, None)
+                continue
+            if op == 'I': state[entry_id] = [entry_id] + [None] * len(HISTORY_COLUMNS)
+            row = state.get(entry_id)
+            if row is None: continue
+            for col, value in json.loads(delta).items(): row[pos[col]] = value
+        df = pd.DataFrame([state[i] for i in sorted(state, reverse=True)], columns=LOGBOOK_COLUMNS[:-1])
+        df['project_id'] = project_id
+        return df
+
+    @staticmethod
+    def get_known_values(column: str, project_id: int, limit: int = 50, prefix: str = "", order: str = "recent") -> List[str]:
+        """
+        Values used in a logbook column of a project, most recent first (order="frequent":
+        most used first), optionally only those starting with prefix (case-insensitive).
+        Served from the in-process autocomplete index.
+        """
+        if column not in AUTOCOMPLETE_COLUMNS: return []
+        return autocomplete_index(project_id).query(column, prefix, limit, order)
+
+    @staticmethod
+    def get_remnants(project_id: int, dimension: str = None) -> List[tuple]:
+        """Remnant store of a project. Returns: id, dimension, length, created_at, source"""
+        with connection() as conn:
+            query = "SELECT id, dimension, length, created_at, source FROM remnants WHERE project_id = ?"
+            args = [project_id]
+            if dimension is not None:
+                query += " AND dimension = ?"
+                args.append(dimension)
+            return conn.cursor().execute(query + " ORDER BY length DESC", args).fetchall()
+
+    @staticmethod
+    def apply_remnant_changes(project_id: int, dimension: str, consumed_ids: List[int], new_lengths: List[float],
+                              source: str = "") -> Tuple[bool, str]:
+        """
+        Books a cutting plan against the remnant store in one transaction: used remnants out, new offcuts in.
+        If a used remnant is gone (booked by another plan) or of another dimension, nothing is booked.
+        """
+        with connection() as conn:
+            c = conn.cursor()
+            if consumed_ids:
+                placeholders = ', '.join('?' for _ in consumed_ids)
+                c.execute(f"DELETE FROM remnants WHERE project_id = ? AND dimension = ? AND id IN ({placeholders})",
+                          [project_id, dimension] + list(consumed_ids))
+                if c.rowcount < len(set(consumed_ids)):
+                    conn.rollback()
+                    return False, "Reste wurden inzwischen anderweitig verbucht, nichts gespeichert. Bitte neu optimieren."
+            now = datetime.now().strftime("%d.%m.%Y")
+            c.executemany("INSERT INTO remnants (project_id, dimension, length, created_at, source) VALUES (?, ?, ?, ?, ?)",
+                          [(project_id, dimension, float(l), now, source) for l in new_lengths])
             conn.commit()
+        return True, f"{len(consumed_ids)} Reste entnommen, {len(new_lengths)} eingelagert."
 
     @staticmethod
-    def get_known_values(column: str, project_id: int, limit: int = 50) -> List[str]:
-        allowed = ['charge', 'charge_apz', 'schweisser', 'iso']
-        if column not in allowed: return []
-        with sqlite3.connect(DB_NAME) as conn:
-            query = f'''SELECT {column} FROM rohrbuch WHERE project_id = ? AND {column} IS NOT NULL AND {column} != '' GROUP BY {column} ORDER BY MAX(id) DESC LIMIT ?'''
-            rows = conn.cursor().execute(query, (project_id, limit)).fetchall()
-            return [r[0] for r in rows]
+    def delete_remnants(ids: List[int]):
+        if not ids: return
+        with connection() as conn:
+            placeholders = ', '.join('?' for _ in ids)
+            conn.cursor().execute(f"DELETE FROM remnants WHERE id IN ({placeholders})", ids)
+            conn.commit()
 
     @staticmethod
     def export_project_to_json(project_id: int) -> str:
-        with sqlite3.connect(DB_NAME) as conn:
+        with connection() as conn:
             proj = conn.cursor().execute("SELECT name, created_at FROM projects WHERE id = ?", (project_id,)).fetchone()
             if not proj: return None
             rows = conn.cursor().execute("SELECT iso, naht, datum, dimension, bauteil, laenge, charge, charge_apz, schweisser FROM rohrbuch WHERE project_id = ?", (project_id,)).fetchall()
@@ -184,8 +801,9 @@ class DatabaseRepository:
             data = json.loads(json_str)
             name = data.get("project_name") + " (Import)"
             entries = data.get("entries", [])
-            with sqlite3.connect(DB_NAME) as conn:
+            with connection() as conn:
                 c = conn.cursor()
+                mark = _history_mark(c)
                 try:
                     c.execute("INSERT INTO projects (name, created_at, archived) VALUES (?, ?, 0)", (name, datetime.now().strftime("%d.%m.%Y")))
                     new_pid = c.lastrowid
@@ -193,10 +811,10 @@ class DatabaseRepository:
                     name += f"_{int(time.time())}"
                     c.execute("INSERT INTO projects (name, created_at, archived) VALUES (?, ?, 0)", (name, datetime.now().strftime("%d.%m.%Y")))
                     new_pid = c.lastrowid
-                for e in entries:
-                    c.execute('''INSERT INTO rohrbuch (iso, naht, datum, dimension, bauteil, laenge, charge, charge_apz, schweisser, project_id) 
+                c.executemany('''INSERT INTO rohrbuch (iso, naht, datum, dimension, bauteil, laenge, charge, charge_apz, schweisser, project_id) 
                                  VALUES (:iso, :naht, :datum, :dimension, :bauteil, :laenge, :charge, :charge_apz, :schweisser, :project_id)''',
-                                 dict(e, project_id=new_pid))
+                              [dict(e, project_id=new_pid) for e in entries])
+                _snapshots_due(c, mark)
                 conn.commit()
             return True, f"Projekt '{name}' importiert!"
         except Exception as e:
@@ -0,0 +1,283 @@
+import json
+import sqlite3
+import zlib
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+# Schema migrations, applied in order. The database's PRAGMA user_version holds
+# the number of the last applied migration. Never edit a released migration,
+# append a new one instead.
+
+def _columns(c: sqlite3.Cursor, table: str) -> List[str]:
+    return [info[1] for info in c.execute(f"PRAGMA table_info({table})").fetchall()]
+
+def _m001_base_schema(c: sqlite3.Cursor):
+    # Also upgrades databases created before migrations existed (user_version 0)
+    c.execute('''CREATE TABLE IF NOT EXISTS rohrbuch (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                iso TEXT, naht TEXT, datum TEXT,
+                dimension TEXT, bauteil TEXT, laenge REAL,
+                charge TEXT, charge_apz TEXT, schweisser TEXT,
+                project_id INTEGER)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS projects (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL UNIQUE,
+                created_at TEXT,
+                archived INTEGER DEFAULT 0,
+                workspace_data TEXT,
+                order_number TEXT)''')
+    cols = _columns(c, 'rohrbuch')
+    if 'charge_apz' not in cols: c.execute("ALTER TABLE rohrbuch ADD COLUMN charge_apz TEXT")
+    if 'project_id' not in cols: c.execute("ALTER TABLE rohrbuch ADD COLUMN project_id INTEGER")
+    p_cols = _columns(c, 'projects')
+    if 'archived' not in p_cols: c.execute("ALTER TABLE projects ADD COLUMN archived INTEGER DEFAULT 0")
+    if 'workspace_data' not in p_cols: c.execute("ALTER TABLE projects ADD COLUMN workspace_data TEXT")
+    if 'order_number' not in p_cols: c.execute("ALTER TABLE projects ADD COLUMN order_number TEXT")
+    c.execute("INSERT OR IGNORE INTO projects (id, name, created_at, archived, order_number) VALUES (1, 'Standard Baustelle', ?, 0, '')",
+              (datetime.now().strftime("%d.%m.%Y"),))
+    c.execute("UPDATE rohrbuch SET project_id = 1 WHERE project_id IS NULL")
+
+def _m002_remnants(c: sqlite3.Cursor):
+    c.execute('''CREATE TABLE IF NOT EXISTS remnants (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                project_id INTEGER NOT NULL,
+                dimension TEXT, length REAL NOT NULL,
+                created_at TEXT, source TEXT)''')
+
+def _m003_indexes(c: sqlite3.Cursor):
+    # Logbook pages (ORDER BY id DESC) and the autocomplete GROUP BYs per column
+    c.execute("CREATE INDEX IF NOT EXISTS idx_rohrbuch_project_id ON rohrbuch(project_id, id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_rohrbuch_project_schweisser ON rohrbuch(project_id, schweisser)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_rohrbuch_project_charge_apz ON rohrbuch(project_id, charge_apz)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_rohrbuch_project_charge ON rohrbuch(project_id, charge)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_rohrbuch_project_iso ON rohrbuch(project_id, iso)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_remnants_project_dimension ON remnants(project_id, dimension)")
+    c.execute("ANALYZE")
+
+def _m004_dimension_index(c: sqlite3.Cursor):
+    # DN filter of the paginated logbook
+    c.execute("CREATE INDEX IF NOT EXISTS idx_rohrbuch_project_dimension ON rohrbuch(project_id, dimension)")
+
+def _m005_workspace_cuts(c: sqlite3.Cursor):
+    # Saved cuts as one row each, so autosave only upserts what changed
+    c.execute('''CREATE TABLE IF NOT EXISTS workspace_cuts (
+                project_id INTEGER NOT NULL,
+                cut_id INTEGER NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (project_id, cut_id)) WITHOUT ROWID''')
+    # Move the cuts out of the JSON blob, it keeps only the fitting list
+    for pid, blob in c.execute("SELECT id, workspace_data FROM projects WHERE workspace_data IS NOT NULL").fetchall():
+        try: data = json.loads(blob)
+        except ValueError: continue
+        if not isinstance(data, dict): continue
+        cuts = data.pop('saved_cuts', [])
+        c.executemany("INSERT OR REPLACE INTO workspace_cuts (project_id, cut_id, data) VALUES (?, ?, ?)",
+                      [(pid, cut['id'], json.dumps(cut)) for cut in cuts])
+        c.execute("UPDATE projects SET workspace_data = ? WHERE id = ?", (json.dumps(data), pid))
+
+# Length of a logbook row as summed by the MTO (non-numeric or NULL counts as 0)
+def _mto_length(row: str) -> str:
+    return f"CASE WHEN typeof({row}.laenge) IN ('integer', 'real') THEN {row}.laenge ELSE 0 END"
+
+def _mto_add(row: str) -> str:
+    return f"""INSERT INTO mto_summary (project_id, dimension, bauteil, laenge_mm, anzahl)
+                SELECT {row}.project_id, COALESCE({row}.dimension, ''), {row}.bauteil, {_mto_length(row)}, 1
+                WHERE {row}.project_id IS NOT NULL AND {row}.bauteil IS NOT NULL
+                ON CONFLICT (project_id, dimension, bauteil) DO UPDATE
+                SET laenge_mm = laenge_mm + excluded.laenge_mm, anzahl = anzahl + 1;"""
+
+def _mto_remove(row: str) -> str:
+    key = f"project_id = {row}.project_id AND dimension = COALESCE({row}.dimension, '') AND bauteil = {row}.bauteil"
+    return f"""UPDATE mto_summary SET laenge_mm = laenge_mm - {_mto_length(row)}, anzahl = anzahl - 1 WHERE {key};
+               DELETE FROM mto_summary WHERE {key} AND anzahl <= 0;"""
+
+# The summary computed from scratch; {where} narrows it, e.g. "AND project_id = ?"
+MTO_GROUPS_SQL = """SELECT project_id, COALESCE(dimension, '') AS dimension, bauteil,
+                           TOTAL(CASE WHEN typeof(laenge) IN ('integer', 'real') THEN laenge END) AS laenge_mm, COUNT(*) AS anzahl
+                    FROM rohrbuch WHERE project_id IS NOT NULL AND bauteil IS NOT NULL {where}
+                    GROUP BY project_id, 2, bauteil"""
+
+def _m006_mto_summary(c: sqlite3.Cursor):
+    # Material take-off per (project, dimension, bauteil), kept current by triggers on rohrbuch.
+    # Keyed by the dimension text: spellings of one DN ("DN 100", "100") are merged when read.
+    c.execute('''CREATE TABLE IF NOT EXISTS mto_summary (
+                project_id INTEGER NOT NULL,
+                dimension TEXT NOT NULL,
+                bauteil TEXT NOT NULL,
+                laenge_mm REAL NOT NULL DEFAULT 0,
+                anzahl INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (project_id, dimension, bauteil)) WITHOUT ROWID''')
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_rohrbuch_mto_insert AFTER INSERT ON rohrbuch BEGIN {_mto_add('NEW')} END")
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_rohrbuch_mto_delete AFTER DELETE ON rohrbuch BEGIN {_mto_remove('OLD')} END")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_rohrbuch_mto_update AFTER UPDATE OF project_id, dimension, bauteil, laenge ON rohrbuch
+                  BEGIN {_mto_remove('OLD')} {_mto_add('NEW')} END""")
+    c.execute("DELETE FROM mto_summary")
+    c.execute("INSERT INTO mto_summary (project_id, dimension, bauteil, laenge_mm, anzahl) " + MTO_GROUPS_SQL.format(where=""))
+
+FTS_COLUMNS = ['iso', 'naht', 'schweisser', 'charge', 'charge_apz']
+
+def _fts_row(row: str) -> str:
+    return f"{row}.id, " + ", ".join(f"{row}.{col}" for col in FTS_COLUMNS) + f", 'p' || {row}.project_id"
+
+def _fts5_available(c: sqlite3.Cursor) -> bool:
+    try:
+        c.execute("CREATE VIRTUAL TABLE IF NOT EXISTS temp.fts5_probe USING fts5(x)")
+        c.execute("DROP TABLE temp.fts5_probe")
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+def _m007_logbook_fts(c: sqlite3.Cursor):
+    # SQLite without FTS5: DatabaseRepository.search falls back to LIKE, and ensure_fts
+    # creates the index once the database is opened with an SQLite that has FTS5
+    if _fts5_available(c): _create_logbook_fts(c)
+
+def _create_logbook_fts(c: sqlite3.Cursor):
+    # Full-text index of the logbook's text columns. External content: the text lives
+    # only in rohrbuch, read through a view that adds the project as token "p<id>".
+    cols = ", ".join(FTS_COLUMNS)
+    c.execute(f"CREATE VIEW IF NOT EXISTS rohrbuch_fts_source AS SELECT id, {cols}, 'p' || project_id AS projekt FROM rohrbuch")
+    c.execute(f"""CREATE VIRTUAL TABLE IF NOT EXISTS rohrbuch_fts USING fts5(
+                  {cols}, projekt, content='rohrbuch_fts_source', content_rowid='id',
+                  tokenize='unicode61 remove_diacritics 2', prefix='1 2 3')""")
+    insert = f"INSERT INTO rohrbuch_fts (rowid, {cols}, projekt) VALUES ({_fts_row('NEW')});"
+    delete = f"INSERT INTO rohrbuch_fts (rohrbuch_fts, rowid, {cols}, projekt) VALUES ('delete', {_fts_row('OLD')});"
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_rohrbuch_fts_insert AFTER INSERT ON rohrbuch BEGIN {insert} END")
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_rohrbuch_fts_delete AFTER DELETE ON rohrbuch BEGIN {delete} END")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_rohrbuch_fts_update AFTER UPDATE OF {cols}, project_id ON rohrbuch
+                  BEGIN {delete} {insert} END""")
+    c.execute("INSERT INTO rohrbuch_fts (rohrbuch_fts) VALUES ('rebuild')")
+
+def _m008_heat_trace_index(c: sqlite3.Cursor):
+    # Heat-number recall across all projects: one range scan per APZ/Charge, case-insensitive
+    # (NOCASE also serves prefix LIKE). The (project_id, charge_apz) index only serves one project.
+    c.execute("CREATE INDEX IF NOT EXISTS idx_rohrbuch_charge_apz_trace ON rohrbuch(charge_apz COLLATE NOCASE, project_id, id)")
+
+# Audit trail: data columns of a logbook row as recorded in rohrbuch_history
+HISTORY_COLUMNS = ['iso', 'naht', 'datum', 'dimension', 'bauteil', 'laenge', 'charge', 'charge_apz', 'schweisser']
+
+def _history_delta(row: str, old: str = None) -> str:
+    # JSON of the columns that changed since old (old=None: the non-NULL columns). json_remove
+    # drops the others; kept columns get the path of a key that does not exist.
+    same = (lambda col: f"{row}.{col} IS {old}.{col}") if old else (lambda col: f"{row}.{col} IS NULL")
+    obj = ", ".join(f"'{col}', {row}.{col}" for col in HISTORY_COLUMNS)
+    paths = ", ".join(f"CASE WHEN {same(col)} THEN '$.{col}' ELSE '$._' END" for col in HISTORY_COLUMNS)
+    return f"json_remove(json_object({obj}), {paths})"
+
+def _history_event(op: str, row: str, delta: str) -> str:
+    return f"""INSERT INTO rohrbuch_history (ts, user_name, op, entry_id, project_id, delta)
+               VALUES (strftime('%Y-%m-%d %H:%M:%f', 'now'), app_user(), '{op}', {row}.id, {row}.project_id, {delta});"""
+
+def write_snapshot(c: sqlite3.Cursor, project_id: int) -> int:
+    """
+    Stores a project's current logbook (zlib-compressed JSON rows) with the last history id it
+    includes. Call inside a write transaction so rows and history id are consistent.
+    """
+    last = c.execute("SELECT COALESCE(MAX(id), 0) FROM rohrbuch_history").fetchone()[0]
+    rows = c.execute(f"SELECT id, {', '.join(HISTORY_COLUMNS)} FROM rohrbuch WHERE project_id = ? ORDER BY id", (project_id,)).fetchall()
+    c.execute("""INSERT INTO rohrbuch_snapshots (project_id, history_id, ts, n_rows, data)
+                 VALUES (?, ?, strftime('%Y-%m-%d %H:%M:%f', 'now'), ?, ?)""",
+              (project_id, last, len(rows), zlib.compress(json.dumps(rows, separators=(',', ':')).encode('utf-8'))))
+    return c.lastrowid
+
+def _m009_logbook_history(c: sqlite3.Cursor):
+    # Append-only change log of the logbook: 'I' full row, 'U' changed columns only, 'D' no data.
+    # user_name comes from app_user(), registered on every pooled connection (database.py);
+    # writes through connections without it fail, so no change goes unrecorded.
+    c.execute('''CREATE TABLE IF NOT EXISTS rohrbuch_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                ts TEXT NOT NULL,
+                user_name TEXT,
+                op TEXT NOT NULL CHECK (op IN ('I', 'U', 'D')),
+                entry_id INTEGER NOT NULL,
+                project_id INTEGER,
+                delta TEXT)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_rohrbuch_history_project ON rohrbuch_history(project_id, id)")
+    # Periodic full copies of a project's logbook, so a rebuild only replays the events after one
+    c.execute('''CREATE TABLE IF NOT EXISTS rohrbuch_snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                project_id INTEGER NOT NULL,
+                history_id INTEGER NOT NULL,
+                ts TEXT NOT NULL,
+                n_rows INTEGER NOT NULL,
+                data BLOB NOT NULL)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_rohrbuch_snapshots_project ON rohrbuch_snapshots(project_id, history_id)")
+    changed = " OR ".join(f"NEW.{col} IS NOT OLD.{col}" for col in HISTORY_COLUMNS)
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_rohrbuch_history_insert AFTER INSERT ON rohrbuch
+                  BEGIN {_history_event('I', 'NEW', _history_delta('NEW'))} END""")
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_rohrbuch_history_update AFTER UPDATE ON rohrbuch
+                  WHEN NEW.project_id IS OLD.project_id AND ({changed})
+                  BEGIN {_history_event('U', 'NEW', _history_delta('NEW', 'OLD'))} END""")
+    # A row moving to another project leaves one project's history and enters the other's
+    c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_rohrbuch_history_move AFTER UPDATE ON rohrbuch
+                  WHEN NEW.project_id IS NOT OLD.project_id
+                  BEGIN {_history_event('D', 'OLD', 'NULL')} {_history_event('I', 'NEW', _history_delta('NEW'))} END""")
+    c.execute(f"CREATE TRIGGER IF NOT EXISTS trg_rohrbuch_history_delete AFTER DELETE ON rohrbuch BEGIN {_history_event('D', 'OLD', 'NULL')} END")
+    for action in ("UPDATE", "DELETE"):
+        c.execute(f"""CREATE TRIGGER IF NOT EXISTS trg_rohrbuch_history_no_{action.lower()} BEFORE {action} ON rohrbuch_history
+                      BEGIN SELECT RAISE(ABORT, 'rohrbuch_history is append-only'); END""")
+    # Baseline (history_id 0): the logbooks as they were before the history existed
+    for (pid,) in c.execute("SELECT DISTINCT project_id FROM rohrbuch WHERE project_id IS NOT NULL").fetchall():
+        write_snapshot(c, pid)
+
+def _m010_row_versions(c: sqlite3.Cursor):
+    # Optimistic locking: writers compare-and-swap on these counters instead of overwriting blindly
+    if 'version' not in _columns(c, 'rohrbuch'): c.execute("ALTER TABLE rohrbuch ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    if 'version' not in _columns(c, 'workspace_cuts'): c.execute("ALTER TABLE workspace_cuts ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    if 'workspace_version' not in _columns(c, 'projects'):
+        c.execute("ALTER TABLE projects ADD COLUMN workspace_version INTEGER NOT NULL DEFAULT 0")
+
+MIGRATIONS: List[Tuple[str, Callable[[sqlite3.Cursor], None]]] = [
+    ("base schema", _m001_base_schema),
+    ("remnant store", _m002_remnants),
+    ("logbook indexes", _m003_indexes),
+    ("logbook DN index", _m004_dimension_index),
+    ("workspace cut rows", _m005_workspace_cuts),
+    ("MTO summary", _m006_mto_summary),
+    ("logbook full-text search", _m007_logbook_fts),
+    ("heat-number trace index", _m008_heat_trace_index),
+    ("logbook history", _m009_logbook_history),
+    ("row versions", _m010_row_versions),
+]
+
+def schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """Applies all pending migrations in one write transaction, then ensure_fts. Returns the new schema version."""
+    if schema_version(conn) < len(MIGRATIONS):
+        conn.commit()
+        c = conn.cursor()
+        c.execute("BEGIN IMMEDIATE")  # serializes concurrent app processes
+        try:
+            version = schema_version(conn)
+            for number, (_, step) in enumerate(MIGRATIONS[version:], start=version + 1):
+                step(c)
+                c.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    ensure_fts(conn)
+    return schema_version(conn)
+
+def ensure_fts(conn: sqlite3.Connection) -> bool:
+    """
+    Creates (and fills) the logbook full-text index if it is missing although the SQLite in use has
+    FTS5, e.g. after migration 7 ran without it. Outside the versioned chain, which never reruns.
+    Returns True if the index exists.
+    """
+    c = conn.cursor()
+    exists = lambda: c.execute("SELECT 1 FROM sqlite_master WHERE name = 'rohrbuch_fts'").fetchone() is not None
+    if schema_version(conn) < 7: return False  # migration 7 creates it
+    if exists(): return True
+    if not _fts5_available(c): return False
+    conn.commit()
+    c.execute("BEGIN IMMEDIATE")
+    try:
+        if not exists(): _create_logbook_fts(c)  # another process may have been first
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return True
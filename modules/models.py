@@ -22,3 +22,4 @@ class SavedCut:
     details: str
     timestamp: str
     fittings: List[FittingItem] = field(default_factory=list)
+    dn: int = 0  # pipe DN of the cut (0 = unknown, older workspaces)
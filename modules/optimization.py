@@ -1,10 +1,22 @@
+import bisect
+import math
+import sys
+import time
+from abc import ABC, abstractmethod
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import List, Dict, Tuple
+from typing import List, Dict, Tuple, Optional
+import pandas as pd
+from modules.calculations import MaterialManager
+
+EPS = 1e-9
 
 @dataclass
 class CutRequest:
     id: str  # e.g., "Schnitt A" or just ID
     length: float
+    dn: int = 0
 
 @dataclass
 class OptBar:
@@ -12,56 +24,381 @@ class OptBar:
     length: float
     cuts: List[CutRequest]
     waste: float
+    cost: float = 0.0
+    remnant_id: Optional[int] = None  # set if the bar is a remnant from the store
+
+@dataclass
+class StockItem:
+    length: float
+    quantity: Optional[int] = None  # None = unlimited
+    cost: float = 0.0  # per bar
+    remnant_id: Optional[int] = None
+
+    @property
+    def is_remnant(self) -> bool: return self.remnant_id is not None
+
+@dataclass
+class OptResult:
+    bars: List[OptBar]
+    solver: str
+    lower_bound: int
+    optimal: bool
+    runtime: float = 0.0
+
+    @property
+    def num_bars(self) -> int: return len(self.bars)
+
+    @property
+    def total_waste(self) -> float: return sum(b.waste for b in self.bars)
+
+    @property
+    def gap(self) -> float:
+        """Relative optimality gap: (bars - lower bound) / bars."""
+        if not self.bars: return 0.0
+        return max(0, self.num_bars - self.lower_bound) / self.num_bars
+
+
+@dataclass
+class InventoryResult:
+    bars: List[OptBar]
+    unplaced: List[CutRequest]  # cuts longer than any available stock
+    new_remnants: List[float]  # offcuts >= remnant threshold, to go back into the store
+    remnant_threshold: float
+    runtime: float = 0.0
+
+    @property
+    def total_cost(self) -> float: return sum(b.cost for b in self.bars)
+
+    @property
+    def total_waste(self) -> float: return sum(b.waste for b in self.bars)
+
+    @property
+    def material_used(self) -> float:
+        """Length consumed by cuts incl. saw kerf."""
+        return sum(b.length - b.waste for b in self.bars)
+
+    @property
+    def material_new(self) -> float:
+        """Length of fresh stock that has to be cut."""
+        return sum(b.length for b in self.bars if b.remnant_id is None)
+
+    @property
+    def consumed_remnant_ids(self) -> List[int]:
+        return [b.remnant_id for b in self.bars if b.remnant_id is not None]
+
+    @property
+    def scrap(self) -> float:
+        """Offcuts too short to be stored."""
+        return sum(b.waste for b in self.bars if b.waste < self.remnant_threshold)
+
+
+def _build_bars(bins: List[List[CutRequest]], stock_length: float, saw_width: float) -> List[OptBar]:
+    bars = []
+    for i, cuts in enumerate(bins):
+        used = sum(c.length + saw_width for c in cuts)
+        bars.append(OptBar(id=i + 1, length=stock_length, cuts=list(cuts), waste=stock_length - used))
+    return bars
+
+
+class CuttingSolver(ABC):
+    """
+    Base class for 1D cutting-stock solvers; subclasses implement _pack.
+    Every cut consumes its length plus one saw width. Cuts longer than the stock
+    get a bar of their own (negative waste), exactly like the original FFD.
+    """
+    name = ""
+    label = ""
+
+    def solve(self, cut_requests: List[CutRequest], stock_length: float, saw_width: float = 3.0) -> OptResult:
+        start = time.perf_counter()
+        bins, optimal = self._pack(cut_requests, stock_length, saw_width)
+        bars = _build_bars(bins, stock_length, saw_width)
+        lb = CuttingOptimizer.lower_bound(cut_requests, stock_length, saw_width)
+        return OptResult(bars, self.name, lb, optimal or len(bars) <= lb, time.perf_counter() - start)
+
+    @abstractmethod
+    def _pack(self, cut_requests: List[CutRequest], stock_length: float, saw_width: float) -> Tuple[List[List[CutRequest]], bool]:
+        """Cuts per bar, and whether the packing is proven optimal."""
+
+
+class FirstFitDecreasingSolver(CuttingSolver):
+    """First Fit Decreasing with a running remaining length per bar."""
+    name = "ffd"
+    label = "First-Fit-Decreasing (schnell)"
+
+    def _pack(self, cut_requests, stock_length, saw_width):
+        bins: List[List[CutRequest]] = []
+        remaining: List[float] = []
+        for cut in sorted(cut_requests, key=lambda x: x.length, reverse=True):
+            need = cut.length + saw_width
+            for i, rem in enumerate(remaining):
+                if rem >= need:
+                    bins[i].append(cut)
+                    remaining[i] = rem - need
+                    break
+            else:
+                bins.append([cut])
+                remaining.append(stock_length - need)
+        return bins, False
+
+
+class BestFitDecreasingSolver(CuttingSolver):
+    """Best Fit Decreasing: each cut goes into the open bar with the least space left that still fits."""
+    name = "bfd"
+    label = "Best-Fit-Decreasing"
+
+    def _pack(self, cut_requests, stock_length, saw_width):
+        bins: List[List[CutRequest]] = []
+        open_bars: List[Tuple[float, int]] = []  # sorted (remaining, bin index)
+        for cut in sorted(cut_requests, key=lambda x: x.length, reverse=True):
+            need = cut.length + saw_width
+            pos = bisect.bisect_left(open_bars, (need, -1))
+            if pos < len(open_bars):
+                rem, idx = open_bars.pop(pos)
+                bins[idx].append(cut)
+                bisect.insort(open_bars, (rem - need, idx))
+            else:
+                bins.append([cut])
+                bisect.insort(open_bars, (stock_length - need, len(bins) - 1))
+        return bins, False
+
+
+class BranchAndBoundSolver(CuttingSolver):
+    """
+    Exact solver (depth-first branch & bound, seeded with Best-Fit-Decreasing).
+    Stops after time_limit seconds and returns the best plan found; OptResult.optimal
+    tells whether optimality was proven, OptResult.gap how far it can be off at most.
+    """
+    name = "exact"
+    label = "Exakt (Branch & Bound)"
+
+    def __init__(self, time_limit: float = 2.0):
+        self.time_limit = time_limit
+
+    def _pack(self, cut_requests, stock_length, saw_width):
+        oversized = [c for c in cut_requests if c.length + saw_width > stock_length + EPS]
+        items = sorted((c for c in cut_requests if c.length + saw_width <= stock_length + EPS), key=lambda x: x.length, reverse=True)
+        fixed_bins = [[c] for c in sorted(oversized, key=lambda x: x.length, reverse=True)]
+
+        incumbent, _ = BestFitDecreasingSolver()._pack(items, stock_length, saw_width)
+        sizes = [c.length + saw_width for c in items]
+        lb = CuttingOptimizer.lower_bound(items, stock_length, saw_width)
+        if len(incumbent) <= lb or len(items) + 50 > sys.getrecursionlimit():
+            return fixed_bins + incumbent, len(incumbent) <= lb
+
+        deadline = time.perf_counter() + self.time_limit
+        best = {"bins": incumbent, "count": len(incumbent)}
+        suffix_sum = [0.0] * (len(sizes) + 1)
+        for i in range(len(sizes) - 1, -1, -1):
+            suffix_sum[i] = suffix_sum[i + 1] + sizes[i]
+        remaining: List[float] = []
+        assign: List[int] = [0] * len(items)
+        state = {"nodes": 0, "timed_out": False}
+
+        def search(i: int):
+            if best["count"] <= lb or state["timed_out"]: return
+            state["nodes"] += 1
+            if state["nodes"] & 1023 == 0 and time.perf_counter() > deadline:
+                state["timed_out"] = True
+                return
+            if i == len(items):
+                bins = [[] for _ in remaining]
+                for k, b in enumerate(assign): bins[b].append(items[k])
+                best["bins"], best["count"] = bins, len(bins)
+                return
+            free = sum(remaining)
+            extra = max(0.0, suffix_sum[i] - free)
+            if len(remaining) + math.ceil(extra / stock_length - EPS) >= best["count"]: return
+
+            need = sizes[i]
+            tried = set()
+            for b, rem in enumerate(remaining):
+                if rem + EPS >= need and round(rem, 6) not in tried:
+                    tried.add(round(rem, 6))
+                    remaining[b] = rem - need
+                    assign[i] = b
+                    search(i + 1)
+                    remaining[b] = rem
+            if len(remaining) + 1 < best["count"]:
+                remaining.append(stock_length - need)
+                assign[i] = len(remaining) - 1
+                search(i + 1)
+                remaining.pop()
+
+        search(0)
+        proven = not state["timed_out"] or best["count"] <= lb
+        return fixed_bins + best["bins"], proven
+
+
+class InventorySolver:
+    """
+    Cutting with mixed stock lengths and remnants (Best-Fit-Decreasing).
+    New bars are opened from the stock with the lowest cost per mm that fits
+    (remnants are usually free, so they go first; among equals the shortest);
+    afterwards every bar is swapped for the cheapest still-available stock that
+    holds its cuts, so a mostly empty 12 m bar becomes a 6 m bar or a remnant.
+    """
+
+    def solve(self, cut_requests: List[CutRequest], inventory: List[StockItem], saw_width: float = 3.0, remnant_threshold: float = 500.0) -> InventoryResult:
+        start = time.perf_counter()
+        available = [s.quantity for s in inventory]  # None = unlimited
+
+        def take(k: int):
+            if available[k] is not None: available[k] -= 1
+
+        def give_back(k: int):
+            if available[k] is not None: available[k] += 1
+
+        def cheapest(need: float, key) -> Optional[int]:
+            fits = [k for k, s in enumerate(inventory) if s.length + EPS >= need and (available[k] is None or available[k] > 0)]
+            return min(fits, key=key) if fits else None
+
+        per_mm = lambda k: (inventory[k].cost / inventory[k].length if inventory[k].length else 0.0, inventory[k].length)
+        bins: List[List[CutRequest]] = []
+        stock_of: List[int] = []
+        remaining: List[float] = []
+        unplaced: List[CutRequest] = []
+
+        for cut in sorted(cut_requests, key=lambda x: x.length, reverse=True):
+            need = cut.length + saw_width
+            fitting = [i for i, rem in enumerate(remaining) if rem + EPS >= need]
+            if fitting:
+                i = min(fitting, key=lambda i: remaining[i])
+                bins[i].append(cut)
+                remaining[i] -= need
+                continue
+            k = cheapest(need, per_mm)
+            if k is None:
+                unplaced.append(cut)
+                continue
+            take(k)
+            bins.append([cut])
+            stock_of.append(k)
+            remaining.append(inventory[k].length - need)
+
+        # Downsize: cheapest stock (then shortest) that still holds the bar's cuts
+        for i in sorted(range(len(bins)), key=lambda i: remaining[i], reverse=True):
+            used = inventory[stock_of[i]].length - remaining[i]
+            give_back(stock_of[i])
+            k = cheapest(used, lambda k: (inventory[k].cost, inventory[k].length))
+            take(k)
+            remaining[i] = inventory[k].length - used
+            stock_of[i] = k
+
+        bars = []
+        for i, cuts in enumerate(bins):
+            stock = inventory[stock_of[i]]
+            bars.append(OptBar(id=i + 1, length=stock.length, cuts=cuts, waste=remaining[i], cost=stock.cost, remnant_id=stock.remnant_id))
+        new_remnants = sorted((b.waste for b in bars if b.waste >= remnant_threshold), reverse=True)
+        return InventoryResult(bars, unplaced, new_remnants, remnant_threshold, time.perf_counter() - start)
+
+
+def _solve_group(args) -> Tuple[int, OptResult]:
+    # Top-level so it can be pickled into worker processes
+    dn, cuts, stock_length, saw_width, solver, options = args
+    return dn, CuttingOptimizer.solve(cuts, stock_length, saw_width, solver, **options)
+
 
 class CuttingOptimizer:
+    SOLVERS = {
+        FirstFitDecreasingSolver.name: FirstFitDecreasingSolver,
+        BestFitDecreasingSolver.name: BestFitDecreasingSolver,
+        BranchAndBoundSolver.name: BranchAndBoundSolver,
+    }
+
+    @staticmethod
+    def get_solver(name: str, **options) -> CuttingSolver:
+        if name not in CuttingOptimizer.SOLVERS: raise ValueError(f"Unbekannter Solver: {name}")
+        return CuttingOptimizer.SOLVERS[name](**options)
+
+    @staticmethod
+    def solve(cut_requests: List[CutRequest], stock_length: float, saw_width: float = 3.0, solver: str = "ffd", **options) -> OptResult:
+        return CuttingOptimizer.get_solver(solver, **options).solve(cut_requests, stock_length, saw_width)
+
     @staticmethod
     def solve_ffd(cut_requests: List[CutRequest], stock_length: float, saw_width: float = 3.0) -> List[OptBar]:
         """
         Solves the Bin Packing problem using First Fit Decreasing (FFD).
         """
-        # 1. Sort cuts descending
-        sorted_cuts = sorted(cut_requests, key=lambda x: x.length, reverse=True)
-        
-        bars: List[OptBar] = []
-        
-        for cut in sorted_cuts:
-            placed = False
-            needed = cut.length
-            
-            # 2. Try to fit into existing bars
-            for bar in bars:
-                # Actual space used = cut length + saw width (if not the first cut, but simplified: always add width for every cut except last? 
-                # Better: remaining space calculation.
-                # Space calculation: current_used = sum(c.length for c in bar.cuts) + (len(bar.cuts) * saw_width)
-                # Available?
-                
-                current_used = sum(c.length for c in bar.cuts) + (len(bar.cuts) * saw_width)
-                space_left = stock_length - current_used
-                
-                # Check if fits (including saw width if it's not the very first item in empty bar, assuming cuts are sequential)
-                # Actually, effectively each cut 'consumes' length + saw_width, except maybe the last piece doesn't need a cut after it?
-                # Conservative approach: Assume every cut consumes length + saw_width.
-                if space_left >= (needed + saw_width):
-                    bar.cuts.append(cut)
-                    # Recalculate waste
-                    new_used = current_used + needed + saw_width
-                    bar.waste = stock_length - new_used
-                    placed = True
-                    break
-                elif len(bar.cuts) == 0 and space_left >= needed: # Empty bar, fits exactly or without saw width?
-                     # Technically first cut doesn't strictly need saw width 'before' it if we trim, but usually we ignore start-trim.
-                     # Let's simple apply saw_width to every cut involved to be safe (blade thickness).
-                     if space_left >= (needed + saw_width):
-                        bar.cuts.append(cut)
-                        bar.waste = stock_length - (needed + saw_width)
-                        placed = True
-                        break
-
-            # 3. If not placed, start new bar
-            if not placed:
-                new_bar = OptBar(id=len(bars)+1, length=stock_length, cuts=[cut], waste=0)
-                used = needed + saw_width
-                new_bar.waste = stock_length - used
-                bars.append(new_bar)
-                
-        return bars
+        return FirstFitDecreasingSolver().solve(cut_requests, stock_length, saw_width).bars
+
+    @staticmethod
+    def solve_inventory(cut_requests: List[CutRequest], inventory: List[StockItem], saw_width: float = 3.0, remnant_threshold: float = 500.0) -> InventoryResult:
+        """Optimizes against a stock inventory (several lengths, quantities, costs, remnants)."""
+        return InventorySolver().solve(cut_requests, inventory, saw_width, remnant_threshold)
+
+    @staticmethod
+    def collect_project_requests(df_pipes: pd.DataFrame, saved_cuts: list = None, default_dn: int = 0) -> List[CutRequest]:
+        """
+        Cut requests for a whole project: pipe pieces from the Rohrbuch plus the saw list.
+        Saw-list cuts that were already transferred (same ISO name, DN and length) are counted once.
+        """
+        requests = []
+        logged = Counter()
+        if df_pipes is not None and not df_pipes.empty:
+            for row in df_pipes.itertuples(index=False):
+                dn = MaterialManager.parse_dn(row.dimension)
+                length = float(row.laenge)
+                logged[(row.iso, dn, round(length, 1))] += 1
+                label = f"{row.iso} / {row.naht}" if row.naht else str(row.iso)
+                requests.append(CutRequest(id=label, length=length, dn=dn))
+        for cut in saved_cuts or []:
+            dn = getattr(cut, 'dn', 0) or default_dn
+            key = (cut.name, dn, round(float(cut.cut_length), 1))
+            if logged[key] > 0:
+                logged[key] -= 1
+                continue
+            requests.append(CutRequest(id=cut.name, length=float(cut.cut_length), dn=dn))
+        return requests
+
+    @staticmethod
+    def group_by_dn(cut_requests: List[CutRequest]) -> Dict[int, List[CutRequest]]:
+        groups: Dict[int, List[CutRequest]] = {}
+        for cut in cut_requests:
+            groups.setdefault(cut.dn, []).append(cut)
+        return dict(sorted(groups.items()))
+
+    @staticmethod
+    def solve_project(cut_requests: List[CutRequest], stock_length: float, saw_width: float = 3.0, solver: str = "ffd",
+                      max_workers: Optional[int] = None, **options) -> Dict[int, OptResult]:
+        """
+        Solves every DN group independently, in parallel on a process pool.
+        Falls back to solving in-process for a single group or if no pool can be started.
+        Returns {dn: OptResult}, ordered by DN.
+        """
+        jobs = [(dn, cuts, stock_length, saw_width, solver, options) for dn, cuts in CuttingOptimizer.group_by_dn(cut_requests).items()]
+        if len(jobs) > 1 and max_workers != 1:
+            try:
+                with ProcessPoolExecutor(max_workers=min(len(jobs), max_workers or len(jobs))) as pool:
+                    return dict(pool.map(_solve_group, jobs))
+            except (OSError, RuntimeError, ImportError):
+                pass  # e.g. no fork/semaphores available in a restricted runtime
+        return dict(_solve_group(job) for job in jobs)
+
+    @staticmethod
+    def plan_to_frame(plans: Dict[int, OptResult]) -> pd.DataFrame:
+        """Flat cutting plan (one row per cut) for display and export."""
+        rows = []
+        for dn, res in plans.items():
+            for bar in res.bars:
+                for pos, cut in enumerate(bar.cuts, 1):
+                    rows.append({"DN": dn, "Stange": bar.id, "Pos": pos, "Bezeichnung": cut.id, "Länge (mm)": cut.length,
+                                 "Stangenlänge (mm)": bar.length, "Rest (mm)": bar.waste})
+        return pd.DataFrame(rows, columns=["DN", "Stange", "Pos", "Bezeichnung", "Länge (mm)", "Stangenlänge (mm)", "Rest (mm)"])
+
+    @staticmethod
+    def lower_bound(cut_requests: List[CutRequest], stock_length: float, saw_width: float = 3.0) -> int:
+        """Martello-Toth L2 bound on the number of bars (oversized cuts count one bar each)."""
+        sizes = [c.length + saw_width for c in cut_requests]
+        oversized = sum(1 for s in sizes if s > stock_length + EPS)
+        sizes = [s for s in sizes if s <= stock_length + EPS]
+        if not sizes: return oversized
+        cap = stock_length
+        best = math.ceil(sum(sizes) / cap - EPS)
+        for alpha in {0.0} | set(s for s in sizes if s <= cap / 2 + EPS):
+            j1 = [s for s in sizes if s > cap - alpha + EPS]
+            j2 = [s for s in sizes if cap / 2 + EPS < s <= cap - alpha + EPS]
+            j3_sum = sum(s for s in sizes if alpha - EPS <= s <= cap / 2 + EPS)
+            slack = len(j2) * cap - sum(j2)
+            best = max(best, len(j1) + len(j2) + max(0, math.ceil((j3_sum - slack) / cap - EPS)))
+        return oversized + best
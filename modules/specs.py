@@ -0,0 +1,182 @@
+import json
+import math
+import os
+import re
+import threading
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, Iterable, Tuple
+
+DEFAULT_SPEC_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'pipe_dimensions.json')
+
+# Cut angles offered in the UI, vorbau is precomputed for these
+STANDARD_ANGLES = (11.25, 15.0, 22.5, 30.0, 45.0, 60.0, 90.0)
+
+REQUIRED_COLUMNS = ['DN', 'D_Aussen', 'Radius_BA3', 'T_Stueck_H', 'Red_Laenge_L'] + \
+    [f'{col}{suffix}' for suffix in ('_16', '_10') for col in ('Flansch_b', 'LK_k', 'Schraube_M', 'Lochzahl')]
+
+
+class PipeSpecTable:
+    """
+    Compiled, read-only view of the pipe dimension table (data/pipe_dimensions.json).
+    Built once; every lookup is a dict hit on the DN index plus an array access.
+    """
+    PN_MAP = {
+        "PN 16": "_16",
+        "PN 10": "_10",
+        "PN 6": "_10",
+        "PN 25": "_16",
+        "PN 40": "_16"
+    }
+
+    def __init__(self, data: Dict[str, Iterable]):
+        if 'DN' not in data: raise ValueError("Rohrdaten ohne Spalte 'DN'")
+        dns = [int(dn) for dn in data['DN']]
+        self._index = {dn: i for i, dn in enumerate(dns)}
+        if len(self._index) != len(dns): raise ValueError("Rohrdaten enthalten doppelte DN")
+
+        self._cols: Dict[str, np.ndarray] = {}
+        self._dtypes: Dict[str, np.dtype] = {}
+        for name, values in data.items():
+            arr = np.asarray(list(values))
+            if len(arr) != len(dns): raise ValueError(f"Spalte '{name}' hat falsche Länge")
+            self._dtypes[name] = arr.dtype
+            arr = arr.astype(np.float64) if arr.dtype.kind in 'biuf' else arr.astype(object)
+            arr.flags.writeable = False
+            self._cols[name] = arr
+        self.dns = np.asarray(dns, dtype=np.int64)
+        self.dns.flags.writeable = False
+        self._order = np.argsort(self.dns, kind='stable')
+        self._sorted_dns = self.dns[self._order]
+        self._derived = None
+        self._frame = None
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "PipeSpecTable":
+        return cls({col: df[col].tolist() for col in df.columns})
+
+    @classmethod
+    def from_json(cls, path: str) -> "PipeSpecTable":
+        with open(path, 'r') as f:
+            return cls(json.load(f))
+
+    def frame(self) -> pd.DataFrame:
+        """The table as a DataFrame in its original dtypes, built once. Treat as read-only."""
+        if self._frame is None:
+            self._frame = pd.DataFrame({name: arr.astype(self._dtypes[name]) for name, arr in self._cols.items()})
+        return self._frame
+
+    def validate(self):
+        """Raises ValueError if a column the app relies on is missing or holds unusable values."""
+        missing = [c for c in REQUIRED_COLUMNS if c not in self._cols]
+        if missing: raise ValueError(f"Rohrdaten ohne Spalte(n): {', '.join(missing)}")
+        for name in REQUIRED_COLUMNS:
+            arr = self._cols[name]
+            if name.startswith('Schraube_M'):
+                bad = [v for v in arr if not re.fullmatch(r'M\d+', str(v))]
+                if bad: raise ValueError(f"Spalte '{name}': ungültige Schraube {bad[0]}")
+            elif arr.dtype == object or not np.all(np.isfinite(arr)) or np.any(arr <= 0):
+                raise ValueError(f"Spalte '{name}' enthält ungültige Werte")
+
+    def compile(self) -> "PipeSpecTable":
+        """Validates and precomputes the derived tables (vorbau per standard angle, flange deduction and gasket OD per PN)."""
+        if self._derived is not None: return self
+        self.validate()
+        radius = self._cols['Radius_BA3']
+        vorbau = np.array([[r * math.tan(math.radians(a / 2)) for a in STANDARD_ANGLES] for r in radius]).reshape(len(self), len(STANDARD_ANGLES))
+        flange, gasket_od = {}, {}
+        for pn in self.PN_MAP:
+            suffix = self.pn_suffix(pn)
+            flange[pn] = self._cols[f'Flansch_b{suffix}']
+            bolt_d = np.array([int(str(b)[1:]) for b in self._cols[f'Schraube_M{suffix}']], dtype=np.float64)
+            gasket_od[pn] = self._cols[f'LK_k{suffix}'] - bolt_d * 1.5
+        for arr in [vorbau, *gasket_od.values()]: arr.flags.writeable = False
+        self._derived = {'vorbau': vorbau, 'flange': flange, 'gasket_od': gasket_od}
+        return self
+
+    def __len__(self) -> int: return len(self.dns)
+
+    def __contains__(self, dn) -> bool:
+        try: return int(dn) in self._index
+        except (TypeError, ValueError): return False
+
+    @property
+    def columns(self) -> list: return list(self._cols)
+
+    def index(self, dn) -> int:
+        try: return self._index[int(dn)]
+        except (KeyError, TypeError, ValueError):
+            raise KeyError(f"Unbekannte Nennweite: DN {dn}") from None
+
+    def indices(self, dns) -> np.ndarray:
+        """Vectorized DN -> row index. Unknown DNs map to -1."""
+        dns = np.asarray(dns, dtype=np.float64)
+        pos = np.clip(np.searchsorted(self._sorted_dns, dns), 0, len(self._sorted_dns) - 1)
+        found = self._sorted_dns[pos] == dns
+        return np.where(found, self._order[pos], -1)
+
+    def column(self, name: str) -> np.ndarray:
+        return self._cols[name]
+
+    def value(self, name: str, dn) -> Any:
+        return self._cols[name][self.index(dn)]
+
+    def row(self, dn) -> Dict[str, Any]:
+        i = self.index(dn)
+        return {name: arr[i] for name, arr in self._cols.items()}
+
+    @classmethod
+    def pn_suffix(cls, pn: str) -> str:
+        return cls.PN_MAP.get(pn, "_10")
+
+    # --- Typed accessors ---
+    def od(self, dn) -> float: return float(self._cols['D_Aussen'][self.index(dn)])
+    def bend_radius(self, dn) -> float: return float(self._cols['Radius_BA3'][self.index(dn)])
+    def tee_height(self, dn) -> float: return float(self._cols['T_Stueck_H'][self.index(dn)])
+    def reducer_length(self, dn) -> float: return float(self._cols['Red_Laenge_L'][self.index(dn)])
+    def flange_b(self, dn, pn: str) -> float: return float(self.value(f'Flansch_b{self.pn_suffix(pn)}', dn))
+    def bolt_circle(self, dn, pn: str) -> float: return float(self.value(f'LK_k{self.pn_suffix(pn)}', dn))
+    def bolt_size(self, dn, pn: str) -> str: return str(self.value(f'Schraube_M{self.pn_suffix(pn)}', dn))
+    def bolt_holes(self, dn, pn: str) -> int: return int(self.value(f'Lochzahl{self.pn_suffix(pn)}', dn))
+
+    # --- Derived values (table lookups once compiled, computed otherwise) ---
+    def vorbau(self, dn, angle: float) -> float:
+        """Center-to-end of a BA3 bend cut to angle: R * tan(angle / 2)."""
+        i = self.index(dn)
+        if self._derived is not None and angle in _ANGLE_INDEX:
+            return float(self._derived['vorbau'][i, _ANGLE_INDEX[angle]])
+        return float(self._cols['Radius_BA3'][i]) * math.tan(math.radians(angle / 2))
+
+    def flange_deduction(self, dn, pn: str) -> float:
+        if self._derived is not None and pn in self._derived['flange']:
+            return float(self._derived['flange'][pn][self.index(dn)])
+        return self.flange_b(dn, pn)
+
+    def gasket(self, dn, pn: str, wall: float) -> Tuple[float, float]:
+        """Approximate gasket (ID, OD): pipe bore and bolt circle minus 1.5 x bolt diameter."""
+        if self._derived is not None and pn in self._derived['gasket_od']:
+            od = self._derived['gasket_od'][pn][self.index(dn)]
+        else:
+            od = self.bolt_circle(dn, pn) - int(self.bolt_size(dn, pn)[1:]) * 1.5
+        return self.od(dn) - 2 * wall, float(od)
+
+_ANGLE_INDEX = {a: j for j, a in enumerate(STANDARD_ANGLES)}
+
+_REGISTRY: Dict[str, Tuple[int, PipeSpecTable]] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+def load_spec(path: str = DEFAULT_SPEC_PATH) -> PipeSpecTable:
+    """
+    Process-wide compiled pipe table. The file is parsed and validated once and
+    re-read only when its mtime changes; all callers share the same instance.
+    """
+    path = os.path.abspath(path)
+    mtime = os.stat(path).st_mtime_ns
+    entry = _REGISTRY.get(path)
+    if entry and entry[0] == mtime: return entry[1]
+    with _REGISTRY_LOCK:
+        entry = _REGISTRY.get(path)
+        if entry and entry[0] == mtime: return entry[1]
+        spec = PipeSpecTable.from_json(path).compile()
+        _REGISTRY[path] = (mtime, spec)
+        return spec
@@ -0,0 +1,227 @@
+import math
+import zlib
+import zipfile
+import numpy as np
+from dataclasses import dataclass
+from datetime import datetime
+from typing import BinaryIO, Dict, Iterator, List, Tuple
+
+# True-scale wrap-around templates (Abwicklung) for cut lines around a pipe.
+# Layout works in template millimetres (x along the circumference, y downward
+# from the top edge); each page is laid out, rendered and written on its own,
+# so the full drawing never exists in memory.
+
+PAPER_SIZES = {"A4": (297.0, 210.0), "A3": (420.0, 297.0)}  # landscape, mm
+MM = 72 / 25.4  # PDF points per mm
+
+TOP_BAND = 20.0  # space above the reference line
+BOTTOM_BAND = 15.0
+FOOTER = 8.0  # page label / scale bar below the content area
+
+@dataclass(frozen=True)
+class Tile:
+    number: int
+    row: int
+    col: int
+    x0: float  # template area shown on this page
+    y0: float
+    width: float
+    height: float
+
+def template_size(profile: Dict[str, np.ndarray]) -> Tuple[float, float]:
+    return float(profile["arc"][-1]), TOP_BAND + float(profile["depth"].max()) + BOTTOM_BAND
+
+def layout_tiles(profile: Dict[str, np.ndarray], paper: str = "A4", margin: float = 10.0,
+                 overlap: float = 10.0) -> Tuple[List[Tile], float, float]:
+    """Splits the template into page tiles; neighbours share `overlap` mm for gluing."""
+    page_w, page_h = PAPER_SIZES[paper]
+    tile_w, tile_h = page_w - 2 * margin, page_h - 2 * margin - FOOTER
+    width, height = template_size(profile)
+    cols = max(1, math.ceil((width - overlap) / (tile_w - overlap) - 1e-9))
+    rows = max(1, math.ceil((height - overlap) / (tile_h - overlap) - 1e-9))
+    tiles = [Tile(r * cols + c + 1, r, c, c * (tile_w - overlap), r * (tile_h - overlap), tile_w, tile_h)
+             for r in range(rows) for c in range(cols)]
+    return tiles, page_w, page_h
+
+def tile_ops(profile: Dict[str, np.ndarray], tile: Tile, mark_step: float = 15.0) -> Iterator[tuple]:
+    """
+    Drawing operations for one tile in template coordinates:
+    ("line", x1, y1, x2, y2, width, dashed), ("polyline", xs, ys, width), ("text", x, y, size, txt).
+    Only the part of the profile that falls on the tile is touched.
+    """
+    arc, depth, angle = profile["arc"], profile["depth"], profile["angle"]
+    width, height = template_size(profile)
+    x_lo, x_hi = tile.x0, tile.x0 + tile.width
+
+    # Reference line (square pipe end / marking line) and template outline
+    yield ("line", max(0.0, x_lo), TOP_BAND, min(width, x_hi), TOP_BAND, 0.3, False)
+    yield ("line", 0.0, 0.0, 0.0, height, 0.2, True)
+    yield ("line", width, 0.0, width, height, 0.2, True)
+    yield ("text", max(0.0, x_lo) + 2, TOP_BAND - 2, 3.0, "Bezugslinie")
+
+    # Circumference marks with depth labels
+    pitch = arc[-1] / 360.0
+    for a in np.arange(0.0, 360.0 + 1e-9, mark_step):
+        x = a * pitch
+        if not x_lo - 1 <= x <= x_hi + 1: continue
+        d = float(np.interp(a, angle, depth))
+        major = a % 90 == 0
+        yield ("line", x, TOP_BAND - (6 if major else 3), x, TOP_BAND + d, 0.4 if major else 0.15, not major)
+        yield ("text", x + 0.8, TOP_BAND - 7 if major else TOP_BAND - 3.5, 3.0 if major else 2.2, f"{a:g}°")
+        yield ("text", x + 0.8, TOP_BAND + d + 4, 2.2, f"{d:.1f}")
+
+    # Cut line, including one point beyond each tile edge so the curve runs off the page
+    i0 = max(int(np.searchsorted(arc, x_lo)) - 1, 0)
+    i1 = min(int(np.searchsorted(arc, x_hi)) + 1, len(arc))
+    if i1 - i0 >= 2:
+        yield ("polyline", arc[i0:i1], TOP_BAND + depth[i0:i1], 0.5)
+
+def page_ops(tile: Tile, n_tiles: int, page_w: float, page_h: float, margin: float, overlap: float,
+             title: str) -> Iterator[tuple]:
+    """Alignment marks, glue zones, labels and a scale check in page coordinates."""
+    right, bottom = margin + tile.width, margin + tile.height
+    for x, y in ((margin, margin), (right, margin), (margin, bottom), (right, bottom)):
+        yield ("line", x - 4, y, x + 4, y, 0.2, False)
+        yield ("line", x, y - 4, x, y + 4, 0.2, False)
+    if overlap > 0:
+        yield ("line", right - overlap, margin, right - overlap, bottom, 0.15, True)
+        yield ("line", margin, bottom - overlap, right, bottom - overlap, 0.15, True)
+    base = page_h - margin - FOOTER + 5
+    yield ("text", margin, base, 3.0, f"{title} | Seite {tile.number}/{n_tiles} (Zeile {tile.row + 1}, Spalte {tile.col + 1}) | "
+                                      f"Klebekante {overlap:g} mm | 1:1 ohne Skalierung drucken")
+    # 100 mm scale bar to check the printer did not scale the page
+    x0 = page_w - margin - 100
+    yield ("line", x0, base + 2, x0 + 100, base + 2, 0.4, False)
+    for x in (x0, x0 + 100):
+        yield ("line", x, base, x, base + 3, 0.4, False)
+    yield ("text", x0 + 40, base, 2.5, "100 mm")
+
+def _render_ops(ops, dx: float, dy: float, line, polyline, text):
+    """Shifts the ops by (dx, dy) onto the page and hands them to the renderer."""
+    for op in ops:
+        kind = op[0]
+        if kind == "line": line(op[1] + dx, op[2] + dy, op[3] + dx, op[4] + dy, op[5], op[6])
+        elif kind == "polyline": polyline(op[1] + dx, op[2] + dy, op[3])
+        else: text(op[1] + dx, op[2] + dy, op[3], op[4])
+
+class StreamingPdf:
+    """
+    Minimal PDF writer that writes each page to `out` as soon as it is finished.
+    Only what the templates need: lines, polylines, Helvetica text, a clip rectangle.
+    """
+    def __init__(self, out: BinaryIO, page_w: float, page_h: float):
+        self.out = out
+        self.page_w, self.page_h = page_w, page_h
+        self.pos = 0
+        self.offsets: Dict[int, int] = {}
+        self.page_ids: List[int] = []
+        self.next_id = 3  # 1 = page tree (written last), 2 = font
+        self._write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._object(2, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>")
+
+    def _write(self, data: bytes):
+        self.out.write(data)
+        self.pos += len(data)
+
+    def _object(self, obj_id: int, body: bytes):
+        self.offsets[obj_id] = self.pos
+        self._write(b"%d 0 obj\n" % obj_id + body + b"\nendobj\n")
+
+    def _new_id(self) -> int:
+        self.next_id += 1
+        return self.next_id - 1
+
+    def add_page(self, content: bytes):
+        data = zlib.compress(content)
+        content_id, page_id = self._new_id(), self._new_id()
+        self._object(content_id, b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(data) + data + b"\nendstream")
+        self._object(page_id, b"<< /Type /Page /Parent 1 0 R /MediaBox [0 0 %.2f %.2f] /Resources << /Font << /F1 2 0 R >> >> /Contents %d 0 R >>"
+                     % (self.page_w * MM, self.page_h * MM, content_id))
+        self.page_ids.append(page_id)
+
+    def close(self):
+        kids = b" ".join(b"%d 0 R" % i for i in self.page_ids)
+        self._object(1, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.page_ids)))
+        catalog = self._new_id()
+        self._object(catalog, b"<< /Type /Catalog /Pages 1 0 R >>")
+        xref = self.pos
+        self._write(b"xref\n0 %d\n0000000000 65535 f \n" % self.next_id)
+        for obj_id in range(1, self.next_id):
+            self._write(b"%010d 00000 n \n" % self.offsets[obj_id])
+        self._write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (self.next_id, catalog, xref))
+
+def _pdf_text(txt: str) -> bytes:
+    raw = txt.encode("cp1252", errors="replace")
+    return raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+def _pdf_page(profile, tile: Tile, n_tiles: int, page_w: float, page_h: float, margin: float, overlap: float, title: str) -> bytes:
+    parts: List[bytes] = []
+    X = lambda x: x * MM
+    Y = lambda y: (page_h - y) * MM  # PDF origin is bottom-left
+
+    def line(x1, y1, x2, y2, width, dashed):
+        dash = b"[2 2] 0 d" if dashed else b"[] 0 d"
+        parts.append(b"%s %.3f w %.3f %.3f m %.3f %.3f l S\n" % (dash, width * MM, X(x1), Y(y1), X(x2), Y(y2)))
+
+    def polyline(xs, ys, width):
+        pts = np.column_stack((xs * MM, (page_h - ys) * MM))
+        path = b"%.3f %.3f m\n" % tuple(pts[0]) + b"".join(b"%.3f %.3f l\n" % tuple(p) for p in pts[1:])
+        parts.append(b"[] 0 d %.3f w\n" % (width * MM) + path + b"S\n")
+
+    def text(x, y, size, txt):
+        parts.append(b"BT /F1 %.1f Tf %.3f %.3f Td (%s) Tj ET\n" % (size * MM, X(x), Y(y), _pdf_text(txt)))
+
+    # Template content is clipped to the tile; marks and labels sit outside the clip
+    parts.append(b"q %.3f %.3f %.3f %.3f re W n\n" % (X(margin), Y(margin + tile.height), tile.width * MM, tile.height * MM))
+    _render_ops(tile_ops(profile, tile), margin - tile.x0, margin - tile.y0, line, polyline, text)
+    parts.append(b"Q\n")
+    _render_ops(page_ops(tile, n_tiles, page_w, page_h, margin, overlap, title), 0.0, 0.0, line, polyline, text)
+    return b"".join(parts)
+
+def write_pdf(profile: Dict[str, np.ndarray], out: BinaryIO, title: str, paper: str = "A4",
+              margin: float = 10.0, overlap: float = 10.0) -> int:
+    """Streams the tiled template as PDF into out. Returns the number of pages."""
+    tiles, page_w, page_h = layout_tiles(profile, paper, margin, overlap)
+    pdf = StreamingPdf(out, page_w, page_h)
+    for tile in tiles:
+        pdf.add_page(_pdf_page(profile, tile, len(tiles), page_w, page_h, margin, overlap, title))
+    pdf.close()
+    return len(tiles)
+
+def _svg_escape(txt: str) -> str:
+    return txt.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+def _svg_page(profile, tile: Tile, n_tiles: int, page_w: float, page_h: float, margin: float, overlap: float, title: str) -> str:
+    parts = [f'<svg xmlns="http://www.w3.org/2000/svg" width="{page_w:g}mm" height="{page_h:g}mm" viewBox="0 0 {page_w:g} {page_h:g}">',
+             f'<defs><clipPath id="tile"><rect x="{margin:g}" y="{margin:g}" width="{tile.width:g}" height="{tile.height:g}"/></clipPath></defs>',
+             '<g fill="none" stroke="black" font-family="Helvetica, Arial, sans-serif">']
+
+    def line(x1, y1, x2, y2, width, dashed):
+        dash = ' stroke-dasharray="2 2"' if dashed else ""
+        parts.append(f'<line x1="{x1:.3f}" y1="{y1:.3f}" x2="{x2:.3f}" y2="{y2:.3f}" stroke-width="{width:g}"{dash}/>')
+
+    def polyline(xs, ys, width):
+        pts = " ".join(f"{x:.3f},{y:.3f}" for x, y in zip(xs, ys))
+        parts.append(f'<polyline points="{pts}" stroke-width="{width:g}"/>')
+
+    def text(x, y, size, txt):
+        parts.append(f'<text x="{x:.3f}" y="{y:.3f}" font-size="{size:g}" fill="black" stroke="none">{_svg_escape(txt)}</text>')
+
+    parts.append('<g clip-path="url(#tile)">')
+    _render_ops(tile_ops(profile, tile), margin - tile.x0, margin - tile.y0, line, polyline, text)
+    parts.append('</g>')
+    _render_ops(page_ops(tile, n_tiles, page_w, page_h, margin, overlap, title), 0.0, 0.0, line, polyline, text)
+    parts.append('</g></svg>')
+    return "\n".join(parts)
+
+def write_svg_zip(profile: Dict[str, np.ndarray], out: BinaryIO, title: str, paper: str = "A4",
+                  margin: float = 10.0, overlap: float = 10.0) -> int:
+    """Streams one SVG per page into a ZIP archive. Returns the number of pages."""
+    tiles, page_w, page_h = layout_tiles(profile, paper, margin, overlap)
+    stamp = datetime.now().timetuple()[:6]
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf:
+        for tile in tiles:
+            info = zipfile.ZipInfo(f"schablone_seite_{tile.number:03d}.svg", date_time=stamp)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            zf.writestr(info, _svg_page(profile, tile, len(tiles), page_w, page_h, margin, overlap, title))
+    return len(tiles)
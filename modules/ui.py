@@ -1,7 +1,7 @@
 import streamlit as st
 import time
 from datetime import datetime
-from modules.database import DatabaseRepository
+from modules.database import DatabaseRepository, set_current_user
 
 def init_app_state():
     defaults = {
@@ -74,6 +74,38 @@ def deserialize_state(data: dict):
         
     return restored_fits, restored_cuts
 
+def _workspace_fingerprint():
+    # repr of the dataclasses is enough to detect edits and far cheaper than asdict + json
+    return (hash(repr(st.session_state.fitting_list)),
+            {c.id: hash(repr(c)) for c in st.session_state.saved_cuts})
+
+def mark_workspace_clean(project_id: int, base: dict = None):
+    """Records the current workspace as stored, e.g. right after loading it. base: stored versions (load_workspace)."""
+    fits, cuts = _workspace_fingerprint()
+    st.session_state.ws_snapshot = {'project': project_id, 'fits': fits, 'cuts': cuts, 'base': base}
+
+def autosave_workspace(project_id: int) -> bool:
+    """Writes the workspace deltas since the last save/load. Returns False if nothing changed."""
+    if not project_id: return False
+    snap = st.session_state.get('ws_snapshot')
+    if not snap or snap['project'] != project_id:
+        snap = {'project': project_id, 'fits': None, 'cuts': {}, 'base': None}
+    fits, cuts = _workspace_fingerprint()
+    changed = [asdict(c) for c in st.session_state.saved_cuts if snap['cuts'].get(c.id) != cuts[c.id]]
+    deleted = [cid for cid in snap['cuts'] if cid not in cuts]
+    fitting_list = None if fits == snap['fits'] else [asdict(x) for x in st.session_state.fitting_list]
+    if fitting_list is None and not changed and not deleted: return False
+    result = DatabaseRepository.save_workspace_delta(project_id, fitting_list, changed, deleted, base=snap.get('base'))
+    base = result['base']
+    if result['merged']:
+        # Another session saved meanwhile: continue on the merged workspace
+        ws_data, base = DatabaseRepository.load_workspace(project_id, with_base=True)
+        st.session_state.fitting_list, st.session_state.saved_cuts = deserialize_state(ws_data)
+        fits, cuts = _workspace_fingerprint()
+        for msg in result['conflicts']: st.toast(msg, icon="⚠️")
+    st.session_state.ws_snapshot = {'project': project_id, 'fits': fits, 'cuts': cuts, 'base': base}
+    return True
+
 def render_sidebar_projects():
     st.sidebar.title("🏗️ PipeCraft")
     st.sidebar.caption("v3.5 (Final)")
@@ -93,11 +125,12 @@ def render_sidebar_projects():
         st.session_state.active_project_order = p_ord
         
         # Load Workspace on Startup
-        ws_data = DatabaseRepository.load_workspace(pid)
+        ws_data, ws_base = DatabaseRepository.load_workspace(pid, with_base=True)
         if ws_data:
             fl, sc = deserialize_state(ws_data)
             st.session_state.fitting_list = fl
             st.session_state.saved_cuts = sc
+        mark_workspace_clean(pid, ws_base)
 
     current_proj_data = next((p for p in projects if p[0] == st.session_state.active_project_id), None)
     if current_proj_data:
@@ -141,8 +174,7 @@ def render_sidebar_projects():
         # SAVE OLD WORKSPACE
         old_id = st.session_state.active_project_id
         if old_id:
-            data = serialize_state()
-            DatabaseRepository.save_workspace(old_id, data)
+            autosave_workspace(old_id)
         
         # SWITCH PROJECT
         st.session_state.active_project_id = new_id
@@ -151,7 +183,7 @@ def render_sidebar_projects():
         st.session_state.active_project_order = new_ord
         
         # LOAD NEW WORKSPACE
-        ws_data = DatabaseRepository.load_workspace(new_id)
+        ws_data, ws_base = DatabaseRepository.load_workspace(new_id, with_base=True)
         if ws_data:
             fl, sc = deserialize_state(ws_data)
             st.session_state.fitting_list = fl
@@ -159,12 +191,17 @@ def render_sidebar_projects():
         else:
             st.session_state.saved_cuts = [] 
             st.session_state.fitting_list = []
+        mark_workspace_clean(new_id, ws_base)
             
         st.rerun()
 
     if st.session_state.project_archived == 1:
         st.sidebar.warning("🔒 Projekt ist archiviert (Read-Only)")
 
+    # Recorded with every logbook change (Änderungsprotokoll)
+    editor = st.sidebar.text_input("👷 Bearbeiter", key="editor_name", placeholder="Name für das Änderungsprotokoll")
+    set_current_user(editor)
+
     with st.sidebar.expander("➕ Neues Projekt"):
         new_proj = st.text_input("Projekt-Name", placeholder="z.B. Halle 4")
         new_ord_num = st.text_input("Auftragsnummer (Optional)", placeholder="z.B. AN-12345678")
@@ -1,53 +1,175 @@
 import math
-import numpy as np
+import hashlib
+import importlib.util
+import threading
+import dataclasses
 import pandas as pd
-import matplotlib.pyplot as plt
+from collections import OrderedDict
 from io import BytesIO
 from datetime import datetime
+from typing import Iterable, List, Sequence
 
-# Optional Imports
-try:
-    from fpdf import FPDF
-    PDF_AVAILABLE = True
-except (ImportError, ModuleNotFoundError):
-    PDF_AVAILABLE = False
-    class FPDF: pass # Dummy
+# Heavy/optional dependencies are imported on first use, not at app start
+PDF_AVAILABLE = importlib.util.find_spec("fpdf") is not None
+PLOTLY_AVAILABLE = importlib.util.find_spec("plotly") is not None
 
-try:
+_PLT = None
+
+def _pyplot():
+    """matplotlib.pyplot on the non-interactive Agg backend (no display on the server)."""
+    global _PLT
+    if _PLT is None:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+        _PLT = plt
+    return _PLT
+
+def _plotly():
     import plotly.graph_objects as go
-    PLOTLY_AVAILABLE = True
-except (ImportError, ModuleNotFoundError):
-    PLOTLY_AVAILABLE = False
+    return go
+
+class _TextBuffer:
+    """Append-only document buffer: len() and += like the str FPDF 1.x uses, without recopying."""
+    def __init__(self):
+        self._parts = []
+        self._len = 0
+
+    def __iadd__(self, s: str):
+        self._parts.append(s)
+        self._len += len(s)
+        return self
+
+    def __len__(self):
+        return self._len
+
+    def __str__(self):
+        return "".join(self._parts)
+
+_FPDF = None
+
+def _fpdf():
+    global _FPDF
+    if _FPDF is None:
+        import fpdf
+        _FPDF = fpdf.FPDF
+        if fpdf.FPDF_VERSION.startswith("1."):
+            # FPDF 1.x grows the whole document with `str +=`, quadratic for reports of 1000+ pages
+            class BufferedFPDF(fpdf.FPDF):
+                def __init__(self, *args, **kwargs):
+                    super().__init__(*args, **kwargs)
+                    self.buffer = _TextBuffer()
+
+                def output(self, name='', dest=''):
+                    if self.state < 3: self.close()
+                    self.buffer = str(self.buffer)
+                    return super().output(name, dest)
+            _FPDF = BufferedFPDF
+    return _FPDF
+
+# Excel exports: columns never exported, number formats and widths per column
+EXCEL_DROP_COLUMNS = ['✏️', 'Löschen', 'id', 'Auswahl', 'project_id', 'dn_clean', 'charge', 'version']
+EXCEL_FORMATS = {'laenge': '0.0', 'raw_length': '0.0', 'cut_length': '0.0', 'Menge': '0.00',
+                 'Länge (mm)': '0.0', 'Stangenlänge (mm)': '0.0', 'Rest (mm)': '0.0'}
+EXCEL_WIDTHS = {'iso': 18, 'bauteil': 22, 'charge_apz': 16, 'schweisser': 14, 'name': 20, 'details': 40,
+                'fittings': 40, 'Beschreibung': 30, 'Bezeichnung': 20}
+
+# Logbook columns printed in the Fertigungsbescheinigung (its cache key)
+REPORT_COLUMNS = ['iso', 'naht', 'dimension', 'bauteil', 'charge_apz', 'schweisser']
+
+class FigureCache:
+    """
+    Bounded LRU cache of rendered output (PNG figures, PDF reports) as bytes. Evicts least recently
+    used entries beyond max_entries or max_bytes; counts hits and misses.
+    """
+    def __init__(self, max_entries: int = 64, max_bytes: int = 32 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._data: "OrderedDict[tuple, bytes]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, key: tuple, render):
+        with self._lock:
+            png = self._data.get(key)
+            if png is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return png
+            self.misses += 1
+        png = render()
+        if png is None or len(png) > self.max_bytes: return png
+        with self._lock:
+            if key not in self._data:
+                self._data[key] = png
+                self._bytes += len(png)
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                _, old = self._data.popitem(last=False)
+                self._bytes -= len(old)
+        return png
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._data), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+            self.hits = self.misses = 0
+
+def _cache_key(value):
+    """Hashable stand-in for plot inputs (tables by content, dataclasses by value)."""
+    if isinstance(value, pd.DataFrame):
+        return ("df", int(pd.util.hash_pandas_object(value, index=False).sum()), tuple(value.columns))
+    if dataclasses.is_dataclass(value):
+        return repr(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_cache_key(v) for v in value)
+    return value
 
 class Visualizer:
+    cache = FigureCache()
+
     @staticmethod
-    def plot_stutzen(dn_haupt, dn_stutzen, df_pipe):
-        row_h = df_pipe[df_pipe['DN'] == dn_haupt].iloc[0]
-        row_s = df_pipe[df_pipe['DN'] == dn_stutzen].iloc[0]
-        r_main = row_h['D_Aussen'] / 2; r_stub = row_s['D_Aussen'] / 2
-        
-        if r_stub > r_main:
+    def render_png(plot: str, *args, dpi: int = 120) -> bytes:
+        """
+        PNG of Visualizer.<plot>(*args), served from the figure cache when the
+        same plot was rendered with the same inputs before. None if the plot is empty.
+        """
+        def render():
+            fig = getattr(Visualizer, plot)(*args)
+            if fig is None: return None
+            buf = BytesIO()
+            fig.savefig(buf, format="png", dpi=dpi, bbox_inches="tight")
+            return buf.getvalue()
+        return Visualizer.cache.get_or_render((plot, dpi, _cache_key(args)), render)
+
+    @staticmethod
+    def plot_stutzen(r_main: float, r_stub: float, step: float = 1.0, offset: float = 0.0, branch_angle: float = 90.0):
+        from modules.calculations import saddle_profile
+        plt = _pyplot()
+        try:
+            prof = saddle_profile(r_main, r_stub, step, offset, branch_angle)
+        except ValueError as e:
             fig, ax = plt.subplots(figsize=(6, 2))
-            ax.text(0.5, 0.5, "FEHLER: Stutzen > Hauptrohr", ha='center', va='center', color='red', fontsize=12, fontweight='bold')
+            ax.text(0.5, 0.5, f"FEHLER: {e}", ha='center', va='center', color='red', fontsize=12, fontweight='bold')
             ax.axis('off')
             plt.close(fig)
             return fig
 
-        angles = range(0, 361, 5); depths = []
-        for a in angles:
-            try:
-                term = r_stub * math.sin(math.radians(a))
-                depths.append(r_main - math.sqrt(r_main**2 - term**2))
-            except ValueError: depths.append(0)
         fig, ax = plt.subplots(figsize=(8, 2))
-        ax.plot(angles, depths, color='#3b82f6', lw=2)
-        ax.fill_between(angles, depths, color='#eff6ff', alpha=0.5)
+        ax.plot(prof["angle"], prof["depth"], color='#3b82f6', lw=2)
+        ax.fill_between(prof["angle"], prof["depth"], color='#eff6ff', alpha=0.5)
         ax.set_xlim(0, 360); ax.set_ylabel("Tiefe (mm)"); ax.grid(True, linestyle='--', alpha=0.5)
         plt.tight_layout()
         plt.close(fig) 
         return fig
     @staticmethod
     def plot_2d_offset(run: float, offset: float):
+        plt = _pyplot()
         fig, ax = plt.subplots(figsize=(6, 2.5))
         x = [0, run, run*1.5] 
         y = [0, offset, offset]
@@ -65,6 +187,8 @@ class Visualizer:
         return fig
     @staticmethod
     def plot_rolling_offset_3d_room(roll: float, run: float, set_val: float):
+        import numpy as np
+        plt = _pyplot()
         fig = plt.figure(figsize=(7, 6))
         ax = fig.add_subplot(111, projection='3d')
         P0 = np.array([0, 0, 0])
@@ -91,6 +215,7 @@ class Visualizer:
         return fig
     @staticmethod
     def plot_rotation_gauge(roll: float, set_val: float, rotation_angle: float):
+        plt = _pyplot()
         fig, ax = plt.subplots(figsize=(3, 3), subplot_kw={'projection': 'polar'})
         theta = math.radians(rotation_angle)
         ax.arrow(0, 0, theta, 0.9, head_width=0.1, head_length=0.1, fc='#ef4444', ec='#ef4444', length_includes_head=True)
@@ -106,6 +231,7 @@ class Visualizer:
         return fig
     @staticmethod
     def plot_segment_schematic(mid_back: float, mid_belly: float, od: float, angle: float):
+        plt = _pyplot()
         fig, ax = plt.subplots(figsize=(6, 3))
         height = od
         top_len = mid_back
@@ -134,6 +260,7 @@ class Visualizer:
         bars: List of OptBar objects
         """
         if not bars: return None
+        plt = _pyplot()
         
         num_bars = len(bars)
         fig, ax = plt.subplots(figsize=(10, max(2, num_bars * 0.8)))
@@ -184,6 +311,7 @@ class Visualizer:
         """Creates interactive 3D plot using Plotly with explicit dimensions"""
         if not PLOTLY_AVAILABLE:
             return None
+        go = _plotly()
             
         # Coordinates
         # Start: (0, 0, 0)
@@ -293,15 +421,71 @@ class Exporter:
 
     @staticmethod
     def to_excel(df):
+        export_df = df.drop(columns=EXCEL_DROP_COLUMNS, errors='ignore').astype(object)
+        export_df = export_df.where(export_df.notna(), None)
+        for col in export_df.columns:  # lists/dicts (e.g. fittings) as text, like pandas did
+            export_df[col] = export_df[col].map(lambda v: str(v) if isinstance(v, (list, dict, tuple, set)) else v)
+        return Exporter.to_excel_stream(export_df.itertuples(index=False, name=None), list(export_df.columns))
+
+    @staticmethod
+    def to_excel_stream(rows: Iterable[Sequence], columns: List[str], sheet_name: str = 'Daten', formats: dict = None) -> bytes:
+        """
+        Writes rows (any iterable of value tuples, e.g. a DB cursor) into a write-only
+        workbook: rows go straight to the sheet's temp file, never into a DataFrame or
+        cell grid. Bold frozen header, column widths and number formats (EXCEL_FORMATS).
+        """
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.styles import Font
+        from openpyxl.utils import get_column_letter
+
+        formats = {**EXCEL_FORMATS, **(formats or {})}
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet(sheet_name)
+        for i, col in enumerate(columns, 1):
+            ws.column_dimensions[get_column_letter(i)].width = EXCEL_WIDTHS.get(col, max(10, len(str(col)) + 2))
+        ws.freeze_panes = "A2"
+        header = []
+        for col in columns:
+            cell = WriteOnlyCell(ws, value=str(col))
+            cell.font = Font(bold=True)
+            header.append(cell)
+        ws.append(header)
+        # One styled cell per formatted column, reused: append() writes it out immediately
+        styled = {}
+        for i, col in enumerate(columns):
+            if col in formats:
+                styled[i] = WriteOnlyCell(ws)
+                styled[i].number_format = formats[col]
+        for row in rows:
+            if styled:
+                row = list(row)
+                for i, cell in styled.items():
+                    cell.value = row[i]
+                    row[i] = cell
+            ws.append(row)
         output = BytesIO()
-        export_df = df.drop(columns=['✏️', 'Löschen', 'id', 'Auswahl', 'project_id', 'dn_clean', 'charge'], errors='ignore')
-        with pd.ExcelWriter(output, engine='openpyxl') as writer:
-            export_df.to_excel(writer, index=False, sheet_name='Daten')
+        wb.save(output)
         return output.getvalue()
 
+    report_cache = FigureCache(max_entries=8, max_bytes=64 * 1024 * 1024)
+
+    @staticmethod
+    def final_report(df_log, project_name, meta_data=None) -> bytes:
+        """
+        Fertigungsbescheinigung, built once per logbook revision: cached by a content
+        hash of the report columns plus the cover data and the date printed on it.
+        """
+        meta_data = dict(meta_data or {})
+        content = df_log.reindex(columns=REPORT_COLUMNS)
+        digest = hashlib.sha256(pd.util.hash_pandas_object(content, index=False).values.tobytes()).hexdigest()
+        key = ("final_report", digest, project_name, tuple(sorted(meta_data.items())), datetime.now().strftime('%d.%m.%Y'))
+        return Exporter.report_cache.get_or_render(key, lambda: Exporter.to_pdf_final_report(df_log, project_name, meta_data))
+
     @staticmethod
     def to_pdf_final_report(df_log, project_name, meta_data=None):
         if not PDF_AVAILABLE: return b""
+        FPDF = _fpdf()
         if meta_data is None: meta_data = {}
         
         pdf = FPDF(orientation='P', unit='mm', format='A4')
@@ -371,23 +555,31 @@ class Exporter:
         pdf.cell(0, 10, "ANLAGE 1: Material-Rückverfolgbarkeit", 0, 1, 'L')
         pdf.ln(5)
         
-        df_log['charge_apz'] = df_log['charge_apz'].fillna('OHNE NACHWEIS').replace('', 'OHNE NACHWEIS')
-        groups = df_log.groupby('charge_apz')
+        # Traceability: one groupby over (APZ, DN, Bauteil); ISOs in logbook order, first three per group
+        trace = pd.DataFrame({
+            'apz': df_log['charge_apz'].fillna('').replace('', 'OHNE NACHWEIS'),
+            'dimension': df_log['dimension'], 'bauteil': df_log['bauteil'], 'iso': df_log['iso'].fillna('').astype(str),
+        })
+        keys = ['apz', 'dimension', 'bauteil']
+        counts = trace.groupby(keys).size()
+        isos = trace.drop_duplicates(keys + ['iso'])
+        isos = isos[isos.groupby(keys).cumcount() < 4]  # a fourth ISO only switches on the "..."
+        iso_lists = isos.groupby(keys)['iso'].agg(list)
         pdf.set_font("Arial", size=10)
-        for apz, group in groups:
-            pdf.set_fill_color(240, 240, 240)
-            pdf.set_font("Arial", 'B', 10)
-            pdf.cell(0, 8, f"Charge / APZ: {Exporter.clean_text_for_pdf(apz)}", 1, 1, 'L', fill=True)
-            pdf.set_font("Arial", size=9)
-            agg = group.groupby(['dimension', 'bauteil']).size().reset_index(name='count')
-            for _, row in agg.iterrows():
-                txt = f"   {row['count']}x {row['bauteil']} {row['dimension']}"
-                isos = group[(group['dimension']==row['dimension']) & (group['bauteil']==row['bauteil'])]['iso'].unique()
-                iso_txt = ", ".join(isos[:3])
-                if len(isos) > 3: iso_txt += "..."
-                pdf.cell(90, 6, Exporter.clean_text_for_pdf(txt), 1)
-                pdf.cell(0, 6, f"Verbaut in: {Exporter.clean_text_for_pdf(iso_txt)}", 1, 1)
-            pdf.ln(2)
+        current_apz = None
+        for (apz, dim, bauteil), count in counts.items():
+            if apz != current_apz:
+                if current_apz is not None: pdf.ln(2)
+                current_apz = apz
+                pdf.set_fill_color(240, 240, 240)
+                pdf.set_font("Arial", 'B', 10)
+                pdf.cell(0, 8, f"Charge / APZ: {Exporter.clean_text_for_pdf(apz)}", 1, 1, 'L', fill=True)
+                pdf.set_font("Arial", size=9)
+            group_isos = iso_lists[(apz, dim, bauteil)]
+            iso_txt = ", ".join(group_isos[:3]) + ("..." if len(group_isos) > 3 else "")
+            pdf.cell(90, 6, Exporter.clean_text_for_pdf(f"   {count}x {bauteil} {dim}"), 1)
+            pdf.cell(0, 6, f"Verbaut in: {Exporter.clean_text_for_pdf(iso_txt)}", 1, 1)
+        if current_apz is not None: pdf.ln(2)
 
         pdf.add_page()
         pdf.set_font("Arial", 'B', 14)
@@ -401,17 +593,33 @@ class Exporter:
         pdf.ln()
         
         pdf.set_font("Arial", size=9)
-        for _, row in df_log.iterrows():
-            vals = [str(row.get(k.lower(), '')) if k.lower() != 'dn' else str(row.get('dimension','')) for k in cols]
+        detail = df_log.reindex(columns=['iso', 'naht', 'dimension', 'bauteil', 'schweisser']).fillna('').astype(str)
+        for vals in detail.itertuples(index=False, name=None):
             for i, v in enumerate(vals):
                 pdf.cell(widths[i], 7, Exporter.clean_text_for_pdf(v[:25]), 1)
             pdf.ln()
 
         return pdf.output(dest='S').encode('latin-1')
 
+    @staticmethod
+    def to_wrap_template(profile: dict, title: str, fmt: str = "pdf", paper: str = "A4", out=None):
+        """
+        True-scale tiled wrap template of a cut profile (saddle_profile / wedge_gap_profile).
+        fmt "pdf" gives one multi-page PDF, "svg" a ZIP with one SVG per page. Pages are
+        written to `out` one by one; without out the file is returned as bytes.
+        """
+        from modules import templates
+        writer = {"pdf": templates.write_pdf, "svg": templates.write_svg_zip}[fmt]
+        if out is not None:
+            return writer(profile, out, title, paper)
+        buf = BytesIO()
+        writer(profile, buf, title, paper)
+        return buf.getvalue()
+
     @staticmethod
     def to_pdf_sawlist(df, project_name="Unbekannt"):
         if not PDF_AVAILABLE: return b""
+        FPDF = _fpdf()
         pdf = FPDF(orientation='L', unit='mm', format='A4')
         pdf.add_page()
         pdf.set_font("Arial", 'B', 16)
@@ -8,12 +8,12 @@ import math
 from dataclasses import asdict
 from datetime import datetime
 
-from modules.database import DatabaseRepository, DB_NAME
+from modules.database import DatabaseRepository, DB_NAME, LOGBOOK_COLUMNS
 from modules.models import FittingItem, SavedCut
-from modules.calculations import PipeCalculator, MaterialManager, HandbookCalculator
-from modules.utils import Visualizer, Exporter, PDF_AVAILABLE, PLOTLY_AVAILABLE
-from modules.optimization import CuttingOptimizer, CutRequest
-from modules.ui import init_app_state, render_smart_input, render_sidebar_projects
+from modules.calculations import PipeCalculator, MaterialManager, HandbookCalculator, get_calculator
+from modules.utils import Visualizer, Exporter, PDF_AVAILABLE, PLOTLY_AVAILABLE, EXCEL_DROP_COLUMNS
+from modules.optimization import CuttingOptimizer, CutRequest, StockItem, BranchAndBoundSolver
+from modules.ui import init_app_state, render_smart_input, render_sidebar_projects, autosave_workspace
 
 # Logging setup
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -54,11 +54,9 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data
-def load_pipe_data():
-    with open('data/pipe_dimensions.json', 'r') as f:
-        data = json.load(f)
-    return pd.DataFrame(data)
+def load_calculator() -> PipeCalculator:
+    # Process-wide registry: parsed once, reloaded when the file changes
+    return get_calculator()
 
 def render_smart_saw(calc: PipeCalculator, df: pd.DataFrame, current_dn: int, pn: str):
     st.markdown('<div class="machine-header-saw">🪚 SMARTE SÄGE</div>', unsafe_allow_html=True)
@@ -212,7 +210,7 @@ def render_smart_saw(calc: PipeCalculator, df: pd.DataFrame, current_dn: int, pn
                         new_cut = SavedCut(new_id, final_name, res['raw'], res['final'], 
                                          f"{len(current_fittings_copy)} Teile", 
                                          datetime.now().strftime("%H:%M"), 
-                                         current_fittings_copy)
+                                         current_fittings_copy, dn=int(current_dn))
                         
                         st.session_state.saved_cuts.append(new_cut)
                         st.session_state.fitting_list = [] 
@@ -271,79 +269,193 @@ def render_smart_saw(calc: PipeCalculator, df: pd.DataFrame, current_dn: int, pn
                 if col_trans.button(f"📝 Übertragen ({num_sel})", disabled=btns_disabled, type="primary", use_container_width=True):
                     count_pipes = 0
                     count_fits = 0
+                    today = datetime.now().strftime("%d.%m.%Y")
+                    rows = []
                     for cut in st.session_state.saved_cuts:
                         if cut.id in selected_ids:
-                            DatabaseRepository.add_entry({
-                                "iso": cut.name, "naht": "", "datum": datetime.now().strftime("%d.%m.%Y"),
-                                "dimension": f"DN {current_dn}", "bauteil": "Rohrstoß", "laenge": cut.cut_length,
+                            rows.append({
+                                "iso": cut.name, "naht": "", "datum": today,
+                                "dimension": f"DN {cut.dn or current_dn}", "bauteil": "Rohrstoß", "laenge": cut.cut_length,
                                 "charge": "", "charge_apz": "", "schweisser": "", "project_id": active_pid
                             })
                             count_pipes += 1
                             for fit in cut.fittings:
                                 fit_name_clean = fit.name.split(" DN")[0]
                                 for _ in range(fit.count):
-                                    DatabaseRepository.add_entry({
-                                        "iso": cut.name, "naht": "", "datum": datetime.now().strftime("%d.%m.%Y"),
+                                    rows.append({
+                                        "iso": cut.name, "naht": "", "datum": today,
                                         "dimension": f"DN {fit.dn}", "bauteil": fit_name_clean, "laenge": 0.0,
                                         "charge": "", "charge_apz": "", "schweisser": "", "project_id": active_pid
                                     })
                                     count_fits += 1
+                    # One transaction: either the whole selection lands in the Rohrbuch or nothing
+                    DatabaseRepository.add_entries(rows)
                     
                     st.toast(f"✅ {count_pipes} Rohre und {count_fits} Fittings übertragen!", icon="📦")
                     time.sleep(0.5)
 
                 fname_base = f"Saege_{proj_name.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}"
-                excel_data = Exporter.to_excel(df_s)
-                col_excel.download_button("📥 Excel (Alle)", excel_data, f"{fname_base}.xlsx", use_container_width=True)
+                # Built only when the button is clicked
+                col_excel.download_button("📥 Excel (Alle)", lambda: Exporter.to_excel(df_s), f"{fname_base}.xlsx", use_container_width=True)
 
             # --- OPTIMIZER BLOCK ---
             st.markdown("<div style='margin-top: 20px;'></div>", unsafe_allow_html=True)
             with st.expander("✂️ Schnitt-Optimierung (Verschnitt-Minimierung)", expanded=False):
                 st.caption("Berechnet die optimale Aufteilung der gewählten Schnitte auf Stangen.")
                 
+                use_inventory = st.toggle("📦 Lagerbestand & Reste (mehrere Stangenlängen)", key="opt_use_inventory")
+                sel_cuts = [cut for cut in st.session_state.saved_cuts if cut.id in selected_ids]
+                # Remnants are taken and booked per DN of the selected cuts, not the sidebar default
+                sel_dns = sorted({cut.dn or current_dn for cut in sel_cuts}) or [current_dn]
+                
                 c_opt1, c_opt2 = st.columns(2)
-                stock_len = c_opt1.number_input("Stangenlänge (mm)", value=6000.0, step=500.0)
                 saw_width = c_opt2.number_input("Sägeblatt (mm)", value=3.0, step=0.5)
                 
+                if use_inventory:
+                    remnants = {dn: DatabaseRepository.get_remnants(active_pid, f"DN {dn}") for dn in sel_dns}
+                    n_remnants = sum(len(r) for r in remnants.values())
+                    c_opt1.number_input("Rest ins Lager ab (mm)", value=500.0, step=100.0, key="opt_remnant_threshold")
+                    st.caption("Stangen im Lager je DN (Anzahl 0 = unbegrenzt)")
+                    stock_df = st.data_editor(
+                        pd.DataFrame({"Länge (mm)": [6000.0, 12000.0], "Anzahl": [0, 0], "Preis (€/Stange)": [0.0, 0.0]}),
+                        num_rows="dynamic", hide_index=True, use_container_width=True, key="opt_stock_editor"
+                    )
+                    use_remnants = st.checkbox(f"♻️ Reste aus Projektlager nutzen ({n_remnants} Stk {', '.join(f'DN {dn}' for dn in sel_dns)})",
+                                               value=True, disabled=not n_remnants)
+                else:
+                    stock_len = c_opt1.number_input("Stangenlänge (mm)", value=6000.0, step=500.0)
+                    solver_names = list(CuttingOptimizer.SOLVERS)
+                    c_opt3, c_opt4 = st.columns(2)
+                    solver_name = c_opt3.selectbox("Verfahren", solver_names, format_func=lambda n: CuttingOptimizer.SOLVERS[n].label, key="opt_solver")
+                    solver_opts = {}
+                    if solver_name == BranchAndBoundSolver.name:
+                        solver_opts["time_limit"] = c_opt4.number_input("Zeitlimit (s)", value=2.0, min_value=0.1, step=0.5)
+                
                 if st.button("🚀 Optimierung starten", disabled=btns_disabled, use_container_width=True):
-                    # Gather cuts
-                    requests = []
-                    for cut in st.session_state.saved_cuts:
-                        if cut.id in selected_ids: 
-                            requests.append(CutRequest(id=cut.name, length=cut.cut_length))
+                    requests = [CutRequest(id=cut.name, length=cut.cut_length, dn=cut.dn or current_dn) for cut in sel_cuts]
                     
                     if not requests:
                         st.error("Bitte Schnitte auswählen!")
+                    elif use_inventory:
+                        inventory = []
+                        for _, srow in stock_df.dropna(subset=["Länge (mm)"]).iterrows():
+                            if srow["Länge (mm)"] <= 0: continue
+                            qty = int(srow["Anzahl"]) if pd.notna(srow["Anzahl"]) and srow["Anzahl"] > 0 else None
+                            price = float(srow["Preis (€/Stange)"]) if pd.notna(srow["Preis (€/Stange)"]) else 0.0
+                            inventory.append(StockItem(float(srow["Länge (mm)"]), qty, price))
+                        # One solve per DN: a DN 150 cut must not end up on a DN 100 remnant
+                        st.session_state.opt_inventory = {
+                            f"DN {dn}": CuttingOptimizer.solve_inventory(
+                                dn_requests, inventory + ([StockItem(r[2], 1, 0.0, remnant_id=r[0]) for r in remnants[dn]] if use_remnants else []),
+                                saw_width, st.session_state.opt_remnant_threshold)
+                            for dn, dn_requests in CuttingOptimizer.group_by_dn(requests).items()}
+                        st.toast("Optimierung fertig!")
                     else:
-                        result_bars = CuttingOptimizer.solve_ffd(requests, stock_len, saw_width)
-                        st.session_state.opt_results = result_bars
+                        # Like the project run: every DN is its own cutting problem
+                        st.session_state.opt_results = CuttingOptimizer.solve_project(requests, stock_len, saw_width, solver_name, **solver_opts)
                         st.toast("Optimierung fertig!")
 
-                if 'opt_results' in st.session_state and st.session_state.opt_results:
-                    bars = st.session_state.opt_results
-                    total_waste = sum(b.waste for b in bars)
+                if use_inventory and st.session_state.get('opt_inventory'):
+                    for inv_dim, inv_res in st.session_state.opt_inventory.items():
+                        bars = inv_res.bars
+                        n_rest = len(inv_res.consumed_remnant_ids)
                     
-                    st.divider()
-                    st.markdown("##### Ergebnis:")
-                    m1, m2 = st.columns(2)
-                    m1.metric("Benötigte Stangen", f"{len(bars)} Stk")
-                    m2.metric("Gesamtabfall", f"{total_waste/1000:.2f} m")
+                        st.divider()
+                        st.markdown(f"##### Ergebnis ({inv_dim}):")
+                        m1, m2, m3, m4 = st.columns(4)
+                        m1.metric("Stangen", f"{len(bars) - n_rest} neu", f"+{n_rest} Reste", delta_color="off")
+                        m2.metric("Kosten", f"{inv_res.total_cost:.2f} €")
+                        m3.metric("Material neu", f"{inv_res.material_new/1000:.2f} m", f"genutzt {inv_res.material_used/1000:.2f} m", delta_color="off")
+                        m4.metric("Schrott", f"{inv_res.scrap/1000:.2f} m", f"{len(inv_res.new_remnants)} Reste ins Lager", delta_color="off")
+                        if inv_res.unplaced:
+                            st.error(f"Kein passendes Material für: {', '.join(f'{c.id} ({c.length:.0f})' for c in inv_res.unplaced)}")
+                    
+                        png_opt = Visualizer.render_png("plot_cutting_plan", bars)
+                        if png_opt:
+                            st.image(png_opt, use_container_width=True)
                     
-                    fig_opt = Visualizer.plot_cutting_plan(bars)
-                    if fig_opt:
-                        st.pyplot(fig_opt, use_container_width=True)
+                        with st.expander("Detailliste"):
+                            for b in bars:
+                                src = f"Rest #{b.remnant_id}" if b.remnant_id is not None else f"{b.length:.0f} mm"
+                                st.markdown(f"**Stange {b.id}** – {src} (Rest: {b.waste:.1f}mm)")
+                                st.caption(" | ".join(f"{c.length:.0f}" for c in b.cuts))
                     
-                    with st.expander("Detailliste"):
-                        for b in bars:
-                            st.markdown(f"**Stange {b.id}** (Rest: {b.waste:.1f}mm)")
-                            txts = [f"{c.length:.0f}" for c in b.cuts]
-                            st.caption(" | ".join(txts))
+                    if st.button("♻️ Reste im Lager verbuchen", use_container_width=True):
+                        source = f"Optimierung {datetime.now().strftime('%d.%m.%Y %H:%M')}"
+                        for inv_dim, inv_res in list(st.session_state.opt_inventory.items()):
+                            ok, msg = DatabaseRepository.apply_remnant_changes(active_pid, inv_dim, inv_res.consumed_remnant_ids,
+                                                                               inv_res.new_remnants, source=source)
+                            if not ok:
+                                st.error(f"{inv_dim}: {msg}")
+                                break
+                            del st.session_state.opt_inventory[inv_dim]
+                            st.toast(f"♻️ {inv_dim}: {msg}")
+                        else:
+                            del st.session_state.opt_inventory
+                            time.sleep(0.5)
+                            st.rerun()
+
+                elif not use_inventory and st.session_state.get('opt_results'):
+                    for dn, opt_res in st.session_state.opt_results.items():
+                        bars = opt_res.bars
+
+                        st.divider()
+                        st.markdown(f"##### Ergebnis (DN {dn}):")
+                        m1, m2, m3 = st.columns(3)
+                        m1.metric("Benötigte Stangen", f"{len(bars)} Stk")
+                        m2.metric("Gesamtabfall", f"{opt_res.total_waste/1000:.2f} m")
+                        m3.metric("Untere Schranke", f"{opt_res.lower_bound} Stk", "optimal" if opt_res.optimal else f"Lücke ≤ {opt_res.gap:.0%}", delta_color="off")
+                        st.caption(f"{CuttingOptimizer.SOLVERS[opt_res.solver].label} · {opt_res.runtime*1000:.0f} ms")
+
+                        png_opt = Visualizer.render_png("plot_cutting_plan", bars)
+                        if png_opt:
+                            st.image(png_opt, use_container_width=True)
+
+                        with st.expander("Detailliste"):
+                            for b in bars:
+                                st.markdown(f"**Stange {b.id}** (Rest: {b.waste:.1f}mm)")
+                                txts = [f"{c.length:.0f}" for c in b.cuts]
+                                st.caption(" | ".join(txts))
 
             st.markdown("<div style='margin-top: 20px;'></div>", unsafe_allow_html=True)
             if st.button("Alles Reset (Liste leeren)", type="secondary"):
                 st.session_state.saved_cuts = []
                 st.rerun()
 
+        # --- PROJEKT-OPTIMIERUNG (alle DN) ---
+        with st.expander("🏗️ Projekt-Optimierung (alle Rohre, je DN)", expanded=False):
+            st.caption("Sammelt alle Rohrlängen aus Rohrbuch und Schnittliste, gruppiert nach DN und optimiert jede Dimension separat.")
+            cp1, cp2, cp3 = st.columns(3)
+            p_stock = cp1.number_input("Stangenlänge (mm)", value=6000.0, step=500.0, key="proj_opt_stock")
+            p_saw = cp2.number_input("Sägeblatt (mm)", value=3.0, step=0.5, key="proj_opt_saw")
+            p_solver = cp3.selectbox("Verfahren", list(CuttingOptimizer.SOLVERS), format_func=lambda n: CuttingOptimizer.SOLVERS[n].label, key="proj_opt_solver")
+            
+            if st.button("🚀 Projekt optimieren", use_container_width=True, key="btn_proj_opt"):
+                df_pipes = DatabaseRepository.get_pipe_lengths(active_pid, MaterialManager.LINEAR_ITEMS)
+                requests = CuttingOptimizer.collect_project_requests(df_pipes, st.session_state.saved_cuts, current_dn)
+                if not requests:
+                    st.info("Keine Rohrlängen im Projekt gefunden.")
+                else:
+                    with st.spinner(f"Optimiere {len(requests)} Schnitte..."):
+                        st.session_state.proj_opt_results = CuttingOptimizer.solve_project(requests, p_stock, p_saw, p_solver)
+            
+            plans = st.session_state.get('proj_opt_results')
+            if plans:
+                summary = pd.DataFrame([{
+                    "DN": f"DN {dn}" if dn else "ohne DN", "Schnitte": sum(len(b.cuts) for b in r.bars), "Stangen": r.num_bars,
+                    "Untere Schranke": r.lower_bound, "Abfall (m)": round(r.total_waste / 1000, 2), "Optimal": "✅" if r.optimal else "–"
+                } for dn, r in plans.items()])
+                st.dataframe(summary, hide_index=True, use_container_width=True)
+                
+                plan_df = CuttingOptimizer.plan_to_frame(plans)
+                fname = f"Schnittplan_{proj_name.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.xlsx"
+                st.download_button("📥 Schnittplan (Excel)", lambda: Exporter.to_excel(plan_df), fname, key="dl_proj_plan")
+                
+                for dn, r in plans.items():
+                    with st.expander(f"DN {dn}: {r.num_bars} Stangen"):
+                        png_p = Visualizer.render_png("plot_cutting_plan", r.bars)
+                        if png_p: st.image(png_p, use_container_width=True)
+
 def render_geometry_tools(calc: PipeCalculator, df: pd.DataFrame):
     st.markdown('<div class="machine-header-geo">📐 GEOMETRIE & BERECHNUNG</div>', unsafe_allow_html=True)
     geo_tabs = st.tabs(["2D Etage (S-Schlag)", "3D Raum-Etage (Rolling)", "Bogen (Standard)", "🦞 Segment-Bogen", "Stutzen"])
@@ -522,7 +634,7 @@ def render_geometry_tools(calc: PipeCalculator, df: pd.DataFrame):
         if submit_noz:
             try:
                 df_c = calc.calculate_stutzen_coords(dn_main, dn_stub)
-                fig = Visualizer.plot_stutzen(dn_main, dn_stub, df)
+                fig = Visualizer.plot_stutzen(calc.spec.od(dn_main) / 2, calc.spec.od(dn_stub) / 2)
                 st.session_state.calc_res_noz = (df_c, fig)
             except ValueError as e: st.error(str(e))
             
@@ -537,11 +649,12 @@ def render_geometry_tools(calc: PipeCalculator, df: pd.DataFrame):
 def render_mto_tab(active_pid: int, proj_name: str):
     st.markdown('<div class="machine-header-doc">📦 MATERIAL MANAGER</div>', unsafe_allow_html=True)
     st.markdown(f"<div class='project-tag'>📍 PROJEKT: {html.escape(proj_name)}</div>", unsafe_allow_html=True)
-    df_log = DatabaseRepository.get_logbook_by_project(active_pid)
-    if df_log.empty:
+    # One indexed read of mto_summary (kept current by triggers), whatever the logbook size
+    groups = DatabaseRepository.get_mto_groups(active_pid)
+    if groups.empty:
         st.info("Keine Daten im Rohrbuch. Das Materiallager ist leer.")
         return
-    mto_df = MaterialManager.generate_mto(df_log)
+    mto_df = MaterialManager.mto_from_groups(groups)
     if not mto_df.empty:
         with st.container(border=True):
             total_items = len(mto_df)
@@ -552,9 +665,45 @@ def render_mto_tab(active_pid: int, proj_name: str):
         
         st.divider()
         fname = f"MTO_{proj_name.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.xlsx"
-        st.download_button("📥 MTO als Excel herunterladen", Exporter.to_excel(mto_df), fname, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", type="primary")
+        st.download_button("📥 MTO als Excel herunterladen", lambda: Exporter.to_excel(mto_df), fname, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", type="primary")
         st.dataframe(mto_df, use_container_width=True, hide_index=True)
 
+def render_trace_tab():
+    st.markdown('<div class="machine-header-doc">🔎 CHARGEN-RÜCKVERFOLGUNG</div>', unsafe_allow_html=True)
+    st.caption("Alle Nähte aller Projekte (auch archivierte) mit einer APZ / Charge, z.B. bei Rückruf eines Werkszeugnisses.")
+    heat = st.text_input("APZ / Charge", key="trace_heat", placeholder="z.B. H-4711").strip()
+    if not heat: return
+    df_trace = DatabaseRepository.trace_heat(heat)
+    if df_trace.empty:
+        # Heat numbers are often typed with a suffix or prefix missing: offer what starts with the input
+        candidates = DatabaseRepository.find_heats(heat, limit=10)
+        if candidates.empty:
+            st.info(f"Keine Nähte mit APZ / Charge '{heat}'.")
+        else:
+            st.info("Keine exakte Übereinstimmung. Ähnliche APZ / Chargen: " +
+                    ", ".join(f"{r.charge_apz} ({r.naehte} Nähte, {r.projekte} Projekte)" for r in candidates.itertuples()))
+        return
+
+    with st.container(border=True):
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Projekte", df_trace['project_id'].nunique())
+        c2.metric("ISOs", df_trace[['project_id', 'iso']].drop_duplicates().shape[0])
+        c3.metric("Nähte", len(df_trace))
+        c4.metric("Schweißer", df_trace['schweisser'].replace('', pd.NA).nunique())
+
+    view = df_trace[['projekt', 'auftrag', 'archiviert', 'iso', 'naht', 'datum', 'dimension', 'bauteil', 'schweisser', 'charge_apz']]
+    view = view.assign(archiviert=view['archiviert'].astype(bool))
+    fname = f"Rueckverfolgung_{heat.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.xlsx"
+    st.download_button("📥 Ergebnis als Excel herunterladen", lambda: Exporter.to_excel(view), fname,
+                       "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", type="primary")
+    for _, group in view.groupby('projekt', sort=False):
+        st.markdown(f"**{html.escape(str(group['projekt'].iloc[0]))}** · {len(group)} Nähte, ISO: "
+                    + ", ".join(group['iso'].dropna().astype(str).unique()[:10]))
+    st.dataframe(view, hide_index=True, use_container_width=True,
+                 column_config={"projekt": "Projekt", "auftrag": "Auftrag", "archiviert": "Archiviert", "iso": "ISO",
+                                "naht": "Naht", "datum": "Datum", "dimension": "DN", "bauteil": "Bauteil",
+                                "schweisser": "Schweißer", "charge_apz": "APZ / Charge"})
+
 def render_logbook(df_pipe: pd.DataFrame):
     st.markdown('<div class="machine-header-doc">📝 ROHRBUCH</div>', unsafe_allow_html=True)
     
@@ -564,6 +713,10 @@ def render_logbook(df_pipe: pd.DataFrame):
 
     st.markdown(f"<div class='project-tag'>📍 PROJEKT: {html.escape(proj_name)} (ID: {active_pid})</div>", unsafe_allow_html=True)
 
+    # Edit rejected by the optimistic locking (row changed in another session), shown once
+    conflict = st.session_state.pop('logbook_conflict', None)
+    if conflict: st.error(f"⚠️ {conflict}")
+
     bulk_ids = st.session_state.get('bulk_edit_ids', [])
     
     if not is_archived:
@@ -585,12 +738,16 @@ def render_logbook(df_pipe: pd.DataFrame):
                     submit_bulk = st.form_submit_button("🚀 Alle ändern", type="primary")
                 
                 if submit_bulk:
-                    DatabaseRepository.bulk_update(bulk_ids, target_field, new_value)
-                    st.toast(f"🚀 {len(bulk_ids)} Einträge aktualisiert!", icon="✅")
-                    time.sleep(0.5)
+                    ok, msg = DatabaseRepository.bulk_update(bulk_ids, target_field, new_value,
+                                                             versions=st.session_state.get('bulk_edit_versions'))
                     st.session_state.bulk_edit_ids = []
                     st.session_state.logbook_select_all = False
                     st.session_state.logbook_key_counter += 1
+                    if ok:
+                        st.toast(f"🚀 {len(bulk_ids)} Einträge aktualisiert!", icon="✅")
+                        time.sleep(0.5)
+                        st.rerun()
+                    st.session_state.logbook_conflict = msg
                     st.rerun()
                 
                 if st.button("Abbrechen (Auswahl aufheben)"):
@@ -660,12 +817,13 @@ def render_logbook(df_pipe: pd.DataFrame):
 
                 if submit_entry:
                     if st.session_state.editing_id:
-                        DatabaseRepository.update_full_entry(st.session_state.editing_id, {
+                        ok, msg = DatabaseRepository.update_full_entry(st.session_state.editing_id, {
                             "iso": iso_val, "naht": naht_val, "datum": dat_val.strftime("%d.%m.%Y"),
                             "dimension": final_dim_str, "bauteil": bt_val, "laenge": len_val,
                             "charge_apz": apz_val, "schweisser": sch_val
-                        })
-                        st.toast("✅ Eintrag aktualisiert!", icon="✏️")
+                        }, expected_version=st.session_state.get('bulk_edit_versions', {}).get(st.session_state.editing_id))
+                        if ok: st.toast("✅ Eintrag aktualisiert!", icon="✏️")
+                        else: st.session_state.logbook_conflict = msg
                         st.session_state.editing_id = None
                         st.session_state.bulk_edit_ids = []
                         st.session_state.logbook_select_all = False
@@ -694,14 +852,58 @@ def render_logbook(df_pipe: pd.DataFrame):
                         st.rerun()
 
     st.divider()
-    
-    df = DatabaseRepository.get_logbook_by_project(active_pid)
+
+    # Full-text search straight on the index, independent of filters and paging
+    search_q = st.text_input("🔍 Suche", key="lb_search", placeholder="ISO, Naht, Schweißer oder Charge, z.B. 4711 S12")
+    if search_q.strip():
+        hits = DatabaseRepository.search(active_pid, search_q, limit=50)
+        if hits.empty:
+            st.caption("Keine Treffer.")
+        else:
+            st.caption(f"{len(hits)} Treffer (beste zuerst)")
+            st.dataframe(hits[['iso', 'naht', 'datum', 'dimension', 'bauteil', 'schweisser', 'charge_apz', 'treffer']],
+                         hide_index=True, use_container_width=True,
+                         column_config={"iso": "ISO", "naht": "Naht", "datum": "Datum", "dimension": "DN", "bauteil": "Bauteil",
+                                        "schweisser": "Schweißer", "charge_apz": "APZ / Charge", "treffer": "Treffer"})
+
+    with st.expander("🔎 Filter & Seiten", expanded=False):
+        f1, f2, f3 = st.columns(3)
+        f_iso = f1.text_input("ISO enthält", key="lb_f_iso")
+        f_sch = f2.text_input("Schweißer enthält", key="lb_f_schweisser")
+        f_apz = f3.text_input("APZ/Charge enthält", key="lb_f_apz")
+        f4, f5, f6, f7 = st.columns(4)
+        dims = sorted(DatabaseRepository.get_known_values('dimension', active_pid, limit=200),
+                      key=lambda d: int(''.join(ch for ch in d if ch.isdigit()) or 0))
+        f_dim = f4.selectbox("Dimension", ["Alle"] + dims, key="lb_f_dim")
+        f_from = f5.date_input("Von", value=None, format="DD.MM.YYYY", key="lb_f_from")
+        f_to = f6.date_input("Bis", value=None, format="DD.MM.YYYY", key="lb_f_to")
+        page_size = f7.selectbox("Pro Seite", [50, 100, 250, 500], index=1, key="lb_page_size")
+
+    filters = {"iso": f_iso.strip(), "schweisser": f_sch.strip(), "charge_apz": f_apz.strip(),
+               "dimension": None if f_dim == "Alle" else f_dim, "date_from": f_from, "date_to": f_to}
+    filter_sig = repr((sorted(filters.items()), page_size))
+    if st.session_state.get('logbook_filter_sig') != filter_sig:
+        st.session_state.logbook_filter_sig = filter_sig
+        st.session_state.logbook_page = 0
+
+    # Only the visible page leaves the database
+    page = st.session_state.get('logbook_page', 0)
+    page_columns = LOGBOOK_COLUMNS + ['version']
+    df, total = DatabaseRepository.query_logbook(active_pid, filters, page_columns, limit=page_size, offset=page * page_size)
+    if df.empty and page > 0:
+        page = st.session_state.logbook_page = max(0, (total - 1) // page_size)
+        df, total = DatabaseRepository.query_logbook(active_pid, filters, page_columns, limit=page_size, offset=page * page_size)
+    n_pages = max(1, -(-total // page_size))
     
     if not df.empty:
         c_exp, c_sel_all, c_desel_all, _ = st.columns([1, 1, 1, 2])
         
         fname_base = f"Rohrbuch_{proj_name.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}"
-        c_exp.download_button("📥 Excel", Exporter.to_excel(df), f"{fname_base}.xlsx")
+        # Generated on click, streamed from the DB cursor into a write-only workbook
+        export_cols = [c for c in LOGBOOK_COLUMNS if c not in EXCEL_DROP_COLUMNS]
+        export_filters = dict(filters)
+        c_exp.download_button(f"📥 Excel ({total})", lambda: Exporter.to_excel_stream(
+            DatabaseRepository.iter_logbook(active_pid, export_filters, export_cols), export_cols), f"{fname_base}.xlsx")
         
         if c_sel_all.button("☑️ Alle auswählen"):
             st.session_state.logbook_select_all = True
@@ -715,20 +917,29 @@ def render_logbook(df_pipe: pd.DataFrame):
         
         st.markdown("### 📋 Einträge")
         
-        df_display = df.copy()
+        c_prev, c_info, c_next = st.columns([1, 3, 1])
+        if c_prev.button("◀ Zurück", disabled=page == 0, use_container_width=True):
+            st.session_state.logbook_page = page - 1
+            st.rerun()
+        c_info.caption(f"Seite {page + 1} / {n_pages} · {total} Einträge")
+        if c_next.button("Weiter ▶", disabled=page + 1 >= n_pages, use_container_width=True):
+            st.session_state.logbook_page = page + 1
+            st.rerun()
+        
         current_selection_state = st.session_state.get('logbook_select_all', False)
-        df_display.insert(0, "Auswahl", current_selection_state)
+        df.insert(0, "Auswahl", current_selection_state)
         
-        dynamic_key = f"logbook_editor_native_{st.session_state.get('logbook_key_counter', 0)}"
+        dynamic_key = f"logbook_editor_native_{st.session_state.get('logbook_key_counter', 0)}_{page}"
         
         edited_df = st.data_editor(
-            df_display,
+            df,
             hide_index=True,
             use_container_width=True,
             column_config={
                 "Auswahl": st.column_config.CheckboxColumn("☑️", width="small", default=current_selection_state),
                 "id": None, 
                 "project_id": None,
+                "version": None,
                 "✏️": None,
                 "Löschen": None,
                 "iso": st.column_config.TextColumn("ISO", width="medium"),
@@ -739,7 +950,7 @@ def render_logbook(df_pipe: pd.DataFrame):
                 "schweisser": st.column_config.TextColumn("Schweißer", width="small"),
                 "charge_apz": st.column_config.TextColumn("APZ/Charge", width="medium"),
             },
-            disabled=["iso", "naht", "datum", "dimension", "bauteil", "laenge", "charge", "charge_apz", "schweisser", "id", "project_id"],
+            disabled=["iso", "naht", "datum", "dimension", "bauteil", "laenge", "charge", "charge_apz", "schweisser", "id", "project_id", "version"],
             key=dynamic_key
         )
         
@@ -751,6 +962,8 @@ def render_logbook(df_pipe: pd.DataFrame):
         
         if current_bulk_set != new_bulk_set:
             st.session_state.bulk_edit_ids = selected_ids_list
+            # Versions as shown: the edits only apply if nobody changed the rows since
+            st.session_state.bulk_edit_versions = {int(i): int(v) for i, v in zip(selected_rows['id'], selected_rows['version'])}
             
             if len(selected_ids_list) == 1:
                 sel_row = selected_rows.iloc[0].to_dict()
@@ -771,28 +984,66 @@ def render_logbook(df_pipe: pd.DataFrame):
 
         if len(selected_ids_list) > 1:
              if st.button(f"🗑️ {len(selected_ids_list)} Einträge löschen", type="secondary"):
-                DatabaseRepository.delete_entries(selected_ids_list)
+                ok, msg = DatabaseRepository.delete_entries(selected_ids_list, versions=st.session_state.get('bulk_edit_versions'))
                 st.session_state.editing_id = None
                 st.session_state.bulk_edit_ids = []
                 st.session_state.logbook_select_all = False
                 st.session_state.logbook_key_counter += 1
-                st.toast(f"🗑️ {len(selected_ids_list)} Einträge gelöscht!")
-                time.sleep(0.5)
+                if ok:
+                    st.toast(f"🗑️ {len(selected_ids_list)} Einträge gelöscht!")
+                    time.sleep(0.5)
+                else:
+                    st.session_state.logbook_conflict = msg
                 st.rerun()
+    elif any(filters.values()):
+        st.info("Keine Einträge für die Filterauswahl.")
     else:
         st.info(f"Keine Einträge für Projekt '{proj_name}'.")
 
+    render_logbook_history(active_pid, proj_name)
+
+HISTORY_OPS = {"I": "Neu", "U": "Geändert", "D": "Gelöscht"}
+
+def render_logbook_history(active_pid: int, proj_name: str):
+    with st.expander("🕓 Änderungsprotokoll & Stand vom", expanded=False):
+        hist = DatabaseRepository.get_history(active_pid, limit=200)
+        if hist.empty:
+            st.caption("Noch keine Änderungen aufgezeichnet.")
+        else:
+            hist['ts'] = pd.to_datetime(hist['ts'], utc=True).dt.tz_convert(datetime.now().astimezone().tzinfo).dt.strftime("%d.%m.%Y %H:%M:%S")
+            hist['op'] = hist['op'].map(HISTORY_OPS)
+            hist['delta'] = hist['delta'].map(lambda d: ", ".join(f"{k}: {v}" for k, v in json.loads(d).items()) if isinstance(d, str) else "")
+            st.caption(f"Letzte {len(hist)} Änderungen")
+            st.dataframe(hist[['ts', 'user_name', 'op', 'entry_id', 'delta']], hide_index=True, use_container_width=True,
+                         column_config={"ts": "Zeit", "user_name": "Bearbeiter", "op": "Aktion", "entry_id": "Eintrag", "delta": "Neue Werte"})
+
+        st.markdown("**Rohrbuch zum Zeitpunkt**")
+        c_date, c_time = st.columns(2)
+        as_of_date = c_date.date_input("Datum", value=None, format="DD.MM.YYYY", key="lb_asof_date")
+        as_of_time = c_time.time_input("Uhrzeit", value=datetime.strptime("23:59", "%H:%M").time(), key="lb_asof_time")
+        if as_of_date is None: return
+        when = datetime.combine(as_of_date, as_of_time)
+        try:
+            df_asof = DatabaseRepository.logbook_as_of(active_pid, when)
+        except ValueError as e:
+            st.warning(str(e))
+            return
+        st.caption(f"{len(df_asof)} Einträge am {when:%d.%m.%Y %H:%M}")
+        fname = f"Rohrbuch_{proj_name.replace(' ', '_')}_Stand_{when:%Y%m%d_%H%M}.xlsx"
+        st.download_button("📥 Stand als Excel herunterladen", lambda: Exporter.to_excel(df_asof), fname,
+                           "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        st.dataframe(df_asof.drop(columns=['id', 'project_id']), hide_index=True, use_container_width=True)
+
 def render_tab_handbook(calc: PipeCalculator, dn: int, pn: str):
     st.markdown('<div class="machine-header-doc">📚 SMART DATA</div>', unsafe_allow_html=True)
-    row = calc.get_row(dn)
-    suffix = "_16" if pn == "PN 16" else "_10"
+    spec = calc.spec
     st.markdown(f"**DN {dn} / {pn}**")
 
-    od = float(row['D_Aussen'])
-    flange_b = float(row[f'Flansch_b{suffix}'])
-    lk = float(row[f'LK_k{suffix}'])
-    bolt = row[f'Schraube_M{suffix}']
-    n_holes = int(row[f'Lochzahl{suffix}'])
+    od = spec.od(dn)
+    flange_b = spec.flange_b(dn, pn)
+    lk = spec.bolt_circle(dn, pn)
+    bolt = spec.bolt_size(dn, pn)
+    n_holes = spec.bolt_holes(dn, pn)
     
     with st.container(border=True):
         st.markdown("##### 🏗️ Gewichte & Hydrotest")
@@ -823,8 +1074,7 @@ def render_tab_handbook(calc: PipeCalculator, dn: int, pn: str):
     with c_geo2:
         with st.container(border=True):
             st.markdown("##### 🔘 Dichtung (Check)")
-            d_innen = od - (2*wt_input) 
-            d_aussen = lk - (int(bolt.replace("M","")) * 1.5)
+            d_innen, d_aussen = spec.gasket(dn, pn, wt_input)
             st.info(f"ID: ~{d_innen:.0f} mm | AD: ~{d_aussen:.0f} mm | 2.0mm")
 
     st.divider()
@@ -869,13 +1119,15 @@ def render_closeout_tab(active_pid: int, proj_name: str, is_archived: int):
             st.session_state.project_archived = 0
             st.rerun()
             
-        df_log = DatabaseRepository.get_logbook_by_project(active_pid)
-        if not df_log.empty and PDF_AVAILABLE:
+        _, n_entries = DatabaseRepository.query_logbook(active_pid, columns=['id'], limit=1)
+        if n_entries and PDF_AVAILABLE:
             st.divider()
             st.markdown("#### Dokumentation (Abruf)")
-            meta_saved = st.session_state.get('last_handover_meta', {})
-            pdf_data = Exporter.to_pdf_final_report(df_log, proj_name, meta_saved)
-            st.download_button("📄 Fertigungsbescheinigung herunterladen", pdf_data, f"Fertigungsbescheinigung_{proj_name}.pdf", "application/pdf", type="primary")
+            meta_saved = dict(st.session_state.get('last_handover_meta', {}))
+            # Built on click, then served from the cache until the logbook changes
+            st.download_button("📄 Fertigungsbescheinigung herunterladen",
+                               lambda: Exporter.final_report(DatabaseRepository.get_logbook_by_project(active_pid), proj_name, meta_saved),
+                               f"Fertigungsbescheinigung_{proj_name}.pdf", "application/pdf", type="primary")
         return
 
     st.info("Erstellung der Fertigungsbescheinigung für die Abnahme.")
@@ -948,11 +1200,10 @@ def render_closeout_tab(active_pid: int, proj_name: str, is_archived: int):
 
     with col_pdf:
         if not df_log.empty and PDF_AVAILABLE:
-            pdf_data = Exporter.to_pdf_final_report(df_log, proj_name, meta_data)
             st.caption(f"Vorschau Daten: Ticket '{meta_data['order_no']}' | System '{meta_data['system_name']}'")
             st.download_button(
                 label="📄 PDF Bescheinigung herunterladen", 
-                data=pdf_data, 
+                data=lambda: Exporter.final_report(df_log, proj_name, meta_data), 
                 file_name=f"Fertigungsbescheinigung_{proj_name}.pdf", 
                 mime="application/pdf",
                 type="primary"
@@ -970,15 +1221,12 @@ def main():
     # Sidebar rendering (includes project Switching/Loading)
     render_sidebar_projects()
     
-    df_pipe = pd.DataFrame(columns=['DN'])
     try:
-        with open("data/pipe_dimensions.json", "r") as f:
-            data = json.load(f)
-            df_pipe = pd.DataFrame(data)
+        calc = load_calculator()
     except Exception as e:
         st.error(f"Fehler beim Laden der Rohrdaten: {e}")
-
-    calc = PipeCalculator(df_pipe)
+        calc = PipeCalculator(pd.DataFrame(columns=['DN']))
+    df_pipe = calc.spec.frame()
     
     # Sidebar Settings
     with st.sidebar.expander("⚙️ Einstellungen", expanded=False):
@@ -986,7 +1234,7 @@ def main():
         pn = st.selectbox("Druckklasse", ["PN 6", "PN 10", "PN 16", "PN 25", "PN 40"], index=2, key="global_pn")
 
     # Main Navigation
-    tabs = ["🪚 Smarte Säge", "📐 Geometrie", "📝 Rohrbuch", "📦 Material", "📚 Smart Data", "🏁 Handover"]
+    tabs = ["🪚 Smarte Säge", "📐 Geometrie", "📝 Rohrbuch", "📦 Material", "🔎 Rückverfolgung", "📚 Smart Data", "🏁 Handover"]
     
     if st.session_state.active_tab not in tabs:
         st.session_state.active_tab = tabs[0]
@@ -1005,11 +1253,34 @@ def main():
         render_logbook(df_pipe)
     elif st.session_state.active_tab == "📦 Material":
         render_mto_tab(st.session_state.active_project_id, st.session_state.active_project_name)
+    elif st.session_state.active_tab == "🔎 Rückverfolgung":
+        render_trace_tab()
     elif st.session_state.active_tab == "📚 Smart Data":
         render_tab_handbook(calc, dn, pn)
     elif st.session_state.active_tab == "🏁 Handover":
         render_closeout_tab(st.session_state.active_project_id, st.session_state.active_project_name, st.session_state.project_archived)
 
+    # Auto-save Workspace at the end of interaction (only the changes)
+    try:
+        autosave_workspace(st.session_state.active_project_id)
+    except Exception as e:
+        logger.error(f"Auto-save failed: {e}")
+
+def render_template_download(profile: dict, title: str, key: str):
+    """1:1 wrap template, generated only on request (large DNs give many pages)."""
+    c_fmt, c_paper, c_btn = st.columns([1, 1, 2])
+    fmt = c_fmt.radio("Format", ["PDF", "SVG (ZIP)"], horizontal=True, key=f"{key}_fmt")
+    paper = c_paper.radio("Papier", ["A4", "A3"], horizontal=True, key=f"{key}_paper")
+    sig = (title, fmt, paper, len(profile["angle"]), float(profile["depth"].sum()))
+    if c_btn.button("🖨️ Schablone 1:1 erzeugen", key=f"{key}_btn"):
+        ext = "pdf" if fmt == "PDF" else "svg"
+        st.session_state[f"{key}_file"] = (sig, Exporter.to_wrap_template(profile, title, ext, paper))
+    cached = st.session_state.get(f"{key}_file")
+    if cached and cached[0] == sig:
+        is_pdf = fmt == "PDF"
+        c_btn.download_button("📥 Schablone herunterladen", cached[1], f"{title.replace(' ', '_')}.{'pdf' if is_pdf else 'zip'}",
+                              "application/pdf" if is_pdf else "application/zip", key=f"{key}_dl")
+
 def render_geometry_tools(calc: PipeCalculator, df: pd.DataFrame):
     st.markdown('<div class="machine-header-geo">📐 GEOMETRIE & BERECHNUNG</div>', unsafe_allow_html=True)
     geo_tabs = st.tabs(["2D Etage (S-Schlag)", "3D Raum-Etage (Rolling)", "Bogen (Standard)", "🦞 Segment-Bogen", "Stutzen", "📐 Spalt-Ausgleich"])
@@ -1137,19 +1408,31 @@ def render_geometry_tools(calc: PipeCalculator, df: pd.DataFrame):
         res_seg = calc.calculate_segment_bend(dn, r_seg, int(n_seg))
         if "error" not in res_seg:
             st.write(res_seg)
-            st.image("https://upload.wikimedia.org/wikipedia/commons/thumb/8/87/Segmentkruezmer.svg/1200px-Segmentkruezmer.svg.png", width=200) # Placeholder
+            # Same inputs on the next rerun -> PNG from the figure cache, no matplotlib work
+            st.image(Visualizer.render_png("plot_segment_schematic", res_seg['mid_back'], res_seg['mid_belly'], res_seg['od'], res_seg['miter_angle']))
         else:
             st.error(res_seg["error"])
 
     with geo_tabs[4]:
         st.markdown("##### Stutzen auf Hauptrohr")
-        dnh = st.selectbox("Hauptrohr DN", df['DN'], index=6, key="st_dn1")
-        dns = st.selectbox("Stutzen DN", df['DN'], index=4, key="st_dn2")
+        cst1, cst2 = st.columns(2)
+        dnh = cst1.selectbox("Hauptrohr DN", df['DN'], index=6, key="st_dn1")
+        dns = cst2.selectbox("Stutzen DN", df['DN'], index=4, key="st_dn2")
+        cst3, cst4, cst5 = st.columns(3)
+        st_step = cst3.selectbox("Auflösung (°)", [22.5, 10.0, 5.0, 1.0, 0.1], key="st_step")
+        st_off = cst4.number_input("Versatz (mm)", value=0.0, step=5.0, key="st_offset", help="Seitlicher Versatz der Stutzenachse")
+        st_ang = cst5.number_input("Abzweigwinkel (°)", value=90.0, min_value=15.0, max_value=165.0, step=5.0, key="st_angle")
         
         try:
-            df_stutzen = calc.calculate_stutzen_coords(dnh, dns)
+            df_stutzen = calc.calculate_stutzen_coords(dnh, dns, st_step, st_off, st_ang)
             st.dataframe(df_stutzen, hide_index=True)
+            r_main, r_stub = calc.spec.od(dnh) / 2, calc.spec.od(dns) / 2
+            st.image(Visualizer.render_png("plot_stutzen", r_main, r_stub, min(st_step, 1.0), st_off, st_ang), use_container_width=True)
             st.caption("Zeigt die Ausschnitte (Tiefe) für das Anpassen des Stutzens.")
+            st.download_button("📥 Schablone (CSV)", df_stutzen.to_csv(index=False, sep=";").encode("utf-8"),
+                               f"Stutzen_DN{dns}_auf_DN{dnh}.csv", "text/csv", key="dl_stutzen_csv")
+            render_template_download(calc.calculate_saddle_profile(dnh, dns, 0.5, st_off, st_ang),
+                                     f"Stutzen DN {dns} auf DN {dnh}", "tpl_stutzen")
         except ValueError as e:
             st.error(str(e))
             
@@ -1205,6 +1488,8 @@ def render_geometry_tools(calc: PipeCalculator, df: pd.DataFrame):
                     )
                     
                     st.caption("ℹ️ 'Maßband' ist der Weg am Umfang ab 12 Uhr. 'Abtrag' ist das Maß, das weg muss.")
+                    render_template_download(calc.calculate_wedge_profile(dn_sel, {'12': g12, '3': g3, '6': g6, '9': g9}, 0.5),
+                                             f"Keilspalt DN {dn_sel}", "tpl_wedge")
 
                     with st.expander("📝 Anleitung: So überträgst du das Maß", expanded=False):
                         st.markdown("""
@@ -1215,14 +1500,5 @@ def render_geometry_tools(calc: PipeCalculator, df: pd.DataFrame):
                         5.  **Schneiden:** Diese Linie ist dein Schnitt.
                         """)
 
-    # Auto-save Workspace at the end of interaction
-    if st.session_state.active_project_id:
-        try:
-            current_state = serialize_state()
-            DatabaseRepository.save_workspace(st.session_state.active_project_id, current_state)
-        except Exception as e:
-            # logger.error(f"Auto-save failed: {e}")
-            pass
-
 if __name__ == "__main__":
     main()
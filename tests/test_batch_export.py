@@ -0,0 +1,73 @@
+import unittest
+import tempfile
+import subprocess
+import json
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import database, batch_export
+from modules.database import DatabaseRepository
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class TestBatchExport(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self._old_db = database.DB_NAME
+        database.DB_NAME = os.path.join(self.tmp.name, "test.db")
+        DatabaseRepository.init_db()
+        for name in ("Halle 1", "Halle 2", "Offen"):
+            DatabaseRepository.create_project(name)
+        for pid in (2, 3, 4):
+            DatabaseRepository.add_entries([{"iso": f"ISO-{i}", "naht": str(i), "datum": "01.01.2026", "dimension": "DN 100", "bauteil": "Rohrstoß",
+                                             "laenge": 100.0, "charge": "", "charge_apz": "A1", "schweisser": "S1", "project_id": pid}
+                                            for i in range(10)])
+        DatabaseRepository.toggle_archive_project(2, True)
+        DatabaseRepository.toggle_archive_project(3, True)
+
+    def tearDown(self):
+        database.close_pools()
+        database.DB_NAME = self._old_db
+        self.tmp.cleanup()
+
+    def test_exports_archived_projects_in_parallel(self):
+        out = os.path.join(self.tmp.name, "out")
+        lines = []
+        results = batch_export.run_batch(batch_export.select_projects(), out, workers=2, log=lines.append)
+        self.assertEqual([r["name"] for r in results], ["Halle 1", "Halle 2"])
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(all(not r["errors"] for r in results))
+        files = sorted(os.listdir(out))
+        self.assertIn("Rohrbuch_Halle_1.xlsx", files)
+        self.assertIn("Backup_Halle_2.json", files)
+        if batch_export.PDF_AVAILABLE:
+            self.assertIn("Fertigungsbescheinigung_Halle_1.pdf", files)
+        with open(os.path.join(out, "Backup_Halle_1.json"), encoding="utf-8") as f:
+            self.assertEqual(len(json.load(f)["entries"]), 10)
+        self.assertIn("Halle 2", batch_export.format_summary(results, batch_export.FORMATS))
+
+    def test_skipped_pdf_is_reported_without_timing(self):
+        DatabaseRepository.create_project("Leer")
+        project = next(p for p in DatabaseRepository.get_projects() if p[1] == "Leer")
+        res = batch_export.export_project(project, self.tmp.name, ["pdf", "json"])
+        self.assertIn("pdf", res["skipped"])
+        self.assertNotIn("pdf", res["timings"])
+        self.assertEqual(res["errors"], {})
+        self.assertIn("übersp.", batch_export.format_summary([res], ["pdf", "json"]))
+
+    def test_cli_does_not_import_streamlit(self):
+        database.close_pools()
+        out = os.path.join(self.tmp.name, "cli")
+        code = ("import sys, runpy; sys.argv = ['batch_export', '4', '--formats', 'json', '--workers', '1', '--out', sys.argv[1], '--db', sys.argv[2]]\n"
+                "try: runpy.run_module('modules.batch_export', run_name='__main__')\n"
+                "except SystemExit as e: assert e.code == 0, e.code\n"
+                "assert 'streamlit' not in sys.modules")
+        proc = subprocess.run([sys.executable, "-c", code, out, database.DB_NAME], cwd=ROOT, capture_output=True, text=True)
+        self.assertEqual(proc.returncode, 0, proc.stderr)
+        self.assertEqual(os.listdir(out), ["Backup_Offen.json"])
+
+if __name__ == '__main__':
+    unittest.main()
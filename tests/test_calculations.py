@@ -1,13 +1,17 @@
 import unittest
+import numpy as np
 import pandas as pd
 import math
 import sys
 import os
+import shutil
+import tempfile
 
 # Add parent directory to path to import modules
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from modules.calculations import PipeCalculator
+from modules.calculations import PipeCalculator, MaterialManager, get_calculator, saddle_profile
+from modules.specs import PipeSpecTable, STANDARD_ANGLES, load_spec
 
 class TestPipeCalculator(unittest.TestCase):
     def setUp(self):
@@ -58,5 +62,142 @@ class TestPipeCalculator(unittest.TestCase):
         res = self.calc.calculate_2d_offset(100, 500, 0)
         self.assertIn("error", res)
 
+    def test_unknown_dn_raises(self):
+        # Unknown DN must not silently fall back to the first row
+        with self.assertRaises(KeyError):
+            self.calc.get_deduction("Bogen 90° (BA3)", 999, "PN 16")
+
+class TestPipeSpecTable(unittest.TestCase):
+    def setUp(self):
+        self.data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'pipe_dimensions.json')
+        self.spec = PipeSpecTable.from_json(self.data_path)
+        self.df = pd.read_json(self.data_path)
+
+    def test_lookup_matches_dataframe(self):
+        for dn in self.df['DN']:
+            row = self.df[self.df['DN'] == dn].iloc[0]
+            self.assertEqual(self.spec.od(dn), float(row['D_Aussen']))
+            self.assertEqual(self.spec.flange_b(dn, "PN 16"), float(row['Flansch_b_16']))
+            self.assertEqual(self.spec.bolt_size(dn, "PN 10"), row['Schraube_M_10'])
+
+    def test_columns_are_read_only(self):
+        with self.assertRaises(ValueError):
+            self.spec.column('D_Aussen')[0] = 1.0
+
+    def test_compiled_tables_match_direct_values(self):
+        compiled = PipeSpecTable.from_json(self.data_path).compile()
+        for dn in self.df['DN']:
+            for angle in STANDARD_ANGLES + (37.0,):
+                self.assertEqual(compiled.vorbau(dn, angle), self.spec.vorbau(dn, angle))
+            for pn in PipeSpecTable.PN_MAP:
+                self.assertEqual(compiled.flange_deduction(dn, pn), self.spec.flange_b(dn, pn))
+                self.assertEqual(compiled.gasket(dn, pn, 3.0), self.spec.gasket(dn, pn, 3.0))
+        pd.testing.assert_frame_equal(compiled.frame(), self.df)
+
+    def test_validation_rejects_bad_table(self):
+        data = self.df.to_dict(orient='list')
+        data['Radius_BA3'][0] = -1
+        with self.assertRaises(ValueError):
+            PipeSpecTable(data).compile()
+        del data['Radius_BA3']
+        with self.assertRaises(ValueError):
+            PipeSpecTable(data).compile()
+
+    def test_registry_reloads_on_mtime_change(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'pipes.json')
+            shutil.copy(self.data_path, path)
+            calc = get_calculator(path)
+            self.assertIs(load_spec(path), calc.spec)
+            self.assertIs(get_calculator(path), calc)
+            st = os.stat(path)
+            os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+            reloaded = get_calculator(path)
+            self.assertIsNot(reloaded, calc)
+            self.assertEqual(reloaded.spec.od(100), calc.spec.od(100))
+
+class TestSaddleProfile(unittest.TestCase):
+    def setUp(self):
+        data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'pipe_dimensions.json')
+        self.calc = PipeCalculator(pd.read_json(data_path))
+
+    def test_table_matches_classic_formula(self):
+        df = self.calc.calculate_stutzen_coords(200, 100)
+        r_main, r_stub = self.calc.spec.od(200) / 2, self.calc.spec.od(100) / 2
+        angles = [0, 22.5, 45, 67.5, 90, 112.5, 135, 157.5, 180]
+        self.assertEqual(df['Winkel'].tolist(), [f"{a}°".replace(".0°", "°") for a in angles])
+        expected = [round(r_main - math.sqrt(r_main**2 - (r_stub * math.sin(math.radians(a)))**2), 1) for a in angles]
+        self.assertEqual(df['Tiefe (mm)'].tolist(), expected)
+
+    def test_resolution(self):
+        prof = saddle_profile(100.0, 50.0, step=0.1)
+        self.assertEqual(len(prof['angle']), 3601)
+        self.assertEqual(prof['angle'][-1], 360.0)
+        self.assertEqual(saddle_profile(100.0, 50.0, step=7)['angle'][-1], 360.0)
+
+    def test_offset_and_angled_branch_lie_on_main_pipe(self):
+        r_main, r_stub, offset, beta = 100.0, 40.0, 25.0, 60.0
+        prof = saddle_profile(r_main, r_stub, step=1.0, offset=offset, branch_angle=beta)
+        self.assertAlmostEqual(prof['depth'].min(), 0.0)
+        # Rebuild the cut points in 3D: branch axis in the x-z plane at beta to the main (x) axis
+        b = math.radians(beta)
+        theta = np.radians(prof['angle'])
+        t = np.sqrt(r_main**2 - (offset + r_stub * np.sin(theta))**2)
+        t = (t + r_stub * np.cos(theta) * math.cos(b)) / math.sin(b)
+        np.testing.assert_allclose(t.max() - t, prof['depth'], atol=1e-9)
+        along = t.max() - prof['depth']
+        y = offset + r_stub * np.sin(theta)
+        z = along * math.sin(b) - r_stub * np.cos(theta) * math.cos(b)
+        np.testing.assert_allclose(y**2 + z**2, r_main**2, rtol=1e-12)
+
+    def test_invalid_geometry(self):
+        with self.assertRaises(ValueError): saddle_profile(50.0, 60.0)
+        with self.assertRaises(ValueError): saddle_profile(100.0, 60.0, offset=50.0)
+        with self.assertRaises(ValueError): saddle_profile(100.0, 60.0, branch_angle=0)
+
+class TestMaterialManager(unittest.TestCase):
+    def test_parse_dn(self):
+        self.assertEqual([MaterialManager.parse_dn(d) for d in ["DN 100", "100", "Ø 2 Zoll", "", None, "xyz"]], [100, 100, 2, 0, 0, 0])
+
+    def test_generate_mto(self):
+        df = pd.DataFrame({"dimension": ["DN 100", "100", "DN 50", "DN 100", None, "DN 50"],
+                           "bauteil": ["Rohrstoß", "Rohrstoß", "Bogen 90°", "Bogen 90°", "Flansch", None],
+                           "laenge": [1500.0, 500.0, 0.0, None, 0.0, 800.0]})
+        mto = MaterialManager.generate_mto(df)
+        self.assertEqual(mto.values.tolist(), [["DN 0", "Flansch", 1.0, "Stk"], ["DN 100", "Bogen 90°", 1.0, "Stk"],
+                                               ["DN 100", "Rohrstoß", 2.0, "m"], ["DN 50", "Bogen 90°", 1.0, "Stk"]])
+
+class TestPipeCalculatorBatch(unittest.TestCase):
+    def setUp(self):
+        data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'pipe_dimensions.json')
+        self.calc = PipeCalculator(pd.read_json(data_path))
+        self.dns = [25, 100, 300, 1600]
+
+    def assert_matches_scalar(self, batch, scalar_results):
+        for i, res in enumerate(scalar_results):
+            if "error" in res:
+                self.assertTrue(batch['error'].iloc[i])
+                continue
+            self.assertFalse(batch['error'].iloc[i])
+            for key, val in res.items():
+                np.testing.assert_allclose(batch[key].iloc[i], val, rtol=1e-13, atol=1e-12, err_msg=key)
+
+    def test_bend_details_batch(self):
+        inputs = pd.DataFrame([(dn, a) for dn in self.dns for a in [0, 22.5, 45, 90, 135]], columns=['dn', 'angle'])
+        batch = self.calc.calculate_bend_details_batch(inputs)
+        self.assert_matches_scalar(batch, [self.calc.calculate_bend_details(r.dn, r.angle) for r in inputs.itertuples()])
+
+    def test_2d_offset_batch_error_mask(self):
+        dns = np.array([100, 100, 999])
+        batch = self.calc.calculate_2d_offset_batch(dns, offset=500, angle=np.array([45, 0, 45]))
+        self.assertEqual(batch['error'].tolist(), [False, True, True])
+        self.assert_matches_scalar(batch.iloc[:2], [self.calc.calculate_2d_offset(100, 500, 45), self.calc.calculate_2d_offset(100, 500, 0)])
+
+    def test_segment_and_rolling_batch(self):
+        seg = self.calc.calculate_segment_bend_batch(self.dns, radius=1000.0, num_segments=[1, 2, 3, 5])
+        self.assert_matches_scalar(seg, [self.calc.calculate_segment_bend(dn, 1000.0, n) for dn, n in zip(self.dns, [1, 2, 3, 5])])
+        roll = self.calc.calculate_rolling_offset_batch(100, roll=[400, 0, 77.7], set_val=[300, 0, 10], height=[0, 0, 250.5])
+        self.assert_matches_scalar(roll, [self.calc.calculate_rolling_offset(100, r, s, h) for r, s, h in [(400, 300, 0), (0, 0, 0), (77.7, 10, 250.5)]])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,477 @@
+import unittest
+import tempfile
+import threading
+import sqlite3
+import sys
+import os
+import random
+import time
+import pandas as pd
+from datetime import date, datetime
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules import database
+from modules.database import DatabaseRepository, LOGBOOK_COLUMNS
+from modules.calculations import MaterialManager
+from modules.migrations import MIGRATIONS, schema_version, ensure_fts
+
+class TestDatabaseRepository(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self._old_db = database.DB_NAME
+        database.DB_NAME = os.path.join(self.tmp.name, "test.db")
+        DatabaseRepository.init_db()
+
+    def tearDown(self):
+        database.close_pools()
+        database.DB_NAME = self._old_db
+        self.tmp.cleanup()
+
+    def test_remnant_store_roundtrip(self):
+        DatabaseRepository.apply_remnant_changes(1, "DN 100", [], [1200.0, 800.0])
+        rows = DatabaseRepository.get_remnants(1, "DN 100")
+        self.assertEqual([r[2] for r in rows], [1200.0, 800.0])
+        DatabaseRepository.apply_remnant_changes(1, "DN 100", [rows[0][0]], [350.0])
+        self.assertEqual([r[2] for r in DatabaseRepository.get_remnants(1, "DN 100")], [800.0, 350.0])
+        self.assertEqual(DatabaseRepository.get_remnants(1, "DN 50"), [])
+        # A remnant already used by another plan (or of another DN) aborts the booking
+        stale = DatabaseRepository.get_remnants(1, "DN 100")[0][0]
+        self.assertTrue(DatabaseRepository.apply_remnant_changes(1, "DN 100", [stale], [])[0])
+        self.assertFalse(DatabaseRepository.apply_remnant_changes(1, "DN 100", [stale], [400.0])[0])
+        self.assertFalse(DatabaseRepository.apply_remnant_changes(1, "DN 50", [DatabaseRepository.get_remnants(1, "DN 100")[0][0]], [])[0])
+        self.assertEqual([r[2] for r in DatabaseRepository.get_remnants(1, "DN 100")], [350.0])
+
+    def test_pool_uses_wal_and_reuses_connections(self):
+        with database.connection() as conn:
+            self.assertEqual(conn.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+            first = conn
+        with database.connection() as conn:
+            self.assertIs(conn, first)
+
+    def test_concurrent_writers(self):
+        def writer(n):
+            for i in range(50):
+                DatabaseRepository.add_entry({"iso": f"T{n}", "naht": str(i), "datum": "", "dimension": "DN 100", "bauteil": "Rohrstoß",
+                                              "laenge": 100.0, "charge": "", "charge_apz": "", "schweisser": "", "project_id": 1})
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(8)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        self.assertEqual(len(DatabaseRepository.get_logbook_by_project(1)), 400)
+
+    def test_add_entries_is_atomic(self):
+        row = {"iso": "A", "naht": "", "datum": "", "dimension": "DN 100", "bauteil": "Rohrstoß",
+               "laenge": 100.0, "charge": "", "charge_apz": "", "schweisser": "", "project_id": 1}
+        self.assertEqual(DatabaseRepository.add_entries([row, dict(row, iso="B", project_id=None)]), 2)
+        self.assertEqual(sorted(DatabaseRepository.get_logbook_by_project(1)['iso']), ["A", "B"])
+        broken = dict(row, iso="C")
+        del broken['laenge']
+        with self.assertRaises(sqlite3.ProgrammingError):
+            DatabaseRepository.add_entries([dict(row, iso="C"), broken])
+        self.assertEqual(len(DatabaseRepository.get_logbook_by_project(1)), 2)
+
+    def test_json_import_roundtrip(self):
+        row = {"iso": "A", "naht": "1", "datum": "01.01.2026", "dimension": "DN 100", "bauteil": "Rohrstoß",
+               "laenge": 100.0, "charge": "", "charge_apz": "X", "schweisser": "S1", "project_id": 1}
+        DatabaseRepository.add_entries([dict(row, naht=str(i)) for i in range(20)])
+        ok, _ = DatabaseRepository.import_project_from_json(DatabaseRepository.export_project_to_json(1))
+        self.assertTrue(ok)
+        new_pid = DatabaseRepository.get_projects()[-1][0]
+        self.assertEqual(len(DatabaseRepository.get_logbook_by_project(new_pid)), 20)
+
+    def test_query_logbook_pages_and_filters(self):
+        DatabaseRepository.add_entries([{"iso": f"ISO-{i % 3}", "naht": str(i), "datum": f"{1 + i % 28:02d}.{1 + i % 12:02d}.2026",
+                                         "dimension": "DN 100" if i % 2 else "DN 50", "bauteil": "Rohrstoß", "laenge": 100.0,
+                                         "charge": "", "charge_apz": f"APZ-{i % 4}", "schweisser": f"S{i % 5}", "project_id": 1}
+                                        for i in range(250)])
+        page, total = DatabaseRepository.query_logbook(1, limit=100, offset=200)
+        self.assertEqual((len(page), total), (50, 250))
+        self.assertEqual(page['id'].tolist(), sorted(page['id'], reverse=True))
+        # Keyset paging gives the same pages as offset paging
+        first, _ = DatabaseRepository.query_logbook(1, limit=100)
+        second, _ = DatabaseRepository.query_logbook(1, limit=100, after_id=int(first['id'].iloc[-1]))
+        self.assertEqual(second['id'].tolist(), DatabaseRepository.query_logbook(1, limit=100, offset=100)[0]['id'].tolist())
+
+        page, total = DatabaseRepository.query_logbook(1, {"iso": "iso-1", "dimension": "DN 100"}, columns=["iso", "dimension"], limit=None)
+        self.assertEqual(list(page.columns), ["id", "iso", "dimension"])
+        full = DatabaseRepository.get_logbook_by_project(1)
+        expected = full[(full['iso'] == "ISO-1") & (full['dimension'] == "DN 100")]
+        self.assertEqual((len(page), total), (len(expected), len(expected)))
+        # Dimensions stored without the "DN " prefix are found by the value the filter lists
+        DatabaseRepository.add_entries([{"iso": "X", "naht": "", "datum": "", "dimension": dim, "bauteil": "Rohrstoß", "laenge": 1.0,
+                                         "charge": "", "charge_apz": "", "schweisser": "", "project_id": 1} for dim in ("100", "dn100")])
+        for dim in ("100", "dn100"):
+            self.assertIn(dim, DatabaseRepository.get_known_values('dimension', 1))
+            self.assertEqual(DatabaseRepository.query_logbook(1, {"dimension": dim}, ['dimension'])[0]['dimension'].tolist(), [dim])
+        # LIKE wildcards in the filter text are matched literally
+        self.assertEqual(DatabaseRepository.query_logbook(1, {"iso": "ISO_1"})[1], 0)
+        self.assertEqual(DatabaseRepository.query_logbook(1, {"charge_apz": "%"})[1], 0)
+        self.assertEqual(DatabaseRepository.query_logbook(1, {"charge_apz": "z-3"})[1], len(full[full['charge_apz'] == "APZ-3"]))
+
+        _, total = DatabaseRepository.query_logbook(1, {"date_from": date(2026, 3, 1), "date_to": date(2026, 3, 31)})
+        dates = pd.to_datetime(full['datum'], format="%d.%m.%Y")
+        self.assertEqual(total, int(((dates >= "2026-03-01") & (dates <= "2026-03-31")).sum()))
+
+    def test_iter_logbook_streams_filtered_rows(self):
+        DatabaseRepository.add_entries([{"iso": f"ISO-{i % 3}", "naht": str(i), "datum": "", "dimension": "DN 100", "bauteil": "Rohrstoß",
+                                         "laenge": float(i), "charge": "", "charge_apz": "", "schweisser": "", "project_id": 1}
+                                        for i in range(50)])
+        rows = list(DatabaseRepository.iter_logbook(1, {"iso": "iso-2"}, ["naht", "laenge"], chunk_size=7))
+        page, _ = DatabaseRepository.query_logbook(1, {"iso": "iso-2"}, columns=["naht", "laenge"], limit=None)
+        self.assertEqual(rows, list(page[["naht", "laenge"]].itertuples(index=False, name=None)))
+
+    def test_sql_mto_matches_pandas(self):
+        DatabaseRepository.add_entries([{"iso": "A", "naht": str(i), "datum": "", "dimension": ["DN 100", "100", "DN 50", None][i % 4],
+                                         "bauteil": ["Rohrstoß", "Bogen 90°", "Passstück", None, "Flansch"][i % 5],
+                                         "laenge": [1234.5, 0.1, None][i % 3], "charge": "", "charge_apz": "", "schweisser": "", "project_id": 1}
+                                        for i in range(300)])
+        by_pandas = MaterialManager.generate_mto(DatabaseRepository.get_logbook_by_project(1))
+        by_sql = MaterialManager.mto_from_groups(DatabaseRepository.get_mto_groups(1))
+        pd.testing.assert_frame_equal(by_sql, by_pandas)
+        self.assertTrue(MaterialManager.mto_from_groups(DatabaseRepository.get_mto_groups(2)).empty)
+
+    def test_mto_summary_follows_logbook_writes(self):
+        row = lambda i: {"iso": "A", "naht": str(i), "datum": "", "dimension": ["DN 100", "DN 50", None][i % 3],
+                         "bauteil": ["Rohrstoß", "Bogen 90°", None][i % 3 if i % 7 else 2], "laenge": [1000.0, 0.0, None][i % 3],
+                         "charge": "", "charge_apz": "", "schweisser": "", "project_id": 1}
+        DatabaseRepository.add_entries([row(i) for i in range(60)])
+        DatabaseRepository.add_entry(dict(row(1), project_id=2))
+        ids = DatabaseRepository.get_logbook_by_project(1)['id'].tolist()
+        DatabaseRepository.update_full_entry(ids[0], dict(row(1), dimension="100", bauteil="Rohrstoß", laenge=250.5))
+        DatabaseRepository.delete_entries(ids[5:20])
+        DatabaseRepository.bulk_update(ids[20:30], "Schweißer", "S9")
+        with database.connection() as conn:
+            conn.execute("UPDATE rohrbuch SET project_id = 2 WHERE id IN (?, ?)", ids[30:32])
+        self.assertEqual(DatabaseRepository.check_mto_summary(repair=False), 0)
+        by_table = MaterialManager.mto_from_groups(DatabaseRepository.get_mto_groups(1))
+        pd.testing.assert_frame_equal(by_table, MaterialManager.generate_mto(DatabaseRepository.get_logbook_by_project(1)))
+        # Drift (e.g. rows written with the triggers dropped) is found and rebuilt
+        with database.connection() as conn:
+            conn.execute("UPDATE mto_summary SET anzahl = anzahl + 1 WHERE project_id = 1")
+            conn.execute("DELETE FROM mto_summary WHERE project_id = 2")
+        self.assertGreater(DatabaseRepository.check_mto_summary(1), 0)
+        self.assertEqual(DatabaseRepository.check_mto_summary(1, repair=False), 0)
+        self.assertGreater(DatabaseRepository.check_mto_summary(), 0)
+        self.assertEqual(DatabaseRepository.check_mto_summary(repair=False), 0)
+
+    def test_autocomplete_index_tracks_writes(self):
+        rnd = random.Random(7)
+        row = lambda pid: {"iso": f"ISO-{rnd.randint(0, 30)}", "naht": "", "datum": "", "dimension": f"DN {rnd.choice([50, 100])}",
+                           "bauteil": "Rohrstoß", "laenge": 1.0, "charge": "", "charge_apz": rnd.choice(["", "APZ-1", "apz-2"]),
+                           "schweisser": f"S{rnd.randint(0, 9)}", "project_id": pid}
+        DatabaseRepository.add_entries([row(1) for _ in range(200)] + [row(2) for _ in range(50)])
+        def from_sql(col, pid):
+            with database.connection() as conn:
+                return [r[0] for r in conn.execute(f"SELECT {col} FROM rohrbuch WHERE project_id = ? AND {col} IS NOT NULL AND {col} != '' "
+                                                   f"GROUP BY {col} ORDER BY MAX(id) DESC", (pid,))]
+        self.assertEqual(DatabaseRepository.get_known_values('iso', 1, limit=100), from_sql('iso', 1))  # builds the index
+        for step in range(40):
+            ids = DatabaseRepository.query_logbook(1, columns=['id'], limit=None)[0]['id'].tolist()
+            pick = rnd.sample(ids, 3)
+            action = step % 4
+            if action == 0: DatabaseRepository.add_entries([row(1), row(1)])
+            elif action == 1: DatabaseRepository.delete_entries(pick)
+            elif action == 2: DatabaseRepository.bulk_update(pick, "Schweißer", f"S{rnd.randint(0, 12)}")
+            else: DatabaseRepository.update_full_entry(pick[0], dict(row(1), iso=f"ISO-{rnd.randint(0, 40)}"))
+            for col in ('iso', 'schweisser', 'charge_apz', 'dimension'):
+                self.assertEqual(DatabaseRepository.get_known_values(col, 1, limit=100), from_sql(col, 1), (step, col))
+        self.assertEqual(DatabaseRepository.get_known_values('charge_apz', 1, prefix="APZ"), from_sql('charge_apz', 1))
+        self.assertEqual(DatabaseRepository.get_known_values('iso', 1, prefix="iso-3", limit=100),
+                         [v for v in from_sql('iso', 1) if v.startswith("ISO-3")])
+        self.assertEqual(DatabaseRepository.get_known_values('schweisser', 2, limit=100), from_sql('schweisser', 2))
+        with database.connection() as conn:
+            by_count = [r[0] for r in conn.execute("SELECT schweisser FROM rohrbuch WHERE project_id = 1 GROUP BY schweisser "
+                                                   "ORDER BY COUNT(*) DESC, MAX(id) DESC")]
+        self.assertEqual(DatabaseRepository.get_known_values('schweisser', 1, order="frequent"), by_count)
+        self.assertEqual(DatabaseRepository.get_known_values('naht', 1), [])
+
+    def test_autocomplete_index_takes_non_text_values(self):
+        row = {"iso": "ISO-1", "naht": "", "datum": "", "dimension": "DN 100", "bauteil": "Rohrstoß", "laenge": 1.0,
+               "charge": None, "charge_apz": "", "schweisser": "S1", "project_id": 1}
+        DatabaseRepository.add_entries([row])
+        self.assertEqual(DatabaseRepository.get_known_values('iso', 1), ["ISO-1"])  # builds the index
+        DatabaseRepository.add_entries([dict(row, iso=4711)])  # e.g. from a JSON import
+        self.assertEqual(DatabaseRepository.get_known_values('iso', 1), ["4711", "ISO-1"])
+        self.assertEqual(DatabaseRepository.get_known_values('iso', 1, prefix="47"), ["4711"])
+        entry = int(DatabaseRepository.query_logbook(1, {"iso": "4711"}, ['id'])[0]['id'].iloc[0])
+        DatabaseRepository.delete_entries([entry])
+        self.assertEqual(DatabaseRepository.get_known_values('iso', 1), ["ISO-1"])
+
+    def test_autocomplete_index_under_concurrent_writes(self):
+        DatabaseRepository.add_entries([{"iso": f"ISO-{i}", "naht": "", "datum": "", "dimension": "DN 100", "bauteil": "Rohrstoß", "laenge": 1.0,
+                                         "charge": "", "charge_apz": "", "schweisser": "S0", "project_id": 1} for i in range(6)])
+        ids = DatabaseRepository.query_logbook(1, columns=['id'])[0]['id'].tolist()
+        DatabaseRepository.get_known_values('schweisser', 1)  # builds the index
+        def writer(n):
+            rnd = random.Random(n)
+            for _ in range(30):
+                DatabaseRepository.bulk_update(rnd.sample(ids, 3), "Schweißer", f"S{rnd.randint(1, 4)}")
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(6)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        with database.connection() as conn:
+            stored = {r[0] for r in conn.execute("SELECT DISTINCT schweisser FROM rohrbuch WHERE project_id = 1")}
+        self.assertEqual(set(DatabaseRepository.get_known_values('schweisser', 1)), stored)
+
+    def test_full_text_search(self):
+        row = lambda **kw: dict({"iso": "ISO-1000-01", "naht": "1", "datum": "", "dimension": "DN 100", "bauteil": "Rohrstoß", "laenge": 1.0,
+                                 "charge": "", "charge_apz": "", "schweisser": "S1", "project_id": 1}, **kw)
+        DatabaseRepository.add_entries([row(iso="ISO-4711-01", naht="12"), row(iso="ISO-4711-02", schweisser="MÜ-47"),
+                                        row(charge_apz="H-4711"), row(iso="ISO-4711-03", project_id=2)])
+        hits = DatabaseRepository.search(1, "4711")
+        self.assertEqual(len(hits), 3)
+        self.assertEqual(hits['iso'].iloc[0], "ISO-4711-02")  # ISO weighs more than APZ, then newest first
+        self.assertEqual(hits['treffer'].iloc[0], "ISO: ISO-«4711»-02")
+        self.assertEqual(DatabaseRepository.search(1, "iso 47 mu")['treffer'].tolist(), ["ISO: «ISO»-«4711»-02 | Schweißer: «MÜ»-«47»"])
+        self.assertEqual(DatabaseRepository.search(1, '12 "')['naht'].tolist(), ["12"])
+        self.assertTrue(DatabaseRepository.search(1, "p2").empty)  # the project token is not searchable
+        self.assertTrue(DatabaseRepository.search(1, "  -- ").empty)
+        # Triggers keep the index in sync
+        ids = DatabaseRepository.search(1, "4711")['id'].tolist()
+        DatabaseRepository.bulk_update(ids[:1], "Schweißer", "K9")
+        DatabaseRepository.delete_entries(ids[1:2])
+        self.assertEqual(DatabaseRepository.search(1, "k9")['id'].tolist(), ids[:1])
+        self.assertEqual(len(DatabaseRepository.search(1, "4711")), 2)
+
+    def test_full_text_index_created_after_migration_without_fts5(self):
+        DatabaseRepository.add_entries([{"iso": "ISO-7", "naht": "1", "datum": "", "dimension": "DN 100", "bauteil": "Rohrstoß", "laenge": 1.0,
+                                         "charge": "", "charge_apz": "", "schweisser": "MÜLLER", "project_id": 1}])
+        # As left by migration 7 on an SQLite without FTS5: schema version current, no index
+        with database.connection() as conn:
+            for trigger in ("insert", "delete", "update"):
+                conn.execute(f"DROP TRIGGER trg_rohrbuch_fts_{trigger}")
+            conn.execute("DROP TABLE rohrbuch_fts")
+            conn.execute("DROP VIEW rohrbuch_fts_source")
+            conn.commit()
+        database.close_pools()
+        DatabaseRepository.init_db()
+        with database.connection() as conn:
+            self.assertEqual(schema_version(conn), len(MIGRATIONS))
+            self.assertIsNotNone(conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'rohrbuch_fts'").fetchone())
+            self.assertTrue(ensure_fts(conn))
+            self.assertEqual(conn.execute("SELECT rowid FROM rohrbuch_fts WHERE rohrbuch_fts MATCH 'muller'").fetchall(), [(1,)])
+        DatabaseRepository.add_entries([{"iso": "ISO-8", "naht": "1", "datum": "", "dimension": "DN 100", "bauteil": "Rohrstoß", "laenge": 1.0,
+                                         "charge": "", "charge_apz": "", "schweisser": "MÜLLER", "project_id": 1}])
+        self.assertEqual(sorted(DatabaseRepository.search(1, "müller")['iso']), ["ISO-7", "ISO-8"])
+
+    def test_trace_heat_across_projects(self):
+        DatabaseRepository.create_project("Werk B", "A-77")
+        row = lambda **kw: dict({"iso": "ISO-1", "naht": "1", "datum": "", "dimension": "DN 100", "bauteil": "Rohrstoß", "laenge": 1.0,
+                                 "charge": "", "charge_apz": "H-4711", "schweisser": "S1", "project_id": 1}, **kw)
+        DatabaseRepository.add_entries([row(project_id=2, naht="7"), row(charge_apz="h-4711 ", naht="2"), row(charge_apz="H-4712"),
+                                        row(naht="3", schweisser="S2"), row(charge_apz="H_4711"), row(charge_apz="")])
+        trace = DatabaseRepository.trace_heat(" h-4711")
+        self.assertEqual(trace[['project_id', 'naht', 'schweisser']].values.tolist(), [[1, "3", "S2"], [2, "7", "S1"]])
+        self.assertEqual(trace['projekt'].tolist(), ["Standard Baustelle", "Werk B"])
+        self.assertEqual(trace['auftrag'].iloc[1], "A-77")
+        self.assertTrue(DatabaseRepository.trace_heat("4711").empty)
+        heats = DatabaseRepository.find_heats("h-47")
+        self.assertEqual(heats.values.tolist(), [["H-4711", 2, 2], ["h-4711 ", 1, 1], ["H-4712", 1, 1]])
+        self.assertEqual(DatabaseRepository.find_heats("H_")['charge_apz'].tolist(), ["H_4711"])  # LIKE wildcards are literal
+        with database.connection() as conn:
+            plan = conn.execute("EXPLAIN QUERY PLAN SELECT id FROM rohrbuch WHERE charge_apz = ? COLLATE NOCASE ORDER BY project_id, id", ("x",)).fetchall()
+        self.assertIn("idx_rohrbuch_charge_apz_trace", plan[0][3])
+
+    def test_logbook_history_rebuilds_any_point_in_time(self):
+        database.set_current_user("Prüfer A")
+        self.addCleanup(database.set_current_user, None)
+        self.addCleanup(setattr, database, "SNAPSHOT_INTERVAL", database.SNAPSHOT_INTERVAL)
+        database.SNAPSHOT_INTERVAL = 7
+        rng = random.Random(24)
+        row = lambda: {"iso": f"ISO-{rng.randint(1, 9)}", "naht": str(rng.randint(1, 99)), "datum": f"{rng.randint(1, 28):02d}.03.2026",
+                       "dimension": rng.choice(["DN 50", "DN 100"]), "bauteil": "Rohrstoß", "laenge": rng.uniform(10, 6000),
+                       "charge": "C1", "charge_apz": rng.choice(["A1", "A2", ""]), "schweisser": rng.choice(["S1", "S2"]), "project_id": 1}
+        checkpoints = []
+        for _ in range(40):
+            ids = DatabaseRepository.query_logbook(1, columns=['id'], limit=None)[0]['id'].tolist()
+            action = rng.random()
+            if action < 0.4 or len(ids) < 3: DatabaseRepository.add_entries([row() for _ in range(rng.randint(1, 4))])
+            elif action < 0.6: DatabaseRepository.bulk_update(rng.sample(ids, 2), "Schweißer", rng.choice(["S3", "S4"]))
+            elif action < 0.8: DatabaseRepository.update_full_entry(rng.choice(ids), row())
+            else: DatabaseRepository.delete_entries(rng.sample(ids, 1))
+            time.sleep(0.003)
+            checkpoints.append((datetime.now(), DatabaseRepository.get_logbook_by_project(1)[LOGBOOK_COLUMNS]))
+            time.sleep(0.003)
+        for when, expected in checkpoints:
+            pd.testing.assert_frame_equal(DatabaseRepository.logbook_as_of(1, when), expected, check_dtype=False)
+        self.assertTrue(DatabaseRepository.logbook_as_of(1, datetime(2020, 1, 1)).empty)
+        with database.connection() as conn:
+            self.assertGreater(conn.execute("SELECT COUNT(*) FROM rohrbuch_snapshots WHERE project_id = 1").fetchone()[0], 3)
+
+        hist = DatabaseRepository.get_history(1)
+        self.assertEqual(set(hist['user_name']), {"Prüfer A"})
+        entry = int(checkpoints[-1][1]['id'].iloc[-1])
+        DatabaseRepository.bulk_update([entry], "ISO", "ISO-NEU")
+        latest = DatabaseRepository.get_history(1, entry_id=entry, limit=1).iloc[0]
+        self.assertEqual((latest['op'], latest['delta']), ("U", '{"iso":"ISO-NEU"}'))  # only the changed column
+        n_events = len(DatabaseRepository.get_history(1, limit=None))
+        DatabaseRepository.bulk_update([entry], "ISO", "ISO-NEU")  # no change, no event
+        self.assertEqual(len(DatabaseRepository.get_history(1, limit=None)), n_events)
+
+        # A row moved to another project leaves one history and enters the other
+        with database.connection() as conn:
+            conn.execute("UPDATE rohrbuch SET project_id = 2 WHERE id = ?", (entry,))
+            conn.commit()
+        self.assertNotIn(entry, DatabaseRepository.logbook_as_of(1, datetime.now())['id'].tolist())
+        self.assertEqual(DatabaseRepository.logbook_as_of(2, datetime.now())['iso'].tolist(), ["ISO-NEU"])
+        with database.connection() as conn:
+            with self.assertRaises(sqlite3.DatabaseError):
+                conn.execute("DELETE FROM rohrbuch_history")
+            with self.assertRaises(sqlite3.DatabaseError):
+                conn.execute("UPDATE rohrbuch_history SET user_name = 'x'")
+
+    def test_workspace_delta_save(self):
+        cut = lambda i, length: {"id": i, "name": f"S{i}", "raw_length": length, "cut_length": length, "details": "",
+                                 "timestamp": "10:00", "fittings": [], "dn": 100}
+        DatabaseRepository.save_workspace(1, {"fitting_list": [], "saved_cuts": [cut(3, 900.0), cut(1, 500.0)]})
+        DatabaseRepository.save_workspace_delta(1, None, [cut(1, 550.0), cut(7, 700.0)], [3])
+        ws = DatabaseRepository.load_workspace(1)
+        self.assertEqual([(c['id'], c['cut_length']) for c in ws['saved_cuts']], [(1, 550.0), (7, 700.0)])
+        self.assertEqual(ws['fitting_list'], [])
+        DatabaseRepository.save_workspace(1, {"fitting_list": [], "saved_cuts": []})
+        self.assertEqual(DatabaseRepository.load_workspace(1), {"fitting_list": []})
+
+    def test_logbook_compare_and_swap(self):
+        self.addCleanup(database.set_current_user, None)
+        row = {"iso": "A", "naht": "1", "datum": "", "dimension": "DN 100", "bauteil": "Rohrstoß",
+               "laenge": 100.0, "charge": "", "charge_apz": "", "schweisser": "", "project_id": 1}
+        DatabaseRepository.add_entries([row, dict(row, naht="2"), dict(row, naht="3")])
+        df = DatabaseRepository.query_logbook(1, columns=['id', 'version'])[0]
+        loaded = dict(zip(df['id'].tolist(), df['version'].tolist()))
+        a, b, c = sorted(loaded)
+        self.assertEqual(set(loaded.values()), {1})
+
+        database.set_current_user("Monteur B")
+        self.assertEqual(DatabaseRepository.update_full_entry(a, dict(row, laenge=150.0), expected_version=1), (True, "Eintrag aktualisiert."))
+        database.set_current_user("Monteur A")
+        ok, msg = DatabaseRepository.update_full_entry(a, dict(row, laenge=120.0), expected_version=1)  # stale version
+        self.assertFalse(ok)
+        self.assertIn(f"#{a} wurde von Monteur B geändert", msg)
+        self.assertEqual(DatabaseRepository.get_logbook_by_project(1).set_index('id').loc[a, 'laenge'], 150.0)
+
+        # Bulk edits and deletes are all or nothing
+        ok, msg = DatabaseRepository.bulk_update([a, b], "Schweißer", "S9", versions={a: 1, b: 1})
+        self.assertFalse(ok)
+        self.assertEqual(set(DatabaseRepository.get_logbook_by_project(1)['schweisser']), {""})
+        DatabaseRepository.delete_entries([c])
+        ok, msg = DatabaseRepository.delete_entries([b, c], versions={b: 1, c: 1})
+        self.assertFalse(ok)
+        self.assertIn(f"#{c} wurde gelöscht", msg)
+        self.assertEqual(sorted(DatabaseRepository.get_logbook_by_project(1)['id']), [a, b])
+        self.assertTrue(DatabaseRepository.bulk_update([a, b], "Schweißer", "S9", versions={a: 2, b: 1})[0])
+        df = DatabaseRepository.query_logbook(1, columns=['id', 'version'])[0]
+        self.assertEqual(dict(zip(df['id'], df['version'])), {a: 3, b: 2})
+        self.assertFalse(DatabaseRepository.update_full_entry(c, row, expected_version=1)[0])
+        # The same row passed twice is no conflict
+        self.assertTrue(DatabaseRepository.bulk_update([a, a], "ISO", "B", versions={a: 3})[0])
+        self.assertTrue(DatabaseRepository.delete_entries([a, a], versions={a: 4})[0])
+        self.assertEqual(DatabaseRepository.get_logbook_by_project(1)['id'].tolist(), [b])
+
+    def test_concurrent_versioned_updates_lose_nothing(self):
+        # N writers increment the same rows read-modify-write; with compare-and-swap every increment lands
+        n_writers, increments = 8, 25
+        row = {"iso": "A", "naht": "", "datum": "", "dimension": "DN 100", "bauteil": "Rohrstoß",
+               "laenge": 0.0, "charge": "", "charge_apz": "", "schweisser": "", "project_id": 1}
+        DatabaseRepository.add_entries([dict(row, naht=str(i)) for i in range(3)])
+        ids = DatabaseRepository.query_logbook(1, columns=['id'])[0]['id'].tolist()
+        conflicts, errors = [], []
+
+        def writer(n):
+            rng = random.Random(n)
+            try:
+                for _ in range(increments):
+                    entry = rng.choice(ids)
+                    while True:
+                        with database.connection() as conn:
+                            laenge, version = conn.execute("SELECT laenge, version FROM rohrbuch WHERE id = ?", (entry,)).fetchone()
+                        ok, _ = DatabaseRepository.update_full_entry(entry, dict(row, laenge=laenge + 1), expected_version=version)
+                        if ok: break
+                        conflicts.append(entry)
+            except Exception as e:
+                errors.append(e)
+        threads = [threading.Thread(target=writer, args=(n,)) for n in range(n_writers)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        self.assertEqual(errors, [])
+        df = DatabaseRepository.query_logbook(1, columns=['laenge', 'version'])[0]
+        self.assertEqual(df['laenge'].sum(), n_writers * increments)
+        self.assertEqual(df['version'].sum(), len(ids) + n_writers * increments)
+
+    def test_workspace_saves_merge(self):
+        cut = lambda i, length: {"id": i, "name": f"S{i}", "raw_length": length, "cut_length": length, "details": "",
+                                 "timestamp": "10:00", "fittings": [], "dn": 100}
+        fit = lambda i: {"id": i, "typ": "Bogen 90°", "dn": 100}
+        DatabaseRepository.save_workspace(1, {"fitting_list": [fit(1)], "saved_cuts": [cut(1, 500.0), cut(2, 600.0)]})
+        (_, base_a), (_, base_b) = DatabaseRepository.load_workspace(1, with_base=True), DatabaseRepository.load_workspace(1, with_base=True)
+
+        result = DatabaseRepository.save_workspace_delta(1, [fit(1), fit(2)], [cut(1, 510.0)], [], base=base_a)
+        self.assertFalse(result['merged'])
+        # B saved on the same base: its fitting is added, its edit of cut 1 becomes a copy, cut 2 is deleted
+        result = DatabaseRepository.save_workspace_delta(1, [fit(1), fit(3)], [cut(1, 520.0)], [2], base=base_b)
+        self.assertTrue(result['merged'])
+        self.assertEqual(len(result['conflicts']), 1)
+        ws, base = DatabaseRepository.load_workspace(1, with_base=True)
+        self.assertEqual([f['id'] for f in ws['fitting_list']], [1, 2, 3])
+        self.assertEqual([(c['id'], c['cut_length']) for c in ws['saved_cuts']], [(1, 510.0), (3, 520.0)])
+        self.assertEqual(base, result['base'])
+        # Deleting a cut that was changed since the base keeps it; on the current base it goes
+        result = DatabaseRepository.save_workspace_delta(1, None, [], [1], base=base_b)
+        self.assertEqual(len(result['conflicts']), 1)
+        DatabaseRepository.save_workspace_delta(1, None, [], [1], base=result['base'])
+        self.assertEqual([c['id'] for c in DatabaseRepository.load_workspace(1)['saved_cuts']], [3])
+
+        # Concurrent sessions each adding fittings and cuts: nothing is lost
+        def session(n):
+            data, base = DatabaseRepository.load_workspace(1, with_base=True)
+            for i in range(5):
+                fits = data['fitting_list'] + [fit(100 * n + i)]
+                result = DatabaseRepository.save_workspace_delta(1, fits, [cut(100 * n + i, 1000.0)], [], base=base)
+                data, base = DatabaseRepository.load_workspace(1, with_base=True) if result['merged'] else (dict(data, fitting_list=fits), result['base'])
+        threads = [threading.Thread(target=session, args=(n,)) for n in range(1, 7)]
+        for t in threads: t.start()
+        for t in threads: t.join()
+        ws = DatabaseRepository.load_workspace(1)
+        expected = sorted(100 * n + i for n in range(1, 7) for i in range(5))
+        self.assertEqual(sorted(f['id'] for f in ws['fitting_list'] if f['id'] >= 100), expected)
+        self.assertEqual(sorted(c['id'] for c in ws['saved_cuts']), [3] + expected)
+
+    def test_legacy_workspace_blob_is_split(self):
+        legacy = os.path.join(self.tmp.name, "legacy_ws.db")
+        blob = '{"fitting_list": [], "saved_cuts": [{"id": 5, "name": "A", "raw_length": 1.0, "cut_length": 1.0, "details": "", "timestamp": "", "fittings": []}]}'
+        with sqlite3.connect(legacy) as conn:
+            conn.execute("CREATE TABLE projects (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, created_at TEXT, archived INTEGER DEFAULT 0, workspace_data TEXT, order_number TEXT)")
+            conn.execute("INSERT INTO projects (id, name, workspace_data) VALUES (1, 'Alt', ?)", (blob,))
+        database.DB_NAME = legacy
+        DatabaseRepository.init_db()
+        self.assertEqual([c['id'] for c in DatabaseRepository.load_workspace(1)['saved_cuts']], [5])
+        with database.connection() as conn:
+            self.assertNotIn("saved_cuts", conn.execute("SELECT workspace_data FROM projects WHERE id = 1").fetchone()[0])
+
+    def test_migrations_applied_once(self):
+        with database.connection() as conn:
+            self.assertEqual(schema_version(conn), len(MIGRATIONS))
+            idx = [r[1] for r in conn.execute("PRAGMA index_list(rohrbuch)").fetchall()]
+        self.assertIn("idx_rohrbuch_project_id", idx)
+        DatabaseRepository.init_db()  # no-op in the same process
+
+    def test_legacy_database_is_upgraded(self):
+        legacy = os.path.join(self.tmp.name, "legacy.db")
+        with sqlite3.connect(legacy) as conn:
+            conn.execute("CREATE TABLE rohrbuch (id INTEGER PRIMARY KEY AUTOINCREMENT, iso TEXT, naht TEXT, datum TEXT, dimension TEXT, bauteil TEXT, laenge REAL, charge TEXT, schweisser TEXT)")
+            conn.execute("CREATE TABLE projects (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL UNIQUE, created_at TEXT)")
+            conn.execute("INSERT INTO rohrbuch (iso, dimension, bauteil, laenge) VALUES ('ALT-1', 'DN 100', 'Rohrstoß', 1000)")
+        database.DB_NAME = legacy
+        DatabaseRepository.init_db()
+        df = DatabaseRepository.get_logbook_by_project(1)
+        self.assertEqual(df['iso'].tolist(), ['ALT-1'])
+        self.assertIn('charge_apz', df.columns)
+        self.assertEqual(DatabaseRepository.get_mto_groups(1)[['dimension', 'laenge_mm', 'anzahl']].values.tolist(), [['DN 100', 1000.0, 1]])
+        self.assertEqual(DatabaseRepository.get_projects()[0][1], 'Standard Baustelle')
+        # History starts with the upgrade, from a baseline snapshot of the existing rows
+        self.assertEqual(DatabaseRepository.logbook_as_of(1, datetime.now())['iso'].tolist(), ['ALT-1'])
+        with self.assertRaises(ValueError):
+            DatabaseRepository.logbook_as_of(1, datetime(2020, 1, 1))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import unittest
+import pandas as pd
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.optimization import CuttingOptimizer, CuttingSolver, CutRequest, StockItem
+from modules.models import SavedCut
+
+class TestCuttingOptimizer(unittest.TestCase):
+    def setUp(self):
+        # Classic FFD trap (5,4,4,3,2,2 into 10): FFD/BFD need 3 bars, 2 are enough
+        lengths = [2997, 2397, 2397, 1797, 1197, 1197]
+        self.cuts = [CutRequest(id=f"S{i}", length=l) for i, l in enumerate(lengths)]
+
+    def test_solve_ffd_keeps_all_cuts(self):
+        bars = CuttingOptimizer.solve_ffd(self.cuts, 6000, 3.0)
+        placed = sorted(c.id for b in bars for c in b.cuts)
+        self.assertEqual(placed, sorted(c.id for c in self.cuts))
+        for b in bars:
+            self.assertAlmostEqual(b.waste, 6000 - sum(c.length + 3.0 for c in b.cuts))
+
+    def test_exact_solver_reaches_lower_bound(self):
+        res = CuttingOptimizer.solve(self.cuts, 6000, 3.0, solver="exact", time_limit=5)
+        self.assertEqual(res.lower_bound, 2)
+        self.assertEqual(res.num_bars, 2)
+        self.assertTrue(res.optimal)
+        self.assertEqual(res.gap, 0.0)
+
+    def test_oversized_cut_gets_own_bar(self):
+        cuts = self.cuts + [CutRequest(id="XL", length=7000)]
+        for solver in CuttingOptimizer.SOLVERS:
+            res = CuttingOptimizer.solve(cuts, 6000, 3.0, solver=solver)
+            xl_bars = [b for b in res.bars if any(c.id == "XL" for c in b.cuts)]
+            self.assertEqual(len(xl_bars[0].cuts), 1)
+
+    def test_incomplete_solver_cannot_be_instantiated(self):
+        class NoPack(CuttingSolver):
+            name = "none"
+        with self.assertRaises(TypeError):
+            NoPack()
+
+class TestInventoryOptimizer(unittest.TestCase):
+    def test_remnants_used_before_new_stock(self):
+        cuts = [CutRequest(id="A", length=1800), CutRequest(id="B", length=900)]
+        inventory = [StockItem(6000, None, 300.0), StockItem(2000, 1, 0.0, remnant_id=42)]
+        res = CuttingOptimizer.solve_inventory(cuts, inventory, 3.0, remnant_threshold=500)
+        self.assertEqual(res.consumed_remnant_ids, [42])
+        self.assertEqual(len(res.bars), 2)
+        self.assertEqual(res.total_cost, 300.0)
+        self.assertEqual(res.new_remnants, [6000 - 903])
+
+    def test_mostly_empty_long_bar_is_downsized(self):
+        # 12 m is cheaper per mm, but a 6 m bar is enough for the leftover cut
+        cuts = [CutRequest(id="A", length=11000), CutRequest(id="B", length=3000)]
+        inventory = [StockItem(6000, None, 300.0), StockItem(12000, None, 550.0)]
+        res = CuttingOptimizer.solve_inventory(cuts, inventory, 3.0)
+        self.assertEqual(sorted(b.length for b in res.bars), [6000, 12000])
+        self.assertEqual(res.total_cost, 850.0)
+        self.assertEqual(res.material_new, 18000)
+
+    def test_quantity_limits_and_unplaced(self):
+        cuts = [CutRequest(id=str(i), length=5000) for i in range(3)] + [CutRequest(id="XL", length=13000)]
+        res = CuttingOptimizer.solve_inventory(cuts, [StockItem(6000, 2, 300.0), StockItem(12000, None, 600.0)], 3.0)
+        self.assertEqual([c.id for c in res.unplaced], ["XL"])
+        self.assertEqual(sum(1 for b in res.bars if b.length == 6000), 2)
+
+class TestProjectOptimizer(unittest.TestCase):
+    def test_grouped_by_dn_without_double_counting(self):
+        df_pipes = pd.DataFrame({"iso": ["A", "A", "B"], "naht": ["1", "2", ""], "dimension": ["DN 100", "DN 100", "DN 50"], "laenge": [2500.0, 1200.0, 3000.0]})
+        saved = [SavedCut(1, "A", 2600.0, 2500.0, "", "", [], dn=100), SavedCut(2, "C", 900.0, 800.0, "", "", [])]
+        requests = CuttingOptimizer.collect_project_requests(df_pipes, saved, default_dn=50)
+        groups = CuttingOptimizer.group_by_dn(requests)
+        self.assertEqual(sorted(c.length for c in groups[100]), [1200.0, 2500.0])
+        self.assertEqual(sorted(c.length for c in groups[50]), [800.0, 3000.0])
+
+        plans = CuttingOptimizer.solve_project(requests, 6000, 3.0, solver="bfd", max_workers=2)
+        self.assertEqual(list(plans), [50, 100])
+        self.assertEqual(plans[100].num_bars, 1)
+        plan_df = CuttingOptimizer.plan_to_frame(plans)
+        self.assertEqual(len(plan_df), 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+import io
+import re
+import zipfile
+import sys
+import os
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.calculations import saddle_profile, wedge_gap_profile
+from modules.templates import layout_tiles, template_size, write_pdf, write_svg_zip
+
+class RecordingStream(io.BytesIO):
+    def __init__(self):
+        super().__init__()
+        self.writes = []
+    def write(self, data):
+        self.writes.append(len(data))
+        return super().write(data)
+
+class TestWrapTemplates(unittest.TestCase):
+    def setUp(self):
+        # DN 1600 branch on DN 1600: ~5.1 m circumference, ~0.8 m deep
+        self.big = saddle_profile(813.0, 813.0, step=0.1)
+
+    def test_tiles_cover_template_with_overlap(self):
+        tiles, page_w, page_h = layout_tiles(self.big, "A4", margin=10, overlap=10)
+        width, height = template_size(self.big)
+        self.assertGreaterEqual(max(t.x0 + t.width for t in tiles), width)
+        self.assertGreaterEqual(max(t.y0 + t.height for t in tiles), height)
+        cols = max(t.col for t in tiles) + 1
+        self.assertAlmostEqual(tiles[1].x0 - tiles[0].x0, tiles[0].width - 10)
+        self.assertEqual(len(tiles) % cols, 0)
+
+    def test_pdf_is_streamed_page_by_page(self):
+        out = RecordingStream()
+        pages = write_pdf(self.big, out, "Stutzen DN 1600 auf DN 1600")
+        data = out.getvalue()
+        self.assertEqual(data.count(b"/Type /Page "), pages)
+        # No single write holds more than one page
+        self.assertLess(max(out.writes), len(data) / pages * 4)
+        # Every xref entry points at its object
+        xref = int(re.search(rb"startxref\n(\d+)", data).group(1))
+        entries = data[xref:].split(b"\n")[3:]
+        for obj_id, entry in enumerate(entries, start=1):
+            if not entry[:10].isdigit(): break
+            self.assertTrue(data[int(entry[:10]):].startswith(b"%d 0 obj" % obj_id))
+        self.assertTrue(data.rstrip().endswith(b"%%EOF"))
+
+    def test_svg_zip_has_one_file_per_page(self):
+        out = io.BytesIO()
+        pages = write_svg_zip(wedge_gap_profile(114.3, {'12': 5.0, '6': 0.0}), out, "Keilspalt DN 100")
+        with zipfile.ZipFile(io.BytesIO(out.getvalue())) as zf:
+            names = zf.namelist()
+            self.assertEqual(len(names), pages)
+            self.assertIn('width="297mm"', zf.read(names[0]).decode())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+import unittest
+import sys
+import os
+from io import BytesIO
+import openpyxl
+import pandas as pd
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.utils import FigureCache, Visualizer, Exporter, PDF_AVAILABLE
+
+class TestFigureCache(unittest.TestCase):
+    def test_lru_eviction_and_counters(self):
+        cache = FigureCache(max_entries=2, max_bytes=100)
+        renders = []
+        def render(key, size=10):
+            renders.append(key)
+            return b"x" * size
+        cache.get_or_render(("a",), lambda: render("a"))
+        cache.get_or_render(("b",), lambda: render("b"))
+        cache.get_or_render(("a",), lambda: render("a"))  # hit, a becomes most recent
+        cache.get_or_render(("c",), lambda: render("c"))  # evicts b
+        cache.get_or_render(("b",), lambda: render("b"))
+        self.assertEqual(renders, ["a", "b", "c", "b"])
+        self.assertEqual(cache.stats(), {"entries": 2, "bytes": 20, "hits": 1, "misses": 4})
+
+    def test_memory_cap(self):
+        cache = FigureCache(max_entries=10, max_bytes=25)
+        for key in "abc": cache.get_or_render((key,), lambda: b"x" * 10)
+        self.assertEqual(cache.stats()["bytes"], 20)
+        cache.get_or_render(("big",), lambda: b"x" * 30)  # larger than the cap, not stored
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_render_png_is_memoized(self):
+        Visualizer.cache.clear()
+        png = Visualizer.render_png("plot_segment_schematic", 120.0, 80.0, 114.3, 15.0)
+        self.assertTrue(png.startswith(b"\x89PNG"))
+        self.assertIs(Visualizer.render_png("plot_segment_schematic", 120.0, 80.0, 114.3, 15.0), png)
+        self.assertEqual((Visualizer.cache.hits, Visualizer.cache.misses), (1, 1))
+
+class TestExcelExport(unittest.TestCase):
+    def test_stream_writes_rows_and_formats(self):
+        rows = ((f"ISO-{i}", 100.0 + i, None) for i in range(2500))
+        data = Exporter.to_excel_stream(rows, ["iso", "laenge", "schweisser"])
+        ws = openpyxl.load_workbook(BytesIO(data))['Daten']
+        values = list(ws.values)
+        self.assertEqual(values[0], ("iso", "laenge", "schweisser"))
+        self.assertEqual(values[-1], ("ISO-2499", 2599.0, None))
+        self.assertEqual(len(values), 2501)
+        self.assertTrue(ws['A1'].font.b)
+        self.assertEqual(ws['B2'].number_format, "0.0")
+        self.assertEqual(ws.freeze_panes, "A2")
+
+    def test_dataframe_export_drops_internal_columns(self):
+        df = pd.DataFrame([{"id": 1, "name": "A", "cut_length": 1.5, "fittings": [{"dn": 100}], "dn": float("nan"), "Auswahl": True}])
+        ws = openpyxl.load_workbook(BytesIO(Exporter.to_excel(df)))['Daten']
+        self.assertEqual(list(ws.values), [("name", "cut_length", "fittings", "dn"), ("A", 1.5, "[{'dn': 100}]", None)])
+
+@unittest.skipUnless(PDF_AVAILABLE, "fpdf not installed")
+class TestFinalReport(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({"iso": ["A", "B", "C", "D", "A"], "naht": list("12345"), "dimension": ["DN 100"] * 5,
+                                "bauteil": ["Rohrstoß"] * 5, "charge_apz": ["X", "X", "X", "X", None], "schweisser": ["S1"] * 5})
+
+    def test_report_is_cached_per_logbook_revision(self):
+        Exporter.report_cache.clear()
+        before = self.df.copy()
+        pdf = Exporter.final_report(self.df, "P", {"order_no": "1"})
+        self.assertTrue(pdf.startswith(b"%PDF"))
+        self.assertIs(Exporter.final_report(self.df.copy(), "P", {"order_no": "1"}), pdf)
+        pd.testing.assert_frame_equal(self.df, before)  # the logbook frame is not modified
+        changed = self.df.assign(schweisser=["S1", "S1", "S1", "S1", "S2"])
+        self.assertIsNot(Exporter.final_report(changed, "P", {"order_no": "1"}), pdf)
+        self.assertEqual(Exporter.report_cache.stats()["entries"], 2)
+
+if __name__ == '__main__':
+    unittest.main()